@@ -1,6 +1,7 @@
 from functools import lru_cache
 from app.services import market as market_service
 from app.services import simulation as sim_service
+from app.services import simulation_jobs
 
 @lru_cache(maxsize=1)
 def get_market_service():
@@ -16,4 +17,9 @@ def get_data_service():
 @lru_cache(maxsize=1)
 def get_simulation_service():
     """シミュレーションサービスのインスタンスを取得"""
-    return sim_service 
\ No newline at end of file
+    return sim_service
+
+@lru_cache(maxsize=1)
+def get_simulation_job_service():
+    """非同期シミュレーションジョブのサービスを取得"""
+    return simulation_jobs
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.routes import markets, simulation, charts, fundamentals, related
+from app.api.v1.routes import markets, simulation, charts, fundamentals, related, status
 
 # v1 APIルーター
 router = APIRouter(prefix="/v1")
@@ -9,4 +9,5 @@ router.include_router(markets.router)
 router.include_router(simulation.router)
 router.include_router(charts.router)
 router.include_router(fundamentals.router)
-router.include_router(related.router) 
\ No newline at end of file
+router.include_router(related.router)
+router.include_router(status.router) 
\ No newline at end of file
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, Query, HTTPException, status, Background
 from typing import List, Optional
 
 from app.api.dependencies import get_market_service
+from app.services.circuit_breaker import UpstreamUnavailableError
 from app.schemas.market import StockSearchResult, SearchErrorResponse
 from app.schemas.search import SearchResponse
 from app.schemas.details import MarketDetails
@@ -41,6 +42,12 @@ def search_stocks(
     try:
         results = market_service.fuzzy_search(query=query, limit=10)
         
+        # 投資信託以外の価格情報はまとめて取得
+        stock_prices = market_service.get_stock_prices([
+            result["symbol"] for result in results
+            if not market_service.is_mutual_fund_symbol(result["symbol"])
+        ])
+        
         # 価格情報の追加
         for result in results:
             try:
@@ -52,8 +59,8 @@ def search_stocks(
                     price_info = market_service.get_mutual_fund_price_data(symbol)
                     currency_symbol = "¥"  # 日本の投資信託は常に円建て
                 else:
-                    # 株式の場合は従来通りの処理
-                    price_info = market_service.get_stock_price(symbol)
+                    # 株式の場合は一括取得した価格情報を使用
+                    price_info = stock_prices[symbol]
                     # 市場に応じて通貨記号を決定
                     is_japan_stock = symbol.endswith(".T")
                     currency_symbol = "¥" if is_japan_stock else "$"
@@ -64,43 +71,36 @@ def search_stocks(
                 
                 result["price"] = f"{currency_symbol}{price_value:,.0f}" if currency_symbol == "¥" else f"{currency_symbol}{price_value:.2f}"
                 result["change_percent"] = f"{'+' if change_percent_value > 0 else ''}{change_percent_value:.2f}%"
+                result["is_stale"] = price_info.get("is_stale", False)
             except Exception as e:
                 print(f"Error getting price for {result['symbol']}: {e}")
-                # 価格取得に失敗した場合はデフォルト値を設定
-                symbol = result["symbol"]
-                if market_service.is_mutual_fund_symbol(symbol):
-                    currency_symbol = "¥"
-                else:
-                    is_japan_stock = symbol.endswith(".T")
-                    currency_symbol = "¥" if is_japan_stock else "$"
-                result["price"] = f"{currency_symbol}0"
-                result["change_percent"] = "0.00%"
+                # 価格取得に失敗した場合は価格なしとする（架空の値は返さない）
+                result["price"] = None
+                result["change_percent"] = None
         
         return {
             "results": results,
             "total": len(results)
         }
+    except UpstreamUnavailableError as e:
+        # 外部サービス接続エラー（遮断中は外部データソースを待たずに返す）
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "error_code": "SERVICE_UNAVAILABLE",
+                "message": "外部データソースに接続できません"
+            },
+            headers={"Retry-After": str(int(e.retry_after or 30))}
+        )
     except Exception as e:
-        # エラーハンドリング
-        error_message = str(e).lower()
-        if "yfinance" in error_message or "yahoo" in error_message or "network" in error_message or "connection" in error_message:
-            # 外部サービス接続エラー
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail={
-                    "error_code": "SERVICE_UNAVAILABLE",
-                    "message": "外部データソースに接続できません"
-                }
-            )
-        else:
-            # その他のエラー
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail={
-                    "error_code": "INTERNAL_ERROR",
-                    "message": f"内部エラーが発生しました: {str(e)}"
-                }
-            )
+        # その他のエラー
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "error_code": "INTERNAL_ERROR",
+                "message": f"内部エラーが発生しました: {str(e)}"
+            }
+        )
 
 @router.get("/{symbol}", response_model=MarketDetails)
 def get_market_details(
@@ -115,6 +115,14 @@ def get_market_details(
     try:
         details = market_service.get_market_details(symbol)
         return details
+    except market_service.QuoteNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error_code": "QUOTE_NOT_FOUND",
+                "message": f"価格情報がありません: {symbol}"
+            }
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -123,24 +131,22 @@ def get_market_details(
                 "message": f"銘柄が見つかりません: {symbol}"
             }
         )
+    except UpstreamUnavailableError as e:
+        # 外部サービス接続エラー（遮断中は外部データソースを待たずに返す）
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "error_code": "SERVICE_UNAVAILABLE",
+                "message": "外部データソースに接続できません"
+            },
+            headers={"Retry-After": str(int(e.retry_after or 30))}
+        )
     except Exception as e:
-        # エラーハンドリング
-        error_message = str(e).lower()
-        if "yfinance" in error_message or "yahoo" in error_message or "network" in error_message or "connection" in error_message:
-            # 外部サービス接続エラー
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail={
-                    "error_code": "SERVICE_UNAVAILABLE",
-                    "message": "外部データソースに接続できません"
-                }
-            )
-        else:
-            # その他のエラー
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail={
-                    "error_code": "INTERNAL_ERROR",
-                    "message": f"内部エラーが発生しました: {str(e)}"
-                }
-            )
+        # その他のエラー
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "error_code": "INTERNAL_ERROR",
+                "message": f"内部エラーが発生しました: {str(e)}"
+            }
+        )
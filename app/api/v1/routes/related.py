@@ -3,6 +3,7 @@ from typing import List, Optional
 from enum import Enum
 
 from app.api.dependencies import get_market_service
+from app.services.circuit_breaker import UpstreamUnavailableError
 from app.schemas.related import RelatedMarketsResponse
 
 class RelationCriteria(str, Enum):
@@ -60,24 +61,22 @@ def get_related_markets(
                 "message": f"銘柄が見つかりません: {symbol}"
             }
         )
+    except UpstreamUnavailableError as e:
+        # 外部サービス接続エラー（遮断中は外部データソースを待たずに返す）
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "error_code": "SERVICE_UNAVAILABLE",
+                "message": "外部データソースに接続できません"
+            },
+            headers={"Retry-After": str(int(e.retry_after or 30))}
+        )
     except Exception as e:
-        # エラーハンドリング
-        error_message = str(e).lower()
-        if "yfinance" in error_message or "yahoo" in error_message or "network" in error_message or "connection" in error_message:
-            # 外部サービス接続エラー
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail={
-                    "error_code": "SERVICE_UNAVAILABLE",
-                    "message": "外部データソースに接続できません"
-                }
-            )
-        else:
-            # その他のエラー
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail={
-                    "error_code": "INTERNAL_ERROR",
-                    "message": f"内部エラーが発生しました: {str(e)}"
-                }
-            ) 
\ No newline at end of file
+        # その他のエラー
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "error_code": "INTERNAL_ERROR",
+                "message": f"内部エラーが発生しました: {str(e)}"
+            }
+        ) 
\ No newline at end of file
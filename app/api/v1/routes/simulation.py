@@ -1,7 +1,24 @@
-from fastapi import APIRouter, Depends
+import itertools
+import json
+from typing import Union
 
-from app.api.dependencies import get_simulation_service
-from app.schemas.simulation import SimulationRequest, SimulationResponse
+import humps
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from app.api.dependencies import get_simulation_job_service, get_simulation_service
+from app.models.enums import SimulationJobStatus, SimulationOutput
+from app.services.circuit_breaker import UpstreamUnavailableError
+from app.schemas.simulation import (
+    PortfolioAsset,
+    PortfolioSimulationRequest,
+    PortfolioSimulationResponse,
+    SimulationJobResponse,
+    SimulationProgress,
+    SimulationRequest,
+    SimulationResponse,
+    SimulationStreamRequest,
+)
 
 router = APIRouter(
     prefix="/simulation",
@@ -9,6 +26,50 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def _validate_portfolio(req: PortfolioSimulationRequest):
+    """ポートフォリオの構成銘柄に重複がないことを確認する"""
+    symbols = [asset.symbol for asset in req.assets]
+    if len(set(symbols)) != len(symbols):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error_code": "INVALID_PARAMETER",
+                "message": "同じ銘柄を複数回指定することはできません"
+            }
+        )
+
+def _portfolio_params(req: PortfolioSimulationRequest) -> dict:
+    """ポートフォリオのリクエストをサービスの引数に変換する"""
+    return {
+        "assets": {asset.symbol: asset.weight for asset in req.assets},
+        "years": req.years,
+        "simulations": req.simulations,
+        "rebalance": req.rebalance,
+        "output": req.output,
+        "seed": req.seed,
+    }
+
+def _portfolio_response(result: dict, rebalance) -> PortfolioSimulationResponse:
+    """サービスの結果をポートフォリオのレスポンスに変換する"""
+    result = dict(result)
+    weights = result.pop("weights")
+    return PortfolioSimulationResponse(
+        assets=[PortfolioAsset(symbol=symbol, weight=weight) for symbol, weight in weights.items()],
+        rebalance=rebalance,
+        **result,
+    )
+
+def _upstream_unavailable(e: UpstreamUnavailableError) -> HTTPException:
+    """外部データソース（価格履歴のyfinance・ジョブストアのDynamoDB）の障害を503に変換する"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail={
+            "error_code": "SERVICE_UNAVAILABLE",
+            "message": str(e)
+        },
+        headers={"Retry-After": str(int(e.retry_after or 30))},
+    )
+
 @router.post("", response_model=SimulationResponse)
 def simulate(
     req: SimulationRequest,
@@ -16,6 +77,206 @@ def simulate(
 ):
     """
     モンテカルロシミュレーションを実行する
+
+    - **mode**: sampling（GBMの乱数サンプリング）、analytic（閉形式の年次分位点カーブ）、bootstrap（過去リターンの復元抽出）
+    - **output**: terminal（全パスの終端値）または fan_chart（年次分位点カーブのみ）
+    - **variance_reduction**: none / antithetic（対称変量法）/ sobol（準モンテカルロ法）
+    - **block_size**: bootstrapのブロック長（日数）
+    - **seed**: 乱数シード（指定すると結果が決定的になり、キャッシュから返される）
+    """
+    try:
+        result = sim_service.run_simulation(**req.model_dump())
+    except UpstreamUnavailableError as e:
+        raise _upstream_unavailable(e)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error_code": "INVALID_PARAMETER",
+                "message": str(e)
+            }
+        )
+    return SimulationResponse(**result)
+
+@router.post("/stream")
+def simulate_stream(
+    req: SimulationStreamRequest,
+    sim_service = Depends(get_simulation_service)
+):
+    """
+    モンテカルロシミュレーションを実行し、年次分位点カーブの途中経過をNDJSONで逐次返す
+
+    パラメータは `POST /v1/simulation` と同じ（出力は常に fan_chart）。
+    progress_every チャンクごとに集計済みのパスによる分位点カーブを1行送信し、
+    最後の行（done: true）が全パスを集計した結果になる。接続を切ると計算も打ち切られる。
+    """
+    params = req.model_dump(exclude={"progress_every"})
+    params["output"] = SimulationOutput.fan_chart
+    events = sim_service.iter_simulation(**params, progress_every=req.progress_every)
+    try:
+        # パラメータの誤り・価格履歴の取得の障害はストリーミング開始前に400・503として返す
+        first = next(events)
+    except UpstreamUnavailableError as e:
+        raise _upstream_unavailable(e)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error_code": "INVALID_PARAMETER",
+                "message": str(e)
+            }
+        )
+
+    def lines():
+        try:
+            for completed, result in itertools.chain([first], events):
+                progress = SimulationProgress(
+                    completed=completed,
+                    simulations=req.simulations,
+                    done=completed >= req.simulations,
+                    **result,
+                )
+                yield json.dumps(humps.camelize(progress.model_dump(mode="json")), ensure_ascii=False) + "\n"
+        finally:
+            events.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/portfolio", response_model=PortfolioSimulationResponse)
+def simulate_portfolio(
+    req: PortfolioSimulationRequest,
+    sim_service = Depends(get_simulation_service)
+):
+    """
+    複数資産のポートフォリオのモンテカルロシミュレーションを実行する
+
+    - **assets**: 構成資産と配分比率（例: AAPL 0.5, 7203.T 0.3, VOO 0.2）
+    - **rebalance**: リバランス頻度（none, monthly, quarterly, yearly）
+    - **output**: terminal（全パスの終端値）または fan_chart（年次分位点カーブのみ）
+    """
+    _validate_portfolio(req)
+    try:
+        result = sim_service.simulate_portfolio(**_portfolio_params(req))
+    except UpstreamUnavailableError as e:
+        raise _upstream_unavailable(e)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error_code": "INVALID_PARAMETER",
+                "message": str(e)
+            }
+        )
+
+    return _portfolio_response(result, req.rebalance)
+
+def _submit_job(job_service, kind: str, params: dict) -> SimulationJobResponse:
+    """ジョブを投入し、上限に達している場合は503、結果が保存できない大きさの場合は400を返す"""
+    try:
+        job = job_service.submit_job(kind, params)
+    except job_service.JobQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "error_code": "JOB_QUEUE_FULL",
+                "message": str(e)
+            },
+            headers={"Retry-After": "30"},
+        )
+    except UpstreamUnavailableError as e:
+        raise _upstream_unavailable(e)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error_code": "INVALID_PARAMETER",
+                "message": str(e)
+            }
+        )
+    return SimulationJobResponse(**job)
+
+def _get_job_or_404(job_service, job_id: str) -> dict:
+    try:
+        job = job_service.get_job(job_id)
+    except UpstreamUnavailableError as e:
+        raise _upstream_unavailable(e)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error_code": "NOT_FOUND",
+                "message": f"ジョブが見つかりません: {job_id}"
+            }
+        )
+    return job
+
+@router.post("/jobs", response_model=SimulationJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def submit_simulation_job(
+    req: SimulationRequest,
+    job_service = Depends(get_simulation_job_service)
+):
+    """
+    モンテカルロシミュレーションをバックグラウンドジョブとして投入する
+
+    パラメータは `POST /v1/simulation` と同じ。返されたジョブIDで状態と結果を取得する。
+    """
+    return _submit_job(job_service, "simulation", req.model_dump())
+
+@router.post("/portfolio/jobs", response_model=SimulationJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def submit_portfolio_job(
+    req: PortfolioSimulationRequest,
+    job_service = Depends(get_simulation_job_service)
+):
+    """
+    ポートフォリオシミュレーションをバックグラウンドジョブとして投入する
+
+    パラメータは `POST /v1/simulation/portfolio` と同じ。
     """
-    sims = sim_service.monte_carlo(req.symbol, req.years, req.simulations)
-    return SimulationResponse(symbol=req.symbol, scenarios=sims) 
\ No newline at end of file
+    _validate_portfolio(req)
+    return _submit_job(job_service, "portfolio", _portfolio_params(req))
+
+@router.get("/jobs/{job_id}", response_model=SimulationJobResponse)
+def get_simulation_job(
+    job_id: str,
+    job_service = Depends(get_simulation_job_service)
+):
+    """
+    シミュレーションジョブの状態を取得する
+
+    - **status**: queued（実行待ち）、running（実行中）、succeeded（完了）、failed（失敗）
+    """
+    return SimulationJobResponse(**_get_job_or_404(job_service, job_id))
+
+@router.get("/jobs/{job_id}/result", response_model=Union[SimulationResponse, PortfolioSimulationResponse])
+def get_simulation_job_result(
+    job_id: str,
+    job_service = Depends(get_simulation_job_service)
+):
+    """
+    完了したシミュレーションジョブの結果を取得する
+
+    レスポンスはジョブの種類に応じて `POST /v1/simulation` または
+    `POST /v1/simulation/portfolio` と同じ形式になる。
+    結果のないジョブ（未完了・失敗）は409を返す（ジョブの状態は `GET /v1/simulation/jobs/{job_id}` で確認する）。
+    """
+    job = _get_job_or_404(job_service, job_id)
+    if job["status"] == SimulationJobStatus.failed:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "error_code": "JOB_FAILED",
+                "message": job["error"]
+            }
+        )
+    if job["status"] != SimulationJobStatus.succeeded:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "error_code": "JOB_NOT_FINISHED",
+                "message": f"ジョブはまだ完了していません（status: {job['status']}）"
+            }
+        )
+
+    if job["kind"] == "portfolio":
+        return _portfolio_response(job["result"], job["params"]["rebalance"])
+    return SimulationResponse(**job["result"])
@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+
+from app.schemas.status import UpstreamStatusResponse
+from app.services import hedging, rate_limiter, upstream_executor
+
+router = APIRouter(
+    prefix="/status",
+    tags=["status"],
+)
+
+@router.get("/upstreams", response_model=UpstreamStatusResponse)
+def get_upstream_status():
+    """
+    外部データソースの状態の取得エンドポイント（監視用）
+
+    サーキットブレーカーの状態、流量制御の待ち行列の状態（優先度別の待ち数・累計・待ち時間）、
+    スレッドプールの状態（実行中・実行待ちの数、拒否数）、ヘッジの状態を返す。
+    """
+    upstreams = rate_limiter.get_upstream_status()
+    for upstream in upstreams:
+        upstream["executor"] = upstream_executor.get_executor_status(upstream["name"])
+    return {
+        "upstreams": upstreams,
+        "hedging": hedging.get_hedging_status(),
+    }
@@ -2,7 +2,9 @@ from fastapi import FastAPI, Request, status, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.encoders import jsonable_encoder
+from anyio import to_thread
 from app.api import api_router
+from app.services import http_session, quote_warmer, simulation_engine, simulation_jobs, upstream_executor
 import humps
 
 # ===================================================
@@ -96,11 +98,23 @@ app.include_router(api_router)
 async def startup_event():
     """アプリケーション起動時の処理"""
     # データの自動ロードは不要（必要時に遅延ロードされる）
-    pass
+    # APIリクエストを処理するスレッド数（外部データソースを待つスレッド数は upstream_executor で上限を設ける）
+    to_thread.current_default_thread_limiter().total_tokens = upstream_executor.API_THREADPOOL_SIZE
+    # 人気銘柄の価格情報を定期的に事前取得する（QUOTE_WARMER_ENABLED=trueの場合）
+    if quote_warmer.QUOTE_WARMER_ENABLED:
+        quote_warmer.start_quote_warmer()
 
 # 終了時処理
 @app.on_event("shutdown")
 async def shutdown_event():
     """アプリケーション終了時の処理"""
-    # リソースのクリーンアップなどを行う場合はここに記述
-    pass
+    # シミュレーション用のプロセスプールを停止
+    simulation_engine.shutdown_process_pool()
+    # 非同期シミュレーションジョブ用のスレッドプールを停止
+    simulation_jobs.shutdown_executor()
+    # 人気銘柄の価格情報の事前取得を停止
+    quote_warmer.stop_quote_warmer()
+    # 外部データソース用のスレッドプールを停止
+    upstream_executor.shutdown_executors()
+    # 外部データソースとの共有セッションの接続を閉じる
+    http_session.close_sessions()
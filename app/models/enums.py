@@ -24,6 +24,60 @@ class AssetType(str, Enum):
     COMMODITY = "COMMODITY"  # 商品
     MUTUAL_FUND = "MUTUAL_FUND"  # 投資信託
 
+class Exchange(str, Enum):
+    """取引所の列挙型"""
+    TSE = "TSE"  # 東京証券取引所
+    NYSE = "NYSE"  # ニューヨーク証券取引所（NASDAQも同じ立会時間）
+
+class SimulationStep(str, Enum):
+    """シミュレーションの時間刻みを表す列挙型"""
+    daily = "daily"  # 日次（1年252ステップ）
+    monthly = "monthly"  # 月次（1年12ステップ）
+    yearly = "yearly"  # 年次（1年1ステップ）
+    terminal = "terminal"  # 満期まで1ステップ
+
+class SimulationMode(str, Enum):
+    """シミュレーションの計算方式を表す列挙型"""
+    sampling = "sampling"  # モンテカルロ法による乱数サンプリング
+    analytic = "analytic"  # 対数正規分布の閉形式による分位点計算
+    bootstrap = "bootstrap"  # 過去の日次リターンの復元抽出（ブロックブートストラップ）
+
+class SimulationOutput(str, Enum):
+    """シミュレーション結果の出力形式を表す列挙型"""
+    terminal = "terminal"  # 全パスの終端値
+    fan_chart = "fan_chart"  # 年次の分位点カーブ（ファンチャート）
+
+class VarianceReduction(str, Enum):
+    """シミュレーションの分散減少法を表す列挙型"""
+    none = "none"  # 通常の擬似乱数
+    antithetic = "antithetic"  # 対称変量法
+    sobol = "sobol"  # スクランブルSobol列による準モンテカルロ法
+
+class RebalanceFrequency(str, Enum):
+    """ポートフォリオのリバランス頻度を表す列挙型"""
+    none = "none"  # リバランスなし（バイ・アンド・ホールド）
+    monthly = "monthly"  # 毎月
+    quarterly = "quarterly"  # 四半期ごと
+    yearly = "yearly"  # 毎年
+
+class SimulationJobStatus(str, Enum):
+    """非同期シミュレーションジョブの状態を表す列挙型"""
+    queued = "queued"  # 実行待ち
+    running = "running"  # 実行中
+    succeeded = "succeeded"  # 完了
+    failed = "failed"  # 失敗
+
+class CircuitState(str, Enum):
+    """サーキットブレーカーの状態を表す列挙型"""
+    closed = "closed"  # 通常（呼び出しを許可）
+    open = "open"  # 遮断中（呼び出さずに失敗させる）
+    half_open = "half_open"  # 試行中（1回だけ呼び出しを許可）
+
+class UpstreamPriority(str, Enum):
+    """外部データソースの呼び出しの優先度を表す列挙型"""
+    interactive = "interactive"  # APIリクエストの処理中の呼び出し
+    background = "background"  # 事前取得・再取得などのバックグラウンドの呼び出し
+
 # yfinanceのperiodパラメータにマッピング
 PERIOD_MAP: Dict[Period, str] = {
     Period.one_day: "1d",
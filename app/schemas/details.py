@@ -44,4 +44,5 @@ class MarketDetails(BaseModel):
     trading_info: TradingInfo = Field(..., description="取引情報")
     dividend_yield: Optional[str] = Field(None, description="配当利回り（%）")
     company_profile: CompanyProfile = Field(..., description="企業プロフィール情報")
-    last_updated: str = Field(..., description="情報取得日時（ISO 8601形式）") 
\ No newline at end of file
+    last_updated: str = Field(..., description="情報取得日時（ISO 8601形式）")
+    is_stale: bool = Field(False, description="価格が最新の取得に失敗した際の最終既知値かどうか") 
\ No newline at end of file
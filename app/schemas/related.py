@@ -5,8 +5,9 @@ class RelatedMarket(BaseModel):
     """関連銘柄のモデル（最適化版）"""
     symbol: str = Field(..., description="銘柄シンボル")
     name: str = Field(..., description="銘柄名")
-    price: str = Field(..., description="現在の株価（通貨記号付き、例：$125.30、¥2850）")
-    change_percent: Union[float, int] = Field(..., description="変化率（%）")
+    price: Optional[str] = Field(None, description="現在の株価（通貨記号付き、例：$125.30、¥2850）。取得できない場合はnull")
+    change_percent: Optional[Union[float, int]] = Field(None, description="変化率（%）。取得できない場合はnull")
+    is_stale: bool = Field(False, description="価格が最新の取得に失敗した際の最終既知値かどうか")
     logo_url: Optional[str] = Field(None, description="ロゴURL")
     dividend_yield: Optional[str] = Field(None, description="配当利回り")
 
@@ -11,6 +11,7 @@ class SearchResult(BaseModel):
     market: str = Field(..., description="市場")
     price: Optional[str] = Field(None, description="現在価格")
     change_percent: Optional[str] = Field(None, description="前日比")
+    is_stale: bool = Field(False, description="価格が最新の取得に失敗した際の最終既知値かどうか")
     logo_url: Optional[str] = Field(None, description="企業ロゴのURL")
 
 class SearchResponse(BaseModel):
@@ -1,13 +1,77 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
+from app.models.enums import RebalanceFrequency, SimulationJobStatus, SimulationMode, SimulationOutput, SimulationStep, VarianceReduction
+
 class SimulationRequest(BaseModel):
     """シミュレーションリクエストのモデル"""
     symbol: str = Field(..., description="シミュレーション対象の株式シンボル")
     years: int = Field(5, description="シミュレーション期間（年）", ge=1, le=30)
-    simulations: int = Field(100, description="シミュレーション回数", ge=10, le=1000)
+    simulations: int = Field(100, description="シミュレーション回数", ge=10, le=100000)
+    step: SimulationStep = Field(SimulationStep.daily, description="時間刻み（daily, monthly, yearly, terminal）")
+    mode: SimulationMode = Field(SimulationMode.sampling, description="計算方式（sampling: GBMの乱数サンプリング, analytic: 閉形式, bootstrap: 過去リターンの復元抽出）")
+    output: SimulationOutput = Field(SimulationOutput.terminal, description="出力形式（terminal: 全パスの終端値, fan_chart: 年次分位点カーブ）。analyticは常にfan_chart")
+    block_size: int = Field(1, description="bootstrapのブロック長（日数、1は日次リターンの単純な復元抽出）", ge=1, le=252)
+    variance_reduction: VarianceReduction = Field(VarianceReduction.none, description="分散減少法（none, antithetic: 対称変量法, sobol: スクランブルSobol列）")
+    seed: Optional[int] = Field(None, description="乱数シード（指定すると同じ条件で同じ結果を返し、結果がキャッシュされる）", ge=0)
+    initial_investment: float = Field(1.0, description="初期投資額（省略時は1.0で、結果は倍率になる）", ge=0)
+    monthly_contribution: float = Field(0.0, description="毎月末の積立額", ge=0)
+    reinvest_dividends: bool = Field(True, description="配当を再投資するか（Falseの場合は現金として受け取り評価額に含める）")
 
 class SimulationResponse(BaseModel):
     """シミュレーション結果のレスポンスモデル"""
     symbol: str = Field(..., description="株式シンボル")
-    scenarios: List[List[float]] = Field(..., description="シミュレーション結果") 
\ No newline at end of file
+    mode: SimulationMode = Field(SimulationMode.sampling, description="計算方式")
+    scenarios: Optional[Dict[str, List[float]]] = Field(None, description="シナリオ別の終端の評価額（output=terminalのみ）")
+    bands: Optional[Dict[str, Dict[str, List[float]]]] = Field(None, description="シナリオ別の年次分位点カーブ（median, upper_95, lower_5）")
+    percentile_error: Optional[float] = Field(None, description="分位点カーブの集計誤差の上限（相対誤差、0は厳密）")
+    standard_error: Optional[Dict[str, Optional[float]]] = Field(None, description="シナリオ別の終端値の平均の標準誤差（sampling, bootstrapのみ）")
+    principal: Optional[List[float]] = Field(None, description="年次の累計投資元本（0年目, 1年目, ..., years年目）")
+
+class SimulationStreamRequest(SimulationRequest):
+    """ストリーミングシミュレーションリクエストのモデル（出力は常にfan_chart）"""
+    progress_every: int = Field(1, description="途中経過を送信するチャンク数の間隔", ge=1, le=1000)
+
+class SimulationProgress(BaseModel):
+    """ストリーミングシミュレーションの途中経過（NDJSONの1行）のモデル"""
+    symbol: str = Field(..., description="株式シンボル")
+    mode: SimulationMode = Field(..., description="計算方式")
+    completed: int = Field(..., description="集計済みのパス数")
+    simulations: int = Field(..., description="シミュレーション回数")
+    done: bool = Field(..., description="最終結果かどうか")
+    bands: Optional[Dict[str, Dict[str, List[float]]]] = Field(None, description="集計済みのパスによるシナリオ別の年次分位点カーブ")
+    percentile_error: Optional[float] = Field(None, description="分位点カーブの集計誤差の上限（相対誤差、0は厳密）")
+    standard_error: Optional[Dict[str, Optional[float]]] = Field(None, description="集計済みのパスによる終端値の平均の標準誤差")
+    principal: Optional[List[float]] = Field(None, description="年次の累計投資元本")
+
+class PortfolioAsset(BaseModel):
+    """ポートフォリオを構成する資産のモデル"""
+    symbol: str = Field(..., description="銘柄シンボル")
+    weight: float = Field(..., description="配分比率（合計が1になるよう正規化される）", gt=0)
+
+class PortfolioSimulationRequest(BaseModel):
+    """ポートフォリオシミュレーションリクエストのモデル"""
+    assets: List[PortfolioAsset] = Field(..., description="構成資産", min_length=1, max_length=20)
+    years: int = Field(5, description="シミュレーション期間（年）", ge=1, le=30)
+    simulations: int = Field(100, description="シミュレーション回数", ge=10, le=100000)
+    rebalance: RebalanceFrequency = Field(RebalanceFrequency.yearly, description="リバランス頻度（none, monthly, quarterly, yearly）")
+    output: SimulationOutput = Field(SimulationOutput.terminal, description="出力形式（terminal: 全パスの終端値, fan_chart: 年次分位点カーブ）")
+    seed: Optional[int] = Field(None, description="乱数シード（指定すると同じ条件で同じ結果を返す）", ge=0)
+
+class PortfolioSimulationResponse(BaseModel):
+    """ポートフォリオシミュレーション結果のレスポンスモデル"""
+    assets: List[PortfolioAsset] = Field(..., description="構成資産（正規化後の配分比率）")
+    rebalance: RebalanceFrequency = Field(..., description="リバランス頻度")
+    scenarios: Optional[Dict[str, List[float]]] = Field(None, description="シナリオ別の終端値（初期値1.0、output=terminalのみ）")
+    bands: Optional[Dict[str, Dict[str, List[float]]]] = Field(None, description="シナリオ別の年次分位点カーブ（median, upper_95, lower_5）")
+    percentile_error: Optional[float] = Field(None, description="分位点カーブの集計誤差の上限（相対誤差、0は厳密）")
+    standard_error: Optional[Dict[str, Optional[float]]] = Field(None, description="シナリオ別の終端値の平均の標準誤差")
+
+class SimulationJobResponse(BaseModel):
+    """非同期シミュレーションジョブの状態のレスポンスモデル"""
+    job_id: str = Field(..., description="ジョブID")
+    kind: str = Field(..., description="ジョブの種類（simulation, portfolio）")
+    status: SimulationJobStatus = Field(..., description="ジョブの状態（queued, running, succeeded, failed）")
+    error: Optional[str] = Field(None, description="失敗時のエラーメッセージ")
+    created_at: float = Field(..., description="投入日時（UNIX時間）")
+    updated_at: float = Field(..., description="最終更新日時（UNIX時間）")
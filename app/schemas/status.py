@@ -0,0 +1,19 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+class UpstreamStatus(BaseModel):
+    """外部データソースの状態のモデル"""
+    name: str = Field(..., description="外部データソース名（yfinance, yahoo_finance_japan, dynamodb）")
+    circuit: Dict[str, Any] = Field(..., description="サーキットブレーカーの状態（state, calls, failures）")
+    rate_limit: Optional[Dict[str, Any]] = Field(None, description="流量制御の状態（残りトークン数、優先度別の待ち数・累計・待ち時間）")
+    executor: Optional[Dict[str, Any]] = Field(None, description="スレッドプールの状態（実行中・実行待ちの数、使用率、優先度別の拒否数、実行待ちの時間）")
+
+class HedgingStatus(BaseModel):
+    """ヘッジ（遅い読み取りの2回目の試行）の状態のモデル"""
+    enabled: bool = Field(..., description="ヘッジが有効か")
+    policies: List[Dict[str, Any]] = Field(..., description="読み取りの種類ごとの遅延・試行数・ヘッジ数・予算超過数")
+
+class UpstreamStatusResponse(BaseModel):
+    """外部データソースの状態のレスポンスモデル"""
+    upstreams: List[UpstreamStatus] = Field(..., description="外部データソースごとの状態")
+    hedging: Optional[HedgingStatus] = Field(None, description="ヘッジの状態")
@@ -0,0 +1,191 @@
+import copy
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.models.enums import PERIOD_MAP
+from .market import get_price_history, get_price_history_since
+
+# 差分更新を確認する間隔（秒）。日足は1日1本なので頻繁に確認する必要はない
+CALIBRATION_REFRESH_SECONDS = 6 * 60 * 60
+
+# 配当利回りの推定に使う直近の期間（取引日数、約5年）
+DIVIDEND_YIELD_DAYS = 5 * 252
+
+class Calibration:
+    """
+    銘柄ごとの日次リターン統計量
+
+    件数・平均・偏差平方和（Welford法）と時系列順・ソート済みのリターン列を保持し、
+    新しい日足が追加された分だけ差分更新する。
+    読み取り中の呼び出しがあるため変更せず、差分更新は新しいキャリブレーションとして返す。
+    """
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # 平均からの偏差平方和
+        self.returns = np.empty(0)  # 時系列順の日次リターン
+        self.dates = np.empty(0, dtype=object)  # 各リターンの日付（YYYY-MM-DD）
+        self.dividend_yields = np.empty(0)  # 各リターンの日の配当額 / 終値
+        self.sorted_returns = np.empty(0)
+        self.first_date: Optional[str] = None
+        self.last_date: Optional[str] = None
+        self.last_close: Optional[float] = None
+        self.checked_at = 0.0
+
+    @property
+    def mu(self) -> float:
+        """日次リターンの平均"""
+        return self.mean
+
+    @property
+    def sigma(self) -> float:
+        """日次リターンの標準偏差（不偏）"""
+        if self.count < 2:
+            return 0.0
+        return float(np.sqrt(self.m2 / (self.count - 1)))
+
+    @property
+    def dividend_yield(self) -> float:
+        """
+        直近 DIVIDEND_YIELD_DAYS 日の配当から推定した1日あたりの配当利回り
+
+        終値は配当調整済みのため、日次リターン（mu, quantile）には配当分が含まれている。
+        ドリフトと同じ単位で配当分を差し引けるよう、日次の平均として返す。
+        """
+        recent = self.dividend_yields[-DIVIDEND_YIELD_DAYS:]
+        if len(recent) == 0:
+            return 0.0
+        return float(recent.mean())
+
+    @property
+    def version(self) -> str:
+        """キャリブレーションのバージョン（最終日足の日付と件数）"""
+        return f"{self.last_date}:{self.count}"
+
+    def quantile(self, q: float) -> float:
+        """
+        日次リターンの分位点（np.quantileのlinear法と同じ補間）
+
+        ソート済み配列から直接求めるため O(1) で計算できる。
+        """
+        if self.count == 0:
+            raise ValueError(f"価格履歴がありません: {self.symbol}")
+        position = q * (self.count - 1)
+        lower = int(np.floor(position))
+        upper = min(lower + 1, self.count - 1)
+        weight = position - lower
+        return float(self.sorted_returns[lower] * (1 - weight) + self.sorted_returns[upper] * weight)
+
+    def updated(self, hist: pd.DataFrame) -> "Calibration":
+        """
+        最終日足より新しい日足を取り込み、統計量を差分更新したキャリブレーションを返す（自身は変更しない）
+
+        Args:
+            hist: Date（YYYY-MM-DD）とClose列（任意でDividend列）を持つ価格履歴
+        """
+        if self.last_date is not None:
+            hist = hist[hist["Date"] > self.last_date]
+        hist = hist.dropna(subset=["Close"])
+        if hist.empty:
+            return self
+
+        closes = hist["Close"].to_numpy(dtype=float)
+        dates = hist["Date"].to_numpy(dtype=object)
+        dividends = hist["Dividend"].fillna(0.0).to_numpy(dtype=float) if "Dividend" in hist else np.zeros(len(hist))
+        if self.last_close is not None:
+            closes = np.concatenate(([self.last_close], closes))
+        else:
+            dates = dates[1:]
+            dividends = dividends[1:]
+        new_returns = closes[1:] / closes[:-1] - 1
+        finite = np.isfinite(new_returns)
+        new_returns = new_returns[finite]
+        dates = dates[finite]
+        dividend_yields = (dividends / closes[1:])[finite]
+
+        calibration = copy.copy(self)
+        if len(new_returns) > 0:
+            # Chanらの並列アルゴリズムで平均と偏差平方和を結合
+            n = len(new_returns)
+            batch_mean = new_returns.mean()
+            batch_m2 = ((new_returns - batch_mean) ** 2).sum()
+            total = self.count + n
+            delta = batch_mean - self.mean
+            calibration.mean = self.mean + delta * n / total
+            calibration.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * n / total
+            calibration.count = total
+
+            calibration.returns = np.concatenate((self.returns, new_returns))
+            calibration.dates = np.concatenate((self.dates, dates))
+            calibration.dividend_yields = np.concatenate((self.dividend_yields, dividend_yields))
+            new_returns = np.sort(new_returns)
+            positions = np.searchsorted(self.sorted_returns, new_returns)
+            calibration.sorted_returns = np.insert(self.sorted_returns, positions, new_returns)
+
+        if calibration.first_date is None:
+            calibration.first_date = hist["Date"].iloc[0]
+        calibration.last_date = hist["Date"].iloc[-1]
+        calibration.last_close = float(hist["Close"].iloc[-1])
+        return calibration
+
+_calibrations: Dict[str, Calibration] = {}
+_lock = threading.Lock()
+
+def _refresh(calibration: Calibration) -> Calibration:
+    """
+    最終日足以降の価格履歴を取得し、差分更新したキャリブレーションを返す
+
+    最終日足も含めて取得し、その終値が保持している終値と一致する場合のみ差分更新する。
+    分割・配当で過去の終値が調整し直された場合は、調整前後の終値を比べたリターンにならないよう全期間から作り直す。
+    """
+    recent = get_price_history_since(calibration.symbol, calibration.last_date)
+    if recent.empty:
+        return calibration
+    anchor = recent.loc[recent["Date"] == calibration.last_date, "Close"]
+    if not anchor.empty and np.isclose(anchor.iloc[0], calibration.last_close, rtol=1e-6):
+        return calibration.updated(recent)
+    print(f"Rebuilding calibration for {calibration.symbol}: adjusted close changed")
+    return Calibration(calibration.symbol).updated(get_price_history_since(calibration.symbol, calibration.first_date))
+
+def get_calibration(symbol: str) -> Calibration:
+    """
+    銘柄のキャリブレーションを取得する
+
+    初回のみ全期間の価格履歴から構築し、以降は一定間隔で
+    最終日足以降の差分だけを取得して更新する。更新は新しいキャリブレーションに置き換えるため、
+    返したキャリブレーションは呼び出し元が使っている間に変わらない。
+    """
+    with _lock:
+        calibration = _calibrations.get(symbol)
+
+    if calibration is None:
+        calibration = Calibration(symbol).updated(get_price_history(symbol, PERIOD_MAP["max"]))
+        if calibration.count == 0:
+            raise ValueError(f"価格履歴がありません: {symbol}")
+        calibration.checked_at = time.time()
+        with _lock:
+            calibration = _calibrations.setdefault(symbol, calibration)
+    elif time.time() - calibration.checked_at > CALIBRATION_REFRESH_SECONDS:
+        try:
+            refreshed = _refresh(calibration)
+        except Exception as e:
+            print(f"Error refreshing calibration for {symbol}: {e}")
+            refreshed = calibration
+        refreshed.checked_at = time.time()
+        if refreshed.count > 0:
+            with _lock:
+                _calibrations[symbol] = refreshed
+            calibration = refreshed
+
+    return calibration
+
+def clear_calibrations():
+    """キャリブレーションストアを空にする（テスト・管理者用）"""
+    with _lock:
+        _calibrations.clear()
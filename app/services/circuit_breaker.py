@@ -0,0 +1,291 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from app.models.enums import CircuitState
+
+# 遮断を判定する直近の期間（秒）
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "30"))
+
+# 遮断する失敗率（直近の期間の呼び出しに対する割合）
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+
+# 遮断を判定する最小の呼び出し数（少数の失敗で遮断しないため）
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+
+# 遮断してから試行（half-open）を許可するまでの時間（秒）
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+
+class UpstreamUnavailableError(Exception):
+    """外部データソース（yfinance, Yahoo!ファイナンス, DynamoDB）の呼び出しに失敗した場合の例外"""
+
+    def __init__(self, upstream: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """サーキットブレーカーが遮断中のため呼び出さずに失敗した場合の例外"""
+
+# 外部データソースの障害とみなすHTTPステータス（5xx以外）
+FAILURE_STATUS_CODES = {408, 429}
+
+# 外部データソースの障害とみなすDynamoDBのエラーコード（スロットリング）
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+}
+
+@lru_cache(maxsize=None)
+def _transport_error_types() -> tuple:
+    """通信・タイムアウトの例外型（インストールされているライブラリのもの）"""
+    types = [ConnectionError, TimeoutError]
+    try:
+        from requests import exceptions as requests_exceptions
+        types += [requests_exceptions.ConnectionError, requests_exceptions.Timeout, requests_exceptions.RetryError]
+    except ImportError:
+        pass
+    try:
+        from curl_cffi.requests import exceptions as curl_exceptions
+        types += [curl_exceptions.ConnectionError, curl_exceptions.Timeout]
+    except ImportError:
+        pass
+    try:
+        from botocore.exceptions import HTTPClientError
+        types.append(HTTPClientError)
+    except ImportError:
+        pass
+    try:
+        from yfinance.exceptions import YFRateLimitError
+        types.append(YFRateLimitError)
+    except ImportError:
+        pass
+    return tuple(types)
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """HTTPエラーのステータスコード（requests・curl_cffiのHTTPError、botocoreのClientError）"""
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return getattr(response, "status_code", None)
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    外部データソースの障害とみなす例外か（通信エラー・タイムアウト・5xx・429・スロットリング）
+
+    存在しない銘柄や廃止された項目、呼び出し元の処理の誤りなど、外部データソースが応答した結果の例外は
+    障害とみなさない（利用者の入力で全員向けのサーキットブレーカーが遮断されないようにする）。
+    """
+    if isinstance(error, _transport_error_types()):
+        return True
+    response = getattr(error, "response", None)
+    if isinstance(response, dict) and response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES:
+        return True
+    status = _status_code(error)
+    return status is not None and (status >= 500 or status in FAILURE_STATUS_CODES)
+
+class CircuitBreaker:
+    """
+    外部データソースごとのサーキットブレーカー
+
+    直近 window_seconds 秒の呼び出しのうち min_calls 回以上・失敗率 failure_rate 以上で遮断（open）し、
+    遮断中の呼び出しは外部データソースを待たずに CircuitOpenError で即座に失敗させる。
+    open_seconds 秒後に1回だけ試行（half-open）を許可し、成功すれば復帰（closed）、失敗すれば再び遮断する。
+    失敗として数えるのは is_failure が真を返す例外（既定は通信・タイムアウト・5xx・429）のみ。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = CIRCUIT_FAILURE_RATE,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        window_seconds: float = CIRCUIT_WINDOW_SECONDS,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        is_failure: Callable[[BaseException], bool] = is_upstream_failure,
+    ):
+        self.name = name
+        self.is_failure = is_failure
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._state = CircuitState.closed
+        self._calls = deque()  # (時刻, 成功したか)
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            if self._state == CircuitState.open and time.monotonic() - self._opened_at >= self.open_seconds:
+                return CircuitState.half_open
+            return self._state
+
+    def _acquire(self):
+        """呼び出してよいか判定する（遮断中は CircuitOpenError）"""
+        with self._lock:
+            if self._state == CircuitState.closed:
+                return
+            remaining = self.open_seconds - (time.monotonic() - self._opened_at)
+            if self._state == CircuitState.open and remaining <= 0:
+                self._state = CircuitState.half_open
+            if self._state == CircuitState.half_open and not self._probing:
+                self._probing = True
+                return
+        raise CircuitOpenError(
+            self.name,
+            f"{self.name} は一時的に利用できません（サーキットブレーカー遮断中）",
+            retry_after=max(remaining, 1.0),
+        )
+
+    def _release_probe(self):
+        """呼び出さなかった試行（half-open）を取り消す"""
+        with self._lock:
+            self._probing = False
+
+    def _record(self, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            # 遮断前に開始した呼び出しの結果で遮断の開始時刻を延ばさない
+            if self._state == CircuitState.open:
+                return
+            if self._state == CircuitState.half_open:
+                self._probing = False
+                if ok:
+                    self._reset()
+                else:
+                    self._state = CircuitState.open
+                    self._opened_at = now
+                return
+
+            self._calls.append((now, ok))
+            while self._calls and self._calls[0][0] < now - self.window_seconds:
+                self._calls.popleft()
+            failures = sum(1 for _t, call_ok in self._calls if not call_ok)
+            if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.failure_rate:
+                self._state = CircuitState.open
+                self._opened_at = now
+                self._calls.clear()
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        外部データソースを呼び出す（1リクエスト分として流量制御する）
+
+        遮断中でなければ、外部データソースごとの呼び出し回数の上限（rate_limiter）に従い、
+        外部データソースごとのスレッドプール（upstream_executor）で呼び出して結果を待つ。
+
+        Raises:
+            CircuitOpenError: 遮断中の場合（外部データソースは呼び出さない）
+            UpstreamRateLimitedError: 呼び出し回数の上限に達し、待ち時間の上限内に呼び出せない場合
+            UpstreamSaturatedError: スレッドプールの実行中・実行待ちの数が上限に達している場合
+            UpstreamUnavailableError: 外部データソースの障害で失敗した場合（元の例外は __cause__）
+
+        障害とみなさない例外（存在しない銘柄など）は成功として記録し、元の例外をそのまま送出する。
+        """
+        return self.call_batch(1, fn, *args, **kwargs)
+
+    def call_batch(self, requests: int, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        複数のリクエストを送る呼び出し（yf.downloadなど）をリクエスト数分のトークンを消費して呼び出す
+
+        requests は rate_limiter.max_batch_size 以下に分割しておくこと。例外は call と同じ。
+        """
+        return self.submit_batch(requests, fn, *args, **kwargs).result()
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        外部データソースの呼び出しをスレッドプールに投入し、結果を待たずにFutureを返す
+
+        投入時の例外（CircuitOpenError など）は call と同じ。呼び出しの失敗はFutureの結果として
+        call と同じ例外（UpstreamUnavailableError など）になる。
+        """
+        return self.submit_batch(1, fn, *args, **kwargs)
+
+    def submit_batch(self, requests: int, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        リクエスト数分のトークンを消費して呼び出しを投入する（submit の複数リクエスト版）
+
+        トークンを待つ前にスレッドプールの枠を予約するため、トークンを待つ呼び出しも実行待ちの上限に数え、
+        スレッドプールが埋まっている場合はトークンを消費しない。
+        """
+        from . import rate_limiter, upstream_executor
+        self._acquire()
+        try:
+            reservation = upstream_executor.reserve(self.name)
+        except upstream_executor.UpstreamSaturatedError:
+            self._release_probe()
+            raise
+        try:
+            rate_limiter.acquire(self.name, tokens=requests)
+        except rate_limiter.UpstreamRateLimitedError:
+            reservation.cancel()
+            self._release_probe()
+            raise
+        return reservation.submit(self._invoke, fn, *args, **kwargs)
+
+    def try_submit(self, fn: Callable[..., Any], *args, **kwargs) -> Optional[Future]:
+        """
+        遮断中でなく、スレッドプールの空きとトークンがすぐに得られる場合のみ呼び出しを投入する
+
+        ヘッジの2回目の試行など、省略できる呼び出しに使う。投入できない場合はNone（待たない・実行待ちにしない）。
+        """
+        from . import rate_limiter, upstream_executor
+        try:
+            self._acquire()
+        except CircuitOpenError:
+            return None
+        reservation = upstream_executor.try_reserve(self.name)
+        if reservation is None:
+            self._release_probe()
+            return None
+        try:
+            rate_limiter.acquire(self.name, max_wait=0)
+        except rate_limiter.UpstreamRateLimitedError:
+            reservation.cancel()
+            self._release_probe()
+            return None
+        return reservation.submit(self._invoke, fn, *args, **kwargs)
+
+    def _invoke(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """外部データソースを呼び出し、結果をサーキットブレーカーに記録する"""
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if not self.is_failure(e):
+                self._record(True)
+                raise
+            self._record(False)
+            raise UpstreamUnavailableError(self.name, f"{self.name} の呼び出しに失敗しました: {e}") from e
+        self._record(True)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """現在の状態（監視用）"""
+        state = self.state
+        with self._lock:
+            calls = len(self._calls)
+            failures = sum(1 for _t, ok in self._calls if not ok)
+        return {"name": self.name, "state": state.value, "calls": calls, "failures": failures}
+
+    def reset(self):
+        """状態を初期化する（テスト・管理者用）"""
+        with self._lock:
+            self._reset()
+
+# 外部データソースごとのサーキットブレーカー
+yfinance_breaker = CircuitBreaker("yfinance")
+yahoo_japan_breaker = CircuitBreaker("yahoo_finance_japan")
+dynamodb_breaker = CircuitBreaker("dynamodb")
+
+BREAKERS: Dict[str, CircuitBreaker] = {
+    breaker.name: breaker for breaker in (yfinance_breaker, yahoo_japan_breaker, dynamodb_breaker)
+}
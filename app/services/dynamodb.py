@@ -6,6 +6,8 @@ import pandas as pd
 import os
 from dotenv import load_dotenv
 
+from .circuit_breaker import UpstreamUnavailableError, dynamodb_breaker
+
 # .env.localファイルを読み込む
 load_dotenv('.env.local')
 
@@ -27,7 +29,7 @@ def save_stock_data(stock_data: List[Dict[str, Any]]) -> bool:
     Returns:
         bool: 保存が成功したかどうか
     """
-    try:
+    def write_items():
         with table.batch_writer() as batch:
             for item in stock_data:
                 # データをDynamoDBの形式に変換（小文字keyで統一）
@@ -40,6 +42,9 @@ def save_stock_data(stock_data: List[Dict[str, Any]]) -> bool:
                     'logoUrl': item.get('logoUrl') or item.get('LogoUrl', '')
                 }
                 batch.put_item(Item=dynamo_item)
+
+    try:
+        dynamodb_breaker.call(write_items)
         return True
     except Exception as e:
         print(f"Error saving stock data: {e}")
@@ -59,11 +64,12 @@ def get_stock_data(symbol: Optional[str] = None, market: Optional[str] = None) -
     try:
         if symbol:
             # 特定の銘柄を取得
-            response = table.get_item(Key={'symbol': symbol})
+            response = dynamodb_breaker.call(table.get_item, Key={'symbol': symbol})
             return [response['Item']] if 'Item' in response else []
         elif market:
             # 特定の市場の銘柄を取得
-            response = table.query(
+            response = dynamodb_breaker.call(
+                table.query,
                 IndexName='MarketIndex',
                 KeyConditionExpression='market = :market',
                 ExpressionAttributeValues={':market': market}
@@ -71,9 +77,10 @@ def get_stock_data(symbol: Optional[str] = None, market: Optional[str] = None) -
             return response.get('Items', [])
         else:
             # 全銘柄を取得
-            response = table.scan()
+            response = dynamodb_breaker.call(table.scan)
             return response.get('Items', [])
-    except ClientError as e:
+    except (UpstreamUnavailableError, ClientError) as e:
+        # 障害中（遮断中を含む）・リクエストの誤りは空の結果として扱う
         print(f"Error getting stock data: {e}")
         return []
 
@@ -106,14 +113,15 @@ def update_stock_data(symbol: str, update_data: Dict[str, Any]) -> bool:
         update_expression = update_expression.rstrip(", ")
         
         # 更新を実行
-        table.update_item(
+        dynamodb_breaker.call(
+            table.update_item,
             Key={'symbol': symbol},
             UpdateExpression=update_expression,
             ExpressionAttributeValues=expression_attribute_values,
             ExpressionAttributeNames=expression_attribute_names
         )
         return True
-    except ClientError as e:
+    except (UpstreamUnavailableError, ClientError) as e:
         print(f"Error updating stock data: {e}")
         return False
 
@@ -128,9 +136,9 @@ def delete_stock_data(symbol: str) -> bool:
         bool: 削除が成功したかどうか
     """
     try:
-        table.delete_item(Key={'symbol': symbol})
+        dynamodb_breaker.call(table.delete_item, Key={'symbol': symbol})
         return True
-    except ClientError as e:
+    except (UpstreamUnavailableError, ClientError) as e:
         print(f"Error deleting stock data: {e}")
         return False
 
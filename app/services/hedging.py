@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Optional
+
+from .circuit_breaker import CircuitBreaker
+
+# 冪等な読み取り（価格・価格履歴・基本情報）のヘッジを有効にするか
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+
+# 2回目の試行を開始するまでの遅延に使う応答時間の分位点
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+
+# ヘッジできる呼び出しの割合の上限（外部データソースへの追加の負荷の上限）
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+
+# 遅延の推定に必要な応答時間の件数（少ない間はヘッジしない）
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+# 遅延の下限（秒）
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.05"))
+
+# 応答時間と予算を計算する直近の呼び出し数
+HEDGE_WINDOW = 200
+
+class HedgePolicy:
+    """
+    読み取りの種類ごとのヘッジの方針
+
+    直近の応答時間の分位点（p95）を過ぎても1回目の試行が返らない場合に2回目の試行を開始し、
+    先に成功した方の結果を使う。直近の呼び出しのうちヘッジした割合が budget_ratio 以上の場合はヘッジしない。
+    応答時間には、勝ち負け・成否に関わらず1回目の試行が終わるまでの時間を記録する。
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        percentile: float = HEDGE_PERCENTILE,
+        budget_ratio: float = HEDGE_BUDGET_RATIO,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        min_delay: float = HEDGE_MIN_DELAY_SECONDS,
+    ):
+        self.kind = kind
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._latencies = deque(maxlen=HEDGE_WINDOW)
+        self._calls = deque(maxlen=HEDGE_WINDOW)  # 呼び出しごとの {"hedged": ヘッジしたか}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "over_budget": 0, "skipped": 0}
+
+    def delay(self) -> Optional[float]:
+        """2回目の試行を開始するまでの遅延（秒）。応答時間の件数が足りない場合はNone"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile))
+        return max(self.min_delay, latencies[index])
+
+    def start(self) -> Dict[str, bool]:
+        """呼び出しを記録し、その呼び出しの枠を返す（try_hedge に渡す）"""
+        call = {"hedged": False}
+        with self._lock:
+            self._calls.append(call)
+            self._stats["calls"] += 1
+        return call
+
+    def try_hedge(self, call: Dict[str, bool]) -> bool:
+        """予算内であれば呼び出しの枠にヘッジを記録してTrueを返す"""
+        with self._lock:
+            hedged = sum(1 for item in self._calls if item["hedged"])
+            if hedged >= self.budget_ratio * len(self._calls):
+                self._stats["over_budget"] += 1
+                return False
+            call["hedged"] = True
+            self._stats["hedged"] += 1
+            return True
+
+    def skip_hedge(self, call: Dict[str, bool]):
+        """スレッドプールなどに空きがなく開始しなかったヘッジを取り消す"""
+        with self._lock:
+            call["hedged"] = False
+            self._stats["hedged"] -= 1
+            self._stats["skipped"] += 1
+
+    def record(self, latency: float):
+        """1回目の試行の応答時間を記録する"""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def record_hedge_win(self):
+        with self._lock:
+            self._stats["hedge_wins"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """ヘッジの状態と累計（監視用）"""
+        delay = self.delay()
+        with self._lock:
+            return {"kind": self.kind, "delay_seconds": delay, "samples": len(self._latencies), **self._stats}
+
+POLICIES: Dict[str, HedgePolicy] = {}
+_policies_lock = threading.Lock()
+
+def get_policy(kind: str) -> HedgePolicy:
+    with _policies_lock:
+        if kind not in POLICIES:
+            POLICIES[kind] = HedgePolicy(kind)
+        return POLICIES[kind]
+
+def _recorded(policy: HedgePolicy, started: float, fn: Callable[..., Any], *args, **kwargs):
+    """試行の終了時に（失敗しても）呼び出しの開始からの時間を記録する"""
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        policy.record(time.monotonic() - started)
+
+def hedged_call(kind: str, breaker: CircuitBreaker, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    冪等な読み取りをヘッジ付きで呼び出す（HEDGING_ENABLEDがfalseの場合は breaker.call でそのまま呼び出す）
+
+    1回目の試行は breaker.call と同じく外部データソースごとのスレッドプールに投入し、
+    2回目の試行は空いているスレッドとトークンがすぐに得られる場合のみ開始する（実行待ちにはしない）。
+    両方の試行が失敗した場合は最後の例外を送出する。遅れた方の試行は完了まで実行され、結果は捨てる。
+
+    Args:
+        kind: 読み取りの種類（quote, history, info など、応答時間を種類ごとに集計する）
+        breaker: 外部データソースのサーキットブレーカー
+        fn: 外部データソースの呼び出し（試行ごとに呼ばれるため、スレッドセーフでないオブジェクトは中で作ること）
+    """
+    if not HEDGING_ENABLED:
+        return breaker.call(fn, *args, **kwargs)
+
+    policy = get_policy(kind)
+    call = policy.start()
+    first = breaker.submit(_recorded, policy, time.monotonic(), fn, *args, **kwargs)
+    pending = {first}
+    delay = policy.delay()
+    if delay is not None:
+        done, _ = wait(pending, timeout=delay)
+        if not done and policy.try_hedge(call):
+            hedge = breaker.try_submit(fn, *args, **kwargs)
+            if hedge is None:
+                policy.skip_hedge(call)
+            else:
+                pending.add(hedge)
+
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if future is not first:
+                policy.record_hedge_win()
+            return result
+    raise error
+
+def get_hedging_status() -> Dict[str, Any]:
+    """種類ごとのヘッジの状態（監視用）"""
+    with _policies_lock:
+        policies = list(POLICIES.values())
+    return {"enabled": HEDGING_ENABLED, "policies": [policy.snapshot() for policy in policies]}
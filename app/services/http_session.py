@@ -0,0 +1,89 @@
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 接続・読み取りのタイムアウト（秒）
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "3"))
+HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "10"))
+
+# 接続先ごとに保持する接続数（keep-alive）
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+# 接続エラー・一時的なエラー（502, 503, 504）の再試行回数（GETのみ）
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+class PooledSession(requests.Session):
+    """タイムアウトを省略した場合に既定のタイムアウトを使うセッション"""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS))
+        return super().request(method, url, **kwargs)
+
+_http_session: Optional[requests.Session] = None
+_yfinance_session = None
+_lock = threading.Lock()
+
+def _new_http_session() -> requests.Session:
+    session = PooledSession()
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+def get_http_session() -> requests.Session:
+    """
+    プロセス全体で共有するHTTPセッション（Yahoo!ファイナンスのスクレイピングなど）
+
+    接続を保持して再利用し（TCP/TLSのハンドシェイクを省く）、既定のタイムアウトと再試行を設定する。
+    """
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            _http_session = _new_http_session()
+        return _http_session
+
+def get_yfinance_session():
+    """
+    yfinanceに渡すプロセス全体で共有するセッション
+
+    yfinanceはブラウザを模したcurl_cffiのセッションを前提とするため、利用できる場合はcurl_cffiの
+    セッションを共有し、利用できない場合は get_http_session() と同じ設定のセッションを使う。
+    """
+    global _yfinance_session
+    with _lock:
+        if _yfinance_session is None:
+            try:
+                from curl_cffi import requests as curl_requests
+                _yfinance_session = curl_requests.Session(
+                    impersonate="chrome",
+                    timeout=(HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS),
+                )
+            except ImportError:
+                _yfinance_session = _new_http_session()
+        return _yfinance_session
+
+def close_sessions():
+    """共有セッションの接続を閉じる（アプリケーション終了時に呼び出す）"""
+    global _http_session, _yfinance_session
+    with _lock:
+        sessions = [session for session in (_http_session, _yfinance_session) if session is not None]
+        _http_session = _yfinance_session = None
+    for session in sessions:
+        session.close()
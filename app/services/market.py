@@ -5,7 +5,7 @@ from rapidfuzz import process, fuzz
 from pathlib import Path
 import random
 import re
-from app.models.enums import AssetType
+from app.models.enums import AssetType, Exchange, UpstreamPriority
 from datetime import date, timedelta, datetime, timezone
 import os
 from .dynamodb import (
@@ -15,10 +15,18 @@ from .dynamodb import (
     convert_to_dataframe
 )
 from typing import List, Dict, Any, Optional
-import requests
 from bs4 import BeautifulSoup
 import time
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .market_hours import is_market_open, quote_ttl
+from .single_flight import single_flight
+from .circuit_breaker import UpstreamUnavailableError, yahoo_japan_breaker, yfinance_breaker
+from .rate_limiter import max_batch_size, upstream_priority
+from .hedging import hedged_call
+from .http_session import get_http_session, get_yfinance_session
 
 TICKER_CACHE = Path(__file__).with_suffix(".csv")
 JPX_DATA_FILE = Path(__file__).parent / "data.csv"  # .xlsから.csvに変更
@@ -266,60 +274,6 @@ SECTOR_STOCKS = {
     ],
 }
 
-# キャッシュされた価格データ（最適化版用）
-CACHED_PRICES = {
-    # 米国株（USD）
-    "AAPL": {"price": 227.52, "change_percent": 1.8},
-    "MSFT": {"price": 415.26, "change_percent": 0.9},
-    "GOOGL": {"price": 178.89, "change_percent": -0.5},
-    "AMZN": {"price": 207.09, "change_percent": 2.1},
-    "TSLA": {"price": 248.5, "change_percent": -1.2},
-    "META": {"price": 555.31, "change_percent": 1.5},
-    "NVDA": {"price": 145.89, "change_percent": 3.2},
-    "NFLX": {"price": 891.38, "change_percent": -0.4},
-    "PYPL": {"price": 86.12, "change_percent": 0.3},
-    "ADBE": {"price": 512.78, "change_percent": -0.7},
-    "CRM": {"price": 329.45, "change_percent": 1.0},
-    "ORCL": {"price": 189.67, "change_percent": 0.5},
-    "IBM": {"price": 225.34, "change_percent": -0.2},
-    "INTC": {"price": 21.89, "change_percent": 2.3},
-    "AMD": {"price": 125.67, "change_percent": 1.8},
-    "DIS": {"price": 113.58, "change_percent": -0.6},
-    "SBUX": {"price": 97.45, "change_percent": 0.8},
-    "ABNB": {"price": 125.78, "change_percent": 1.2},
-    "COIN": {"price": 278.9, "change_percent": 4.5},
-    "SQ": {"price": 78.23, "change_percent": 2.1},
-    
-    # 日本株（円）
-    "7203.T": {"price": 2891, "change_percent": 0.7},
-    "6758.T": {"price": 2855, "change_percent": -0.3},
-    "7267.T": {"price": 1489, "change_percent": 1.1},
-    "9432.T": {"price": 143.8, "change_percent": 0.2},
-    "6752.T": {"price": 1233, "change_percent": -0.8},
-    "7974.T": {"price": 6890, "change_percent": 1.5},
-    "9984.T": {"price": 9876, "change_percent": -2.1},
-    "6902.T": {"price": 8760, "change_percent": 0.9},
-    "4502.T": {"price": 4123, "change_percent": -0.5},
-    "8058.T": {"price": 3245, "change_percent": 1.3},
-    "8031.T": {"price": 4567, "change_percent": 0.6},
-    "9983.T": {"price": 32100, "change_percent": 2.8},
-    "4755.T": {"price": 1234, "change_percent": -1.5},
-    "9201.T": {"price": 2567, "change_percent": 0.4},
-    "9202.T": {"price": 3456, "change_percent": -0.7},
-    
-    # ETF
-    "SPY": {"price": 601.45, "change_percent": 0.6},
-    "QQQ": {"price": 519.23, "change_percent": 1.1},
-    "VTI": {"price": 295.67, "change_percent": 0.4},
-    "VOO": {"price": 551.23, "change_percent": 0.5},
-    "IWM": {"price": 234.78, "change_percent": 0.9},
-    "VEA": {"price": 52.34, "change_percent": 0.3},
-    "VWO": {"price": 43.67, "change_percent": 0.8},
-    "GLD": {"price": 245.89, "change_percent": -0.2},
-    "TLT": {"price": 87.45, "change_percent": -0.6},
-    "EFA": {"price": 78.23, "change_percent": 0.1},
-}
-
 @lru_cache(maxsize=1)
 def load_ticker_master():
     """銘柄マスターデータをロードする関数"""
@@ -655,17 +609,100 @@ def search_in_dataframe(query: str, limit: int, market: str, df: pd.DataFrame):
 
 
 
-@lru_cache(maxsize=256)
-def get_price_history(symbol: str, period: str):
-    """指定された銘柄の価格履歴を取得する"""
-    ticker = yf.Ticker(symbol)
-    hist = ticker.history(period=period)
-    dividends = ticker.dividends
+# 銘柄の基本情報（Ticker.info）と配当履歴のキャッシュ有効期間（秒）
+TICKER_DATA_TTL_SECONDS = float(os.getenv("TICKER_DATA_TTL_SECONDS", str(15 * 60)))
+
+# 銘柄の基本情報と配当履歴をキャッシュする件数（銘柄はリクエストで任意に指定できるため上限を設ける）
+TICKER_DATA_CACHE_SIZE = int(os.getenv("TICKER_DATA_CACHE_SIZE", "512"))
+
+# 銘柄の基本情報と配当履歴のLRUキャッシュ {(銘柄シンボル, 種類): (値, 有効期限のUNIX時間)}
+_ticker_data_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_ticker_data_lock = threading.Lock()
+
+def _ticker_info(symbol: str) -> Dict[str, Any]:
+    """yfinanceから銘柄の基本情報を取得する（yf.Tickerはスレッドセーフでないため、ヘッジの試行ごとに作る）"""
+    return yf.Ticker(symbol, session=get_yfinance_session()).info
+
+def _ticker_history(symbol: str, **history_kwargs) -> pd.DataFrame:
+    """yfinanceから価格履歴を取得する（yf.Tickerはスレッドセーフでないため、ヘッジの試行ごとに作る）"""
+    return yf.Ticker(symbol, session=get_yfinance_session()).history(**history_kwargs)
+
+@single_flight("ticker_data")
+def _get_ticker_data(symbol: str, kind: str):
+    """キャッシュから銘柄の基本情報・配当履歴を取得する（なければyfinanceから取得してキャッシュする）"""
+    with _ticker_data_lock:
+        entry = _ticker_data_cache.get((symbol, kind))
+        if entry is not None:
+            _ticker_data_cache.move_to_end((symbol, kind))
+    if entry is not None and entry[1] > time.time():
+        return entry[0]
+
+    if kind == "info":
+        value = hedged_call("info", yfinance_breaker, _ticker_info, symbol) or {}
+    else:
+        ticker = yf.Ticker(symbol, session=get_yfinance_session())
+        value = yfinance_breaker.call(lambda: ticker.dividends)
+    _store_ticker_data((symbol, kind), value)
+    return value
+
+def _store_ticker_data(key: tuple, value):
+    """基本情報・配当履歴をキャッシュし、有効期限切れの値と上限を超えた分（最も古く使われたもの）を削除する"""
+    now = time.time()
+    with _ticker_data_lock:
+        _ticker_data_cache[key] = (value, now + TICKER_DATA_TTL_SECONDS)
+        _ticker_data_cache.move_to_end(key)
+        for expired in [k for k, (_, expires_at) in _ticker_data_cache.items() if expires_at <= now]:
+            del _ticker_data_cache[expired]
+        while len(_ticker_data_cache) > TICKER_DATA_CACHE_SIZE:
+            _ticker_data_cache.popitem(last=False)
+
+def get_ticker_info(symbol: str) -> Dict[str, Any]:
+    """
+    銘柄の基本情報（yfinanceのTicker.info）を取得する
+
+    詳細・企業情報・プロフィール・ファンダメンタル・配当履歴で共有し、
+    TICKER_DATA_TTL_SECONDSの間はyfinanceに問い合わせない。取得に失敗した場合は例外を送出する。
+    """
+    return dict(_get_ticker_data(symbol, "info"))
+
+def get_ticker_dividends(symbol: str) -> pd.Series:
+    """銘柄の配当履歴（yfinanceのTicker.dividends）を取得する（get_ticker_infoと同じ有効期間でキャッシュ）"""
+    return _get_ticker_data(symbol, "dividends").copy()
+
+def clear_ticker_data_cache():
+    """銘柄の基本情報と配当履歴のキャッシュを空にする（テスト・管理者用）"""
+    with _ticker_data_lock:
+        _ticker_data_cache.clear()
+
+def _fetch_price_history(symbol: str, **history_kwargs):
+    """yfinanceから価格履歴を取得し、日付文字列と配当列を付与する"""
+    hist = hedged_call("history", yfinance_breaker, _ticker_history, symbol, **history_kwargs)
     hist = hist.reset_index()
     hist["Date"] = hist["Date"].dt.strftime("%Y-%m-%d")
-    hist["Dividend"] = hist["Date"].map(dividends.to_dict()).fillna(0.0)
+    if "Dividends" in hist:
+        hist["Dividend"] = hist["Dividends"].fillna(0.0)
+    else:
+        # 配当の日付はTimestampのため、日付文字列に揃えてから対応付ける
+        dividends = get_ticker_dividends(symbol)
+        dividends.index = dividends.index.strftime("%Y-%m-%d")
+        hist["Dividend"] = hist["Date"].map(dividends.groupby(level=0).sum()).fillna(0.0)
     return hist
 
+@lru_cache(maxsize=256)
+def get_price_history(symbol: str, period: str):
+    """指定された銘柄の価格履歴を取得する"""
+    return _fetch_price_history(symbol, period=period)
+
+def get_price_history_since(symbol: str, start: str):
+    """
+    指定日以降の価格履歴を取得する（差分更新用、キャッシュなし）
+
+    Args:
+        symbol: 銘柄シンボル
+        start: 取得開始日（YYYY-MM-DD、当日を含む）
+    """
+    return _fetch_price_history(symbol, start=start)
+
 def reset_ticker_cache():
     """
     銘柄マスタのキャッシュを再構築する関数（管理者用）
@@ -702,6 +739,7 @@ def reset_ticker_cache():
         save_stock_data(df.to_dict('records'))
         return df
 
+@single_flight("company_info")
 def get_company_info(symbol: str):
     """
     シンボルから企業情報を取得する関数
@@ -716,8 +754,7 @@ def get_company_info(symbol: str):
             if stock_data and len(stock_data) > 0:
                 japanese_name = stock_data[0].get("name")
         
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+        info = get_ticker_info(symbol)
         
         # 企業名を取得（複数のフィールドを試す）
         company_name = None
@@ -764,72 +801,274 @@ def get_company_info(symbol: str):
         logo_url = LOGO_URLS.get(symbol)
         return {"name": f"{symbol} Stock", "logoUrl": logo_url}
 
-def get_stock_price(symbol: str):
+def _quote_from_history(data: pd.DataFrame) -> Optional[Dict[str, Any]]:
     """
-    銘柄の価格情報を取得する関数
-    yfinanceから最新データを取得します
+    価格履歴から価格情報（最新の終値、前日比、データ取得時刻）を作成する
+
+    Returns:
+        価格情報の辞書（データがない場合はNone）
+    """
+    data = data.dropna(subset=['Close'])
+    if data.empty:
+        return None
+
+    # 最新の終値
+    latest_price = data['Close'].iloc[-1]
+    # データ取得時刻（最新のデータの日時）
+    last_updated = data.index[-1]
+
+    # 前日比の変化率を計算
+    if len(data) > 1:
+        prev_close = data['Close'].iloc[-2]
+        change_percent = ((latest_price - prev_close) / prev_close) * 100
+    else:
+        # 1日分のデータしかない場合
+        change_percent = 0
+
+    # UTCに変換して返却
+    utc_time = last_updated.astimezone(timezone.utc)
+
+    return {
+        "price": round(float(latest_price), 2),
+        "change_percent": round(float(change_percent), 1),
+        "last_updated": utc_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    }
+
+class QuoteNotFoundError(Exception):
+    """価格データがなく（存在しない・上場廃止の銘柄など）、過去に取得した値もない場合の例外"""
+
+# 価格情報のキャッシュ（直近に取得できた値） {銘柄シンボル: (価格情報, 有効期限のUNIX時間)}
+# 有効期限を過ぎた値も削除せず、取得に失敗した場合の最終既知値として返す
+_quote_cache: Dict[str, tuple] = {}
+_quote_cache_lock = threading.Lock()
+
+# バックグラウンドで再取得中の銘柄
+_refreshing_quotes = set()
+_quote_refresh_executor = None
+
+def _get_cached_quote(symbol: str, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    キャッシュから価格情報を取得する
+
+    Args:
+        allow_stale: 有効期限を過ぎた値も返すか（返す場合は is_stale=True）
+    """
+    with _quote_cache_lock:
+        entry = _quote_cache.get(symbol)
+    if entry is None:
+        return None
+    quote, expires_at = entry
+    is_stale = expires_at <= time.time()
+    if is_stale and not allow_stale:
+        return None
+    return {**quote, "is_stale": is_stale}
+
+def _store_quote(symbol: str, quote: Dict[str, Any]):
+    """
+    価格情報をキャッシュする
+
+    有効期間は取引所の立会時間に応じて決める（立会中は数秒、休場中は次の立会開始まで）。
+    """
+    with _quote_cache_lock:
+        _quote_cache[symbol] = (dict(quote), time.time() + quote_ttl(symbol))
+
+def clear_quote_cache():
+    """価格情報のキャッシュを空にする（テスト・管理者用）"""
+    with _quote_cache_lock:
+        _quote_cache.clear()
+
+def _fetch_stock_price(symbol: str) -> Optional[Dict[str, Any]]:
+    """
+    yfinanceから最新の価格情報を取得する（価格データがない場合はNone）
+
+    Raises:
+        UpstreamUnavailableError: 外部データソースの障害・遮断中・流量制御で取得できない場合
     """
     # シンボルから市場を判断
     is_japan_stock = symbol.endswith(".T")
-    currency_symbol = "¥" if is_japan_stock else "$"
-    
+
     try:
-        ticker = yf.Ticker(symbol)
-        
         # 日本株の場合、取引時間内かどうかを判定
         if is_japan_stock:
-            current_time = datetime.now(timezone(timedelta(hours=9)))  # JST
-            is_trading_hours = (
-                current_time.weekday() < 5 and  # 平日
-                9 <= current_time.hour < 15 or  # 9:00-15:00
-                (current_time.hour == 15 and current_time.minute <= 30)  # 15:00-15:30
-            )
-            
-            if is_trading_hours:
+            if is_market_open(Exchange.TSE):
                 # 取引時間内は1分足のデータを取得
-                data = ticker.history(period="1d", interval="1m")
+                data = hedged_call("quote", yfinance_breaker, _ticker_history, symbol, period="1d", interval="1m")
             else:
-                # 取引時間外は日足のデータを取得
-                data = ticker.history(period="1d")
+                # 取引時間外は日足のデータを取得（前日比のため前営業日を含める）
+                data = hedged_call("quote", yfinance_breaker, _ticker_history, symbol, period="5d")
         else:
-            # 米国株の場合は日足のデータを取得
-            data = ticker.history(period="1d")
-        
-        if not data.empty:
-            # 最新の終値
-            latest_price = data['Close'].iloc[-1]
-            # データ取得時刻（最新のデータの日時）
-            last_updated = data.index[-1]
-            
-            # 前日比の変化率を計算
-            if len(data) > 1:
-                prev_close = data['Close'].iloc[-2]
-                change_percent = ((latest_price - prev_close) / prev_close) * 100
-            else:
-                # 1日分のデータしかない場合
-                change_percent = 0
-            
-            # UTCに変換して返却
-            utc_time = last_updated.astimezone(timezone.utc)
-            
-            return {
-                "price": round(latest_price, 2),
-                "change_percent": round(change_percent, 1),
-                "last_updated": utc_time.strftime("%Y-%m-%dT%H:%M:%SZ")
-            }
+            # 米国株の場合は日足のデータを取得（前日比のため前営業日を含める）
+            data = hedged_call("quote", yfinance_breaker, _ticker_history, symbol, period="5d")
+
+        return _quote_from_history(data)
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
+        # 障害とみなさない例外（存在しない銘柄など）は価格データがないものとして扱う
         print(f"Error fetching price for {symbol}: {e}")
-    
-    # エラーが発生した場合や、データが取得できない場合はランダムな値を返す
-    price = round(random.uniform(10, 1000), 2)
-    change = round(random.uniform(-5, 5), 1)
-    current_utc = datetime.now(timezone.utc)
-    
-    return {
-        "price": price,
-        "change_percent": change,
-        "last_updated": current_utc.strftime("%Y-%m-%dT%H:%M:%SZ")
-    }
+        return None
+
+def _refresh_quote(symbol: str):
+    """価格情報を再取得してキャッシュを更新する（失敗した場合は最終既知値を残す）"""
+    try:
+        with upstream_priority(UpstreamPriority.background):
+            quote = _fetch_stock_price(symbol)
+        if quote:
+            _store_quote(symbol, quote)
+    except UpstreamUnavailableError as e:
+        print(f"Error refreshing price for {symbol}: {e}")
+    finally:
+        with _quote_cache_lock:
+            _refreshing_quotes.discard(symbol)
+
+def _refresh_quote_in_background(symbol: str):
+    """価格情報の再取得をバックグラウンドで開始する（同じ銘柄の再取得は1つだけ）"""
+    global _quote_refresh_executor
+    with _quote_cache_lock:
+        if symbol in _refreshing_quotes:
+            return
+        _refreshing_quotes.add(symbol)
+        if _quote_refresh_executor is None:
+            _quote_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="quote-refresh")
+        executor = _quote_refresh_executor
+    executor.submit(_refresh_quote, symbol)
+
+@single_flight("quote")
+def get_stock_price(symbol: str):
+    """
+    銘柄の価格情報を取得する関数
+    yfinanceから最新データを取得します（立会時間に応じた有効期間でキャッシュ）
+
+    有効期限を過ぎた値がある場合は、その値を is_stale=True として即座に返し、
+    バックグラウンドで再取得する（stale-while-revalidate）。
+
+    Raises:
+        QuoteNotFoundError: 価格データがなく、過去に取得した値もない場合
+        UpstreamUnavailableError: 外部データソースの障害などで取得できず、過去に取得した値もない場合
+    """
+    cached = _get_cached_quote(symbol, allow_stale=True)
+    if cached:
+        if cached["is_stale"]:
+            _refresh_quote_in_background(symbol)
+        return cached
+
+    quote = _fetch_stock_price(symbol)
+    if not quote:
+        raise QuoteNotFoundError(f"価格情報がありません: {symbol}")
+    _store_quote(symbol, quote)
+    return {**quote, "is_stale": False}
+
+def _download_quotes(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    複数銘柄の価格情報をyf.downloadでまとめて取得し、キャッシュする
+
+    yf.downloadは銘柄ごとにリクエストを送るため、流量制御のトークンを銘柄数分消費する。
+    1回に消費できるトークン数（max_batch_size）ごとに分割し、
+    yf.download内のスレッドは使わずに順に取得する（同時接続数は外部データソース用のスレッドプールで制限する）。
+
+    Returns:
+        {銘柄シンボル: 価格情報}（価格が得られなかった銘柄は含めない）
+    """
+    quotes = {}
+    batch_size = max_batch_size(yfinance_breaker.name) or len(symbols)
+    for start in range(0, len(symbols), batch_size):
+        batch = symbols[start:start + batch_size]
+        try:
+            data = yfinance_breaker.call_batch(
+                len(batch),
+                yf.download,
+                batch,
+                period="5d",
+                interval="1d",
+                group_by="ticker",
+                auto_adjust=True,
+                progress=False,
+                threads=False,
+                session=get_yfinance_session(),
+            )
+        except UpstreamUnavailableError as e:
+            # 障害・流量制御の上限に達した場合は残りの銘柄も取得しない
+            print(f"Error fetching prices for {batch}: {e}")
+            break
+        except Exception as e:
+            print(f"Error fetching prices for {batch}: {e}")
+            continue
+        if data is None or data.empty:
+            continue
+        for symbol in batch:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                frame = data[symbol]
+            else:
+                # 1銘柄の場合は銘柄の階層がない
+                frame = data
+            quote = _quote_from_history(frame)
+            if quote:
+                _store_quote(symbol, quote)
+                quotes[symbol] = {**quote, "is_stale": False}
+    return quotes
+
+def get_stock_prices(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    複数銘柄の価格情報をまとめて取得する関数
+
+    キャッシュにない投資信託以外の銘柄を1回のyf.downloadでまとめて取得し、銘柄ごとに分割する。
+    有効期限を過ぎた値がある銘柄はその値（is_stale=True）を返し、バックグラウンドで再取得する。
+    一括取得で価格が得られなかった銘柄のみ個別に取得し、それでも得られない銘柄は結果に含めない。
+    投資信託は対象外（get_mutual_fund_price_data を使用する）。
+
+    Args:
+        symbols: 銘柄シンボルのリスト
+
+    Returns:
+        {銘柄シンボル: 価格情報（price, change_percent, last_updated, is_stale）}
+    """
+    symbols = list(dict.fromkeys(symbol for symbol in symbols if not is_mutual_fund_symbol(symbol)))
+    quotes = {}
+    for symbol in symbols:
+        cached = _get_cached_quote(symbol, allow_stale=True)
+        if cached:
+            if cached["is_stale"]:
+                _refresh_quote_in_background(symbol)
+            quotes[symbol] = cached
+
+    # キャッシュにない銘柄のみまとめて取得
+    symbols = [symbol for symbol in symbols if symbol not in quotes]
+    if not symbols:
+        return quotes
+    quotes.update(_download_quotes(symbols))
+
+    # 一括取得で得られなかった銘柄は個別に取得
+    for symbol in symbols:
+        if symbol not in quotes:
+            try:
+                quotes[symbol] = get_stock_price(symbol)
+            except (QuoteNotFoundError, UpstreamUnavailableError) as e:
+                print(e)
+    return quotes
+
+def refresh_stock_prices(symbols: List[str], min_ttl: float = 0) -> Dict[str, Dict[str, Any]]:
+    """
+    複数銘柄の価格情報をまとめて再取得してキャッシュを更新する（人気銘柄の事前取得用）
+
+    Args:
+        symbols: 銘柄シンボルのリスト（投資信託は対象外）
+        min_ttl: キャッシュの残り有効期間がこの秒数より長い銘柄は再取得しない
+
+    Returns:
+        {銘柄シンボル: 価格情報}（再取得できた銘柄のみ）
+    """
+    deadline = time.time() + min_ttl
+    with _quote_cache_lock:
+        symbols = [
+            symbol for symbol in dict.fromkeys(symbols)
+            if not is_mutual_fund_symbol(symbol)
+            and (symbol not in _quote_cache or _quote_cache[symbol][1] <= deadline)
+        ]
+    if not symbols:
+        return {}
+    return _download_quotes(symbols)
 
 # 銘柄マスタを修正して日本株を追加する
 def add_japan_stocks_to_cache():
@@ -1362,8 +1601,7 @@ def get_market_details(symbol: str):
         currency_symbol = "¥" if is_japan_stock else "$"
         
         # 基本情報を取得
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+        info = get_ticker_info(symbol)
         
         # 価格情報を取得
         price_data = get_stock_price(symbol)
@@ -1432,12 +1670,16 @@ def get_market_details(symbol: str):
             "trading_info": trading_info,
             "dividend_yield": dividend_yield,
             "company_profile": company_profile_data,
-            "last_updated": last_updated
+            "last_updated": last_updated,
+            "is_stale": price_data.get("is_stale", False)
         }
+    except (QuoteNotFoundError, UpstreamUnavailableError):
+        raise
     except Exception as e:
         print(f"Error fetching market details for {symbol}: {e}")
         raise ValueError(f"Failed to fetch market details for {symbol}")
 
+@single_flight("chart")
 def get_chart_data(symbol: str, period: str = "3M", interval: str = "1D"):
     """
     チャートデータを取得する関数
@@ -1480,13 +1722,12 @@ def get_chart_data(symbol: str, period: str = "3M", interval: str = "1D"):
         yf_interval = interval_mapping.get(interval, "1d")
         
         # データ取得（変換されたシンボルを使用）
-        ticker = yf.Ticker(yf_symbol)
-        data = ticker.history(period=yf_period, interval=yf_interval)
+        data = hedged_call("history", yfinance_breaker, _ticker_history, yf_symbol, period=yf_period, interval=yf_interval)
         
         # データが空または少ない場合の対応
         if len(data) <= 1 and period == "1D":
             # 1Dでデータが少ない場合は、2日分のデータを取得して最新日のみフィルタリング
-            fallback_data = ticker.history(period="2d", interval="5m")
+            fallback_data = yfinance_breaker.call(_ticker_history, yf_symbol, period="2d", interval="5m")
             # 最新の取引日のデータのみをフィルタリング
             if not fallback_data.empty:
                 latest_date = fallback_data.index.date.max()
@@ -1510,6 +1751,8 @@ def get_chart_data(symbol: str, period: str = "3M", interval: str = "1D"):
             "interval": interval,
             "data": chart_data
         }
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         # 指数シンボル変換情報を含むエラーメッセージ
         yf_symbol = convert_index_symbol(symbol)
@@ -1520,6 +1763,7 @@ def get_chart_data(symbol: str, period: str = "3M", interval: str = "1D"):
         print(error_msg)
         raise ValueError(f"Failed to fetch chart data for {symbol}")
 
+@single_flight("fundamental")
 def get_fundamental_data(symbol: str):
     """
     ファンダメンタル分析データを取得する関数
@@ -1531,15 +1775,15 @@ def get_fundamental_data(symbol: str):
         dict: ファンダメンタル分析データ
     """
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+        ticker = yf.Ticker(symbol, session=get_yfinance_session())
+        info = get_ticker_info(symbol)
         
         # 実際の四半期業績データを取得
         try:
             # yfinanceから四半期財務データを取得
-            earnings_data = ticker.earnings
-            earnings_quarterly = ticker.quarterly_earnings
-            earnings_dates = ticker.earnings_dates
+            earnings_data = yfinance_breaker.call(lambda: ticker.earnings)
+            earnings_quarterly = yfinance_breaker.call(lambda: ticker.quarterly_earnings)
+            earnings_dates = yfinance_breaker.call(lambda: ticker.earnings_dates)
             
             # 四半期EPSデータがあるか確認
             has_quarterly_data = earnings_quarterly is not None and not earnings_quarterly.empty
@@ -1796,11 +2040,13 @@ def get_fundamental_data(symbol: str):
             "dividend_history": dividend_history,
             "valuation_growth": valuation_growth
         }
+    except UpstreamUnavailableError:
+        raise
     except Exception as e:
         print(f"Error fetching fundamental data for {symbol}: {e}")
         raise ValueError(f"Failed to fetch fundamental data for {symbol}")
 
-@lru_cache(maxsize=2048)  # キャッシュサイズを増加
+# 関連銘柄の選定は事前定義データから行い、価格は都度キャッシュから読むため結果はキャッシュしない
 def get_related_markets(symbol: str, limit: int = 5, criteria: str = "industry", min_dividend_yield: float = None):
     """
     関連銘柄を取得する最適化版関数
@@ -1831,26 +2077,28 @@ def get_related_markets(symbol: str, limit: int = 5, criteria: str = "industry",
         # 結果を制限
         related_symbols = related_symbols[:limit]
         
+        # 価格情報はキャッシュ（人気銘柄は quote_warmer が事前取得）から読み、ない銘柄のみまとめてAPI呼び出し
+        related_symbol_list = [stock_info['symbol'] for stock_info in related_symbols]
+        try:
+            fetched_prices = get_stock_prices(related_symbol_list)
+        except Exception as e:
+            print(f"Error getting prices for {related_symbol_list}: {e}")
+            fetched_prices = {}
+        
         # 高速化された価格情報取得
         items = []
         for stock_info in related_symbols:
             rel_symbol = stock_info['symbol']
             
-            # 事前定義価格データから取得（高速）
-            price_info = CACHED_PRICES.get(rel_symbol)
-            if not price_info:
-                # キャッシュにない場合のみAPI呼び出し
-                try:
-                    price_info = get_stock_price(rel_symbol)
-                except:
-                    price_info = {"price": 0, "change_percent": 0}
+            # 価格を取得できなかった銘柄は価格なし（None）とする
+            price_info = fetched_prices.get(rel_symbol)
             
             # 通貨記号を決定（日本株は¥、その他は$）
             is_japan_stock = rel_symbol.endswith('.T')
             currency_symbol = "¥" if is_japan_stock else "$"
             
             # 価格を通貨記号付きでフォーマット
-            formatted_price = f"{currency_symbol}{price_info['price']:.2f}"
+            formatted_price = f"{currency_symbol}{price_info['price']:.2f}" if price_info else None
             
             # ロゴURLを取得
             logo_url = LOGO_URLS.get(rel_symbol)
@@ -1862,7 +2110,8 @@ def get_related_markets(symbol: str, limit: int = 5, criteria: str = "industry",
                 "symbol": rel_symbol,
                 "name": stock_info['name'],
                 "price": formatted_price,
-                "change_percent": price_info["change_percent"],
+                "change_percent": price_info["change_percent"] if price_info else None,
+                "is_stale": price_info.get("is_stale", False) if price_info else False,
                 "logo_url": logo_url,
                 "dividend_yield": dividend_yield
             })
@@ -2040,35 +2289,41 @@ def _get_dividend_yield_optimized(symbol: str, limit: int, min_dividend_yield: f
         min_range = min_dividend_yield - tolerance
         max_range = min_dividend_yield + tolerance
         
-        for stock_symbol, stock_data in dividend_stocks_by_yield.items():
-            if min_range <= stock_data['yield'] <= max_range:
-                # リアルタイムで最新の価格データを取得
-                try:
-                    price_info = get_stock_price(stock_symbol)
-                    if not price_info or "price" not in price_info:
-                        price_info = {"price": 0, "change_percent": 0}
-                except Exception as e:
-                    print(f"Error getting price for {stock_symbol}: {e}")
-                    price_info = {"price": 0, "change_percent": 0}
-                
-                # 通貨記号を決定（日本株は¥、その他は$）
-                is_japan_stock = stock_symbol.endswith('.T')
-                currency_symbol = "¥" if is_japan_stock else "$"
-                
-                # ロゴURLを取得
-                logo_url = LOGO_URLS.get(stock_symbol)
-                
-                # 価格を通貨記号付きでフォーマット
-                formatted_price = f"{currency_symbol}{price_info['price']:.2f}"
-                
-                qualifying_stocks.append({
-                    "symbol": stock_symbol,
-                    "name": stock_data['name'],
-                    "price": formatted_price,
-                    "change_percent": price_info["change_percent"],
-                    "logo_url": logo_url,
-                    "dividend_yield": f"{stock_data['yield']:.2f}%"
-                })
+        # 条件に合う銘柄の最新の価格データをまとめて取得
+        qualifying_symbols = [
+            stock_symbol for stock_symbol, stock_data in dividend_stocks_by_yield.items()
+            if min_range <= stock_data['yield'] <= max_range
+        ]
+        try:
+            fetched_prices = get_stock_prices(qualifying_symbols)
+        except Exception as e:
+            print(f"Error getting prices for {qualifying_symbols}: {e}")
+            fetched_prices = {}
+        
+        for stock_symbol in qualifying_symbols:
+            stock_data = dividend_stocks_by_yield[stock_symbol]
+            # 価格を取得できなかった銘柄は価格なし（None）とする
+            price_info = fetched_prices.get(stock_symbol)
+            
+            # 通貨記号を決定（日本株は¥、その他は$）
+            is_japan_stock = stock_symbol.endswith('.T')
+            currency_symbol = "¥" if is_japan_stock else "$"
+            
+            # ロゴURLを取得
+            logo_url = LOGO_URLS.get(stock_symbol)
+            
+            # 価格を通貨記号付きでフォーマット
+            formatted_price = f"{currency_symbol}{price_info['price']:.2f}" if price_info else None
+            
+            qualifying_stocks.append({
+                "symbol": stock_symbol,
+                "name": stock_data['name'],
+                "price": formatted_price,
+                "change_percent": price_info["change_percent"] if price_info else None,
+                "is_stale": price_info.get("is_stale", False) if price_info else False,
+                "logo_url": logo_url,
+                "dividend_yield": f"{stock_data['yield']:.2f}%"
+            })
         
         # 利回り率の高い順にソート
         qualifying_stocks.sort(key=lambda x: float(x['dividend_yield'].replace('%', '')), reverse=True)
@@ -2549,6 +2804,7 @@ def format_market_cap(market_cap_value, currency_symbol=""):
         print(f"時価総額の整形中にエラーが発生しました: {e}")
         return None
 
+@single_flight("company_profile")
 def get_company_profile(symbol: str):
     """
     企業プロフィール情報を取得する関数
@@ -2560,8 +2816,7 @@ def get_company_profile(symbol: str):
         dict: 企業プロフィール情報
     """
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+        info = get_ticker_info(symbol)
         
         # 通貨記号を決定
         currency_symbol = "¥" if symbol.endswith('.T') else "$"
@@ -2724,10 +2979,8 @@ def get_dividend_history(symbol: str, years: int = None):
         List[Dict]: 配当履歴データ
     """
     try:
-        ticker = yf.Ticker(symbol)
-        
         # yfinanceから配当履歴を取得
-        dividends = ticker.dividends
+        dividends = get_ticker_dividends(symbol)
         
         if dividends.empty:
             print(f"銘柄 {symbol} の配当履歴が見つかりません")
@@ -2787,7 +3040,7 @@ def get_dividend_history(symbol: str, years: int = None):
             if current_fiscal_year_str not in dividend_by_year:
                 try:
                     # yfinanceから予想配当を取得
-                    info = ticker.info
+                    info = get_ticker_info(symbol)
                     dividend_rate = info.get('dividendRate')
                     
                     if dividend_rate and dividend_rate > 0:
@@ -2910,33 +3163,6 @@ SECTOR_STOCKS = {
     ],
 }
 
-# 事前定義された価格データ（キャッシュ代替用）
-CACHED_PRICES = {
-    # 米国株
-    "AAPL": {"price": 225.77, "change_percent": 1.2},
-    "MSFT": {"price": 441.58, "change_percent": 0.8},
-    "GOOGL": {"price": 186.35, "change_percent": -0.5},
-    "AMZN": {"price": 219.25, "change_percent": 2.1},
-    "TSLA": {"price": 425.32, "change_percent": -1.3},
-    "META": {"price": 598.67, "change_percent": 1.8},
-    "NVDA": {"price": 145.89, "change_percent": 3.2},
-    "NFLX": {"price": 891.38, "change_percent": -0.4},
-    
-    # 日本株（円）
-    "7203.T": {"price": 2891, "change_percent": 0.7},
-    "6758.T": {"price": 2855, "change_percent": -0.3},
-    "7267.T": {"price": 1489, "change_percent": 1.1},
-    "9432.T": {"price": 143.8, "change_percent": 0.2},
-    "6752.T": {"price": 1233, "change_percent": -0.8},
-    
-    # ETF
-    "SPY": {"price": 601.45, "change_percent": 0.6},
-    "QQQ": {"price": 519.23, "change_percent": 1.1},
-    "VTI": {"price": 295.67, "change_percent": 0.4},
-}
-
-
-
 def _get_related_stocks_optimized(symbol: str, limit: int) -> List[Dict]:
     """
     最適化された株式関連銘柄取得
@@ -3055,6 +3281,12 @@ def _get_related_indices_optimized(symbol: str, limit: int) -> List[Dict]:
     
     return related_indices[:limit]
 
+def _get_page(url: str):
+    """共有セッションでページを取得する（HTTPエラーをサーキットブレーカーが障害として数えるよう、呼び出しの中で例外にする）"""
+    response = get_http_session().get(url)
+    response.raise_for_status()
+    return response
+
 def fetch_mutual_fund_real_time_price(yahoo_code: str) -> dict:
     """
     Yahoo Finance Japanから投資信託の基準価額をリアルタイムで取得する関数
@@ -3069,13 +3301,9 @@ def fetch_mutual_fund_real_time_price(yahoo_code: str) -> dict:
         # Yahoo Finance Japan の投資信託ページURL
         url = f"https://finance.yahoo.co.jp/quote/{yahoo_code}"
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        # リクエスト送信
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        # リクエスト送信（共有セッションで接続を再利用し、タイムアウト・再試行はセッションの設定に従う）
+        # 障害中は待たずに静的データにフォールバックする
+        response = yahoo_japan_breaker.call(_get_page, url)
         
         # HTMLをパース
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -0,0 +1,210 @@
+import os
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from app.models.enums import Exchange
+
+# 取引所ごとのタイムゾーン
+EXCHANGE_TIMEZONES: Dict[Exchange, ZoneInfo] = {
+    Exchange.TSE: ZoneInfo("Asia/Tokyo"),
+    Exchange.NYSE: ZoneInfo("America/New_York"),
+}
+
+# 取引所ごとの立会時間（現地時刻）。東証は昼休みを挟み、2024年11月以降は15:30まで
+EXCHANGE_SESSIONS: Dict[Exchange, List[Tuple[dt_time, dt_time]]] = {
+    Exchange.TSE: [(dt_time(9, 0), dt_time(11, 30)), (dt_time(12, 30), dt_time(15, 30))],
+    Exchange.NYSE: [(dt_time(9, 30), dt_time(16, 0))],
+}
+
+# 立会時間中の価格情報のキャッシュ有効期間（秒）
+QUOTE_TTL_OPEN_SECONDS = float(os.getenv("QUOTE_TTL_OPEN_SECONDS", "15"))
+
+# 立会終了後も短い有効期間を使う猶予（秒）。終値が確定するまでの遅延を吸収する
+QUOTE_CLOSE_GRACE_SECONDS = float(os.getenv("QUOTE_CLOSE_GRACE_SECONDS", str(20 * 60)))
+
+# 取引所の立会時間に従う指数（それ以外の指数は立会時間を判定しない）
+INDEX_EXCHANGES: Dict[str, Exchange] = {
+    "^N225": Exchange.TSE,
+    "^TOPX": Exchange.TSE,
+    "^GSPC": Exchange.NYSE,
+    "^IXIC": Exchange.NYSE,
+    "^NDX": Exchange.NYSE,
+    "^DJI": Exchange.NYSE,
+    "^RUT": Exchange.NYSE,
+    "^VIX": Exchange.NYSE,
+}
+
+def exchange_for_symbol(symbol: str) -> Optional[Exchange]:
+    """
+    銘柄の取引所を判定する
+
+    暗号資産・為替・先物（24時間取引）や海外の指数の場合は None を返す。
+    """
+    if symbol.startswith("^"):
+        return INDEX_EXCHANGES.get(symbol)
+    if symbol.endswith(".T"):
+        return Exchange.TSE
+    if symbol.endswith(("-USD", "-JPY", "=X", "=F")):
+        return None
+    return Exchange.NYSE
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """指定月の第n週の曜日（weekday: 月曜=0）"""
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7*(n - 1))
+
+def _last_weekday(year: int, month: int, weekday: int) -> date:
+    """指定月の最終週の曜日（weekday: 月曜=0）"""
+    last = (date(year, month % 12 + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year: int) -> date:
+    """復活祭の日付（グレゴリオ暦、Anonymous Gregorian algorithm）"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19*a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2*e + 2*i - h - k) % 7
+    m = (a + 11*h + 22*l) // 451
+    month, day = divmod(h + l - 7*m + 114, 31)
+    return date(year, month, day + 1)
+
+def _observed_us(day: date) -> date:
+    """土曜の祝日は前日の金曜、日曜の祝日は翌日の月曜に振り替える（NYSEの規則）"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+@lru_cache(maxsize=64)
+def _nyse_holidays(year: int) -> Set[date]:
+    """NYSEの休場日（臨時休場は含まない）"""
+    holidays = {
+        _observed_us(date(year, 1, 1)),
+        _nth_weekday(year, 1, 0, 3),  # キング牧師の日
+        _nth_weekday(year, 2, 0, 3),  # 大統領の日
+        _easter(year) - timedelta(days=2),  # 聖金曜日
+        _last_weekday(year, 5, 0),  # 戦没将兵追悼記念日
+        _observed_us(date(year, 7, 4)),  # 独立記念日
+        _nth_weekday(year, 9, 0, 1),  # レイバーデー
+        _nth_weekday(year, 11, 3, 4),  # 感謝祭
+        _observed_us(date(year, 12, 25)),  # クリスマス
+    }
+    if year >= 2022:
+        holidays.add(_observed_us(date(year, 6, 19)))  # ジューンティーンス
+    # 元日が土曜の場合、前年の12/31は振り替えない
+    return {day for day in holidays if day.year == year and day.weekday() < 5}
+
+@lru_cache(maxsize=64)
+def _japan_holidays(year: int) -> Set[date]:
+    """日本の国民の祝日（振替休日・国民の休日を含む、1980〜2099年の規則）"""
+    offset = year - 1980
+    vernal = int(20.8431 + 0.242194*offset - offset//4)
+    autumnal = int(23.2488 + 0.242194*offset - offset//4)
+    holidays = {
+        date(year, 1, 1),
+        _nth_weekday(year, 1, 0, 2),  # 成人の日
+        date(year, 2, 11),  # 建国記念の日
+        date(year, 3, vernal),  # 春分の日
+        date(year, 4, 29),  # 昭和の日
+        date(year, 5, 3), date(year, 5, 4), date(year, 5, 5),
+        _nth_weekday(year, 7, 0, 3),  # 海の日
+        date(year, 8, 11),  # 山の日
+        _nth_weekday(year, 9, 0, 3),  # 敬老の日
+        date(year, 9, autumnal),  # 秋分の日
+        _nth_weekday(year, 10, 0, 2),  # スポーツの日
+        date(year, 11, 3),  # 文化の日
+        date(year, 11, 23),  # 勤労感謝の日
+    }
+    if year >= 2020:
+        holidays.add(date(year, 2, 23))  # 天皇誕生日
+    else:
+        holidays.add(date(year, 12, 23))
+
+    # 国民の休日（祝日に挟まれた平日）
+    for day in sorted(holidays):
+        between = day + timedelta(days=1)
+        if between + timedelta(days=1) in holidays and between not in holidays and between.weekday() != 6:
+            holidays.add(between)
+
+    # 振替休日（日曜の祝日の後の最初の平日で祝日でない日）
+    for day in sorted(holidays):
+        if day.weekday() == 6:
+            substitute = day + timedelta(days=1)
+            while substitute in holidays:
+                substitute += timedelta(days=1)
+            holidays.add(substitute)
+    return holidays
+
+def is_holiday(exchange: Exchange, day: date) -> bool:
+    """取引所の休場日（土日・祝日・年末年始）かどうか"""
+    if day.weekday() >= 5:
+        return True
+    if exchange == Exchange.TSE:
+        # 東証は12/31〜1/3も休場
+        if (day.month, day.day) in {(12, 31), (1, 1), (1, 2), (1, 3)}:
+            return True
+        return day in _japan_holidays(day.year)
+    return day in _nyse_holidays(day.year)
+
+def _now(exchange: Exchange, at: Optional[datetime]) -> datetime:
+    """取引所の現地時刻に変換する（Noneは現在時刻）"""
+    at = at or datetime.now(timezone.utc)
+    return at.astimezone(EXCHANGE_TIMEZONES[exchange])
+
+def is_market_open(exchange: Exchange, at: Optional[datetime] = None) -> bool:
+    """取引所が立会時間中かどうか"""
+    local = _now(exchange, at)
+    if is_holiday(exchange, local.date()):
+        return False
+    return any(start <= local.time() < end for start, end in EXCHANGE_SESSIONS[exchange])
+
+def next_open(exchange: Exchange, at: Optional[datetime] = None) -> datetime:
+    """次の立会開始時刻（立会時間中の場合は次のセッションの開始時刻）"""
+    local = _now(exchange, at)
+    day = local.date()
+    tz = EXCHANGE_TIMEZONES[exchange]
+    for _ in range(30):
+        if not is_holiday(exchange, day):
+            for start, _end in EXCHANGE_SESSIONS[exchange]:
+                opening = datetime.combine(day, start, tzinfo=tz)
+                if opening > local:
+                    return opening
+        day += timedelta(days=1)
+    raise ValueError(f"次の立会日が見つかりません: {exchange}")
+
+def last_close(exchange: Exchange, at: Optional[datetime] = None) -> Optional[datetime]:
+    """直近のセッションの終了時刻（当日の立会終了後のみ、それ以外はNone）"""
+    local = _now(exchange, at)
+    if is_holiday(exchange, local.date()):
+        return None
+    closes = [
+        datetime.combine(local.date(), end, tzinfo=EXCHANGE_TIMEZONES[exchange])
+        for _start, end in EXCHANGE_SESSIONS[exchange]
+    ]
+    past = [close for close in closes if close <= local]
+    return past[-1] if past else None
+
+def quote_ttl(symbol: str, at: Optional[datetime] = None) -> float:
+    """
+    価格情報のキャッシュ有効期間（秒）
+
+    立会時間中（と立会終了直後の猶予期間）は QUOTE_TTL_OPEN_SECONDS、
+    休場中は次の立会開始まで有効とする。24時間取引の銘柄は常に短い有効期間を使う。
+    """
+    exchange = exchange_for_symbol(symbol)
+    if exchange is None:
+        return QUOTE_TTL_OPEN_SECONDS
+    now = at or datetime.now(timezone.utc)
+    if is_market_open(exchange, now):
+        return QUOTE_TTL_OPEN_SECONDS
+    close = last_close(exchange, now)
+    if close is not None and (now - close).total_seconds() < QUOTE_CLOSE_GRACE_SECONDS:
+        return QUOTE_TTL_OPEN_SECONDS
+    return max(QUOTE_TTL_OPEN_SECONDS, (next_open(exchange, now) - now).total_seconds())
@@ -0,0 +1,108 @@
+import numpy as np
+
+# デフォルトの相対誤差（返却する分位点の値が真の分位点から±0.5%以内）
+DEFAULT_RELATIVE_ACCURACY = 0.005
+
+# 1系列あたりのバケット数の上限（超えた場合は最小側のバケットを畳み込む）
+MAX_BUCKETS = 8192
+
+class QuantileSketch:
+    """
+    相対誤差保証付きの分位点スケッチ（DDSketch方式）
+
+    正の値を対数スケールの等比バケット (gamma^(i-1), gamma^i] に数え上げる。
+    バケットの代表値 2*gamma^i/(gamma+1) は、バケット内のどの値に対しても
+    相対誤差が relative_accuracy 以下になる。
+    複数の系列（シミュレーションの各チェックポイントなど）を1つの配列で管理し、
+    (件数 × 系列数) の行列をまとめてベクトル化して取り込める。
+    メモリ使用量はバケット数（値のダイナミックレンジ）のみに依存し、件数には依存しない。
+    """
+
+    def __init__(self, series: int = 1, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy は 0 より大きく 1 より小さい値を指定してください")
+        self.series = series
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.offset = 0  # counts[:, 0] に対応するバケット番号
+        self.counts = np.zeros((series, 0), dtype=np.int64)
+        self.count = 0
+
+    def _ensure_range(self, low: int, high: int):
+        """バケット番号 [low, high] を保持できるようにカウント配列を拡張する"""
+        if self.counts.shape[1] == 0:
+            self.offset = low
+            self.counts = np.zeros((self.series, high - low + 1), dtype=np.int64)
+            return
+        current_high = self.offset + self.counts.shape[1] - 1
+        new_low = min(low, self.offset)
+        new_high = max(high, current_high)
+        if new_low == self.offset and new_high == current_high:
+            return
+        counts = np.zeros((self.series, new_high - new_low + 1), dtype=np.int64)
+        start = self.offset - new_low
+        counts[:, start:start + self.counts.shape[1]] = self.counts
+        self.counts = counts
+        self.offset = new_low
+
+    def _collapse(self):
+        """バケット数が上限を超えた場合、最小側のバケットを1つに畳み込む"""
+        excess = self.counts.shape[1] - MAX_BUCKETS
+        if excess <= 0:
+            return
+        self.counts[:, excess] += self.counts[:, :excess].sum(axis=1)
+        self.counts = self.counts[:, excess:]
+        self.offset += excess
+
+    def update(self, values: np.ndarray):
+        """
+        値を取り込む
+
+        Args:
+            values: (件数 × 系列数) の正の値の行列（系列数1の場合は1次元配列も可）
+        """
+        values = np.asarray(values, dtype=float).reshape(-1, self.series)
+        if len(values) == 0:
+            return
+        values = np.maximum(values, np.finfo(float).tiny)
+        keys = np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+        self._ensure_range(int(keys.min()), int(keys.max()))
+
+        width = self.counts.shape[1]
+        flat_keys = (keys - self.offset) + np.arange(self.series) * width
+        self.counts += np.bincount(flat_keys.ravel(), minlength=self.series * width).reshape(self.series, width)
+        self.count += len(values)
+        self._collapse()
+
+    def merge(self, other: "QuantileSketch"):
+        """同じ設定の別のスケッチを統合する"""
+        if other.series != self.series or other.gamma != self.gamma:
+            raise ValueError("系列数または精度が異なるスケッチは統合できません")
+        if other.count == 0:
+            return
+        self._ensure_range(other.offset, other.offset + other.counts.shape[1] - 1)
+        start = other.offset - self.offset
+        self.counts[:, start:start + other.counts.shape[1]] += other.counts
+        self.count += other.count
+        self._collapse()
+
+    def quantiles(self, qs) -> np.ndarray:
+        """
+        分位点を計算する
+
+        Args:
+            qs: 分位点（0〜1）のリスト
+
+        Returns:
+            (分位点数 × 系列数) の推定値
+        """
+        if self.count == 0:
+            raise ValueError("スケッチにデータがありません")
+        cumulative = np.cumsum(self.counts, axis=1)
+        results = np.empty((len(qs), self.series))
+        for i, q in enumerate(qs):
+            # 累積件数が順位を超える最初のバケット
+            keys = np.argmax(cumulative > q * (self.count - 1), axis=1) + self.offset
+            results[i] = 2 * self.gamma ** keys / (self.gamma + 1)
+        return results
@@ -0,0 +1,74 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from app.models.enums import UpstreamPriority
+from . import market
+from .rate_limiter import upstream_priority
+
+# 事前取得する人気銘柄の数（POPULARITY_SCORESの上位）
+QUOTE_WARMER_TOP_N = int(os.getenv("QUOTE_WARMER_TOP_N", "50"))
+
+# 事前取得の間隔（秒）
+QUOTE_WARMER_INTERVAL_SECONDS = float(os.getenv("QUOTE_WARMER_INTERVAL_SECONDS", "60"))
+
+# アプリケーション起動時に事前取得のスレッドを開始するか（常駐するコンテナでのデプロイ専用）
+# Lambdaでは価格キャッシュがコンテナごとで、応答後はコンテナが凍結されるため、指定しても開始しない
+QUOTE_WARMER_ENABLED = (
+    os.getenv("QUOTE_WARMER_ENABLED", "false").lower() == "true"
+    and not os.getenv("AWS_LAMBDA_FUNCTION_NAME")
+)
+
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+_lock = threading.Lock()
+
+def popular_symbols(limit: int = QUOTE_WARMER_TOP_N) -> List[str]:
+    """人気度スコアの上位の銘柄（同じスコアは定義順）"""
+    symbols = sorted(market.POPULARITY_SCORES, key=lambda symbol: -market.POPULARITY_SCORES[symbol])
+    return symbols[:limit]
+
+def warm_popular_quotes(limit: int = QUOTE_WARMER_TOP_N, min_ttl: float = 0) -> Dict[str, Any]:
+    """
+    人気銘柄の価格情報をまとめて取得して価格キャッシュを更新する
+
+    Args:
+        limit: 対象とする人気銘柄の数
+        min_ttl: キャッシュの残り有効期間がこの秒数より長い銘柄は再取得しない
+
+    Returns:
+        対象銘柄数と更新できた銘柄数
+    """
+    symbols = popular_symbols(limit)
+    # 対話的なリクエストの呼び出しを優先させる
+    with upstream_priority(UpstreamPriority.background):
+        refreshed = market.refresh_stock_prices(symbols, min_ttl=min_ttl)
+    return {"symbols": len(symbols), "refreshed": len(refreshed)}
+
+def _run(interval: float):
+    while not _stop.is_set():
+        try:
+            # 次回の実行までに期限切れになる銘柄のみ再取得する
+            warm_popular_quotes(min_ttl=interval)
+        except Exception as e:
+            print(f"Error warming popular quotes: {e}")
+        _stop.wait(interval)
+
+def start_quote_warmer(interval: float = QUOTE_WARMER_INTERVAL_SECONDS):
+    """人気銘柄の価格情報を定期的に事前取得するスレッドを開始する（開始済みの場合は何もしない）"""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_run, args=(interval,), name="quote-warmer", daemon=True)
+        _thread.start()
+
+def stop_quote_warmer():
+    """事前取得のスレッドを停止する（アプリケーション終了時に呼び出す）"""
+    global _thread
+    with _lock:
+        thread, _thread = _thread, None
+    _stop.set()
+    if thread is not None:
+        thread.join(timeout=5)
@@ -0,0 +1,182 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from app.models.enums import UpstreamPriority
+from .circuit_breaker import BREAKERS, UpstreamUnavailableError
+
+# 外部データソースごとの呼び出し回数の上限 {名前: (1秒あたりの回数, バースト)}
+UPSTREAM_RATE_LIMITS: Dict[str, tuple] = {
+    "yfinance": (
+        float(os.getenv("UPSTREAM_YFINANCE_RATE", "5")),
+        float(os.getenv("UPSTREAM_YFINANCE_BURST", "10")),
+    ),
+    "yahoo_finance_japan": (
+        float(os.getenv("UPSTREAM_YAHOO_JAPAN_RATE", "1")),
+        float(os.getenv("UPSTREAM_YAHOO_JAPAN_BURST", "3")),
+    ),
+    "dynamodb": (
+        float(os.getenv("UPSTREAM_DYNAMODB_RATE", "50")),
+        float(os.getenv("UPSTREAM_DYNAMODB_BURST", "100")),
+    ),
+}
+
+# 優先度ごとの待ち時間の上限（秒）。超えた場合は UpstreamRateLimitedError
+UPSTREAM_MAX_WAIT_SECONDS: Dict[UpstreamPriority, float] = {
+    UpstreamPriority.interactive: float(os.getenv("UPSTREAM_INTERACTIVE_MAX_WAIT_SECONDS", "2")),
+    UpstreamPriority.background: float(os.getenv("UPSTREAM_BACKGROUND_MAX_WAIT_SECONDS", "30")),
+}
+
+# バックグラウンドの呼び出しが使わずに残すバーストの割合（対話的なリクエスト用）
+UPSTREAM_BACKGROUND_RESERVE = float(os.getenv("UPSTREAM_BACKGROUND_RESERVE", "0.25"))
+
+# 現在の呼び出しの優先度（既定は対話的なリクエスト）
+_priority: contextvars.ContextVar = contextvars.ContextVar("upstream_priority", default=UpstreamPriority.interactive)
+
+class UpstreamRateLimitedError(UpstreamUnavailableError):
+    """外部データソースの呼び出し回数の上限に達し、待ち時間の上限内に呼び出せない場合の例外"""
+
+@contextmanager
+def upstream_priority(priority: UpstreamPriority):
+    """ブロック内の外部データソースの呼び出しの優先度を指定する（事前取得などはbackground）"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> UpstreamPriority:
+    """現在の呼び出しの優先度"""
+    return _priority.get()
+
+class TokenBucket:
+    """
+    トークンバケットによる外部データソースの呼び出しの流量制御
+
+    1秒あたり rate 個のトークンを最大 burst 個まで貯め、呼び出しごとに1個消費する。
+    トークンがない場合は待ち、対話的なリクエストの待ちがある間はバックグラウンドの呼び出しに渡さない。
+    バックグラウンドの呼び出しは burst の UPSTREAM_BACKGROUND_RESERVE の割合を残して消費する。
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, background_reserve: float = UPSTREAM_BACKGROUND_RESERVE):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.background_reserve = burst * background_reserve
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiting = {priority: 0 for priority in UpstreamPriority}
+        self._acquired = {priority: 0 for priority in UpstreamPriority}
+        self._rejected = {priority: 0 for priority in UpstreamPriority}
+        self._wait_seconds = {priority: 0.0 for priority in UpstreamPriority}
+        self._max_wait_seconds = {priority: 0.0 for priority in UpstreamPriority}
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _available(self, priority: UpstreamPriority, tokens: int) -> bool:
+        if priority == UpstreamPriority.interactive:
+            return self._tokens >= tokens
+        return self._waiting[UpstreamPriority.interactive] == 0 and self._tokens >= tokens + self.background_reserve
+
+    def max_tokens(self, priority: UpstreamPriority = UpstreamPriority.interactive) -> int:
+        """1回で消費できるトークン数の上限（バックグラウンドは残す分を除く）"""
+        reserve = self.background_reserve if priority == UpstreamPriority.background else 0
+        return max(1, int(self.burst - reserve))
+
+    def acquire(self, priority: UpstreamPriority = UpstreamPriority.interactive, max_wait: float = None, tokens: int = 1):
+        """
+        トークンを tokens 個消費する（なければ待つ）
+
+        Args:
+            tokens: 消費するトークン数（まとめて送るリクエスト数、max_tokens 以下）
+
+        Raises:
+            UpstreamRateLimitedError: max_wait 秒以内にトークンを得られない場合
+        """
+        tokens = min(tokens, self.max_tokens(priority))
+        max_wait = UPSTREAM_MAX_WAIT_SECONDS[priority] if max_wait is None else max_wait
+        started = time.monotonic()
+        deadline = started + max_wait
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._available(priority, tokens):
+                        self._tokens -= tokens
+                        waited = now - started
+                        self._acquired[priority] += tokens
+                        self._wait_seconds[priority] += waited
+                        self._max_wait_seconds[priority] = max(self._max_wait_seconds[priority], waited)
+                        return
+                    if now >= deadline:
+                        self._rejected[priority] += 1
+                        raise UpstreamRateLimitedError(
+                            self.name,
+                            f"{self.name} の呼び出し回数の上限に達しています",
+                            retry_after=max(1.0, 1 / self.rate) if self.rate > 0 else None,
+                        )
+                    shortage = tokens + (self.background_reserve if priority == UpstreamPriority.background else 0) - self._tokens
+                    wait = shortage / self.rate if self.rate > 0 else deadline - now
+                    self._cond.wait(min(max(wait, 0.001), deadline - now))
+            finally:
+                self._waiting[priority] -= 1
+                # 対話的なリクエストが抜けた場合、待っているバックグラウンドの呼び出しを起こす
+                self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """待ち行列の状態と累計（監視用）"""
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "name": self.name,
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 3),
+                "waiting": {priority.value: count for priority, count in self._waiting.items()},
+                "acquired": {priority.value: count for priority, count in self._acquired.items()},
+                "rejected": {priority.value: count for priority, count in self._rejected.items()},
+                "avg_wait_seconds": {
+                    priority.value: (self._wait_seconds[priority] / self._acquired[priority]) if self._acquired[priority] else 0.0
+                    for priority in UpstreamPriority
+                },
+                "max_wait_seconds": {priority.value: seconds for priority, seconds in self._max_wait_seconds.items()},
+            }
+
+# 外部データソースごとのトークンバケット
+BUCKETS: Dict[str, TokenBucket] = {
+    name: TokenBucket(name, rate, burst) for name, (rate, burst) in UPSTREAM_RATE_LIMITS.items()
+}
+
+def acquire(source: str, tokens: int = 1, max_wait: float = None):
+    """
+    外部データソースを呼び出す前に、現在の優先度でトークンを消費する（上限の設定がない場合は何もしない）
+
+    max_wait を省略した場合は優先度ごとの待ち時間の上限（UPSTREAM_MAX_WAIT_SECONDS）まで待つ。
+    """
+    bucket = BUCKETS.get(source)
+    if bucket is not None:
+        bucket.acquire(current_priority(), max_wait=max_wait, tokens=tokens)
+
+def max_batch_size(source: str) -> Optional[int]:
+    """現在の優先度で1回にまとめて送れるリクエスト数（上限の設定がない場合はNone）"""
+    bucket = BUCKETS.get(source)
+    return bucket.max_tokens(current_priority()) if bucket is not None else None
+
+def get_upstream_status() -> List[Dict[str, Any]]:
+    """外部データソースごとのサーキットブレーカーと流量制御の状態（監視用）"""
+    return [
+        {
+            "name": name,
+            "circuit": breaker.snapshot(),
+            "rate_limit": BUCKETS[name].snapshot() if name in BUCKETS else None,
+        }
+        for name, breaker in BREAKERS.items()
+    ]
@@ -1,6 +1,22 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
 import numpy as np
-from .market import get_price_history
-from app.models.enums import PERIOD_MAP
+import pandas as pd
+from statistics import NormalDist
+from typing import Dict, Optional
+from .calibration import get_calibration
+from .quantile_sketch import DEFAULT_RELATIVE_ACCURACY, QuantileSketch
+from .simulation_engine import (
+    TRADING_DAYS_PER_YEAR,
+    iter_bootstrap_checkpoints,
+    iter_portfolio_checkpoints,
+    iter_shock_checkpoints,
+    sobol_available,
+    step_grid,
+)
+from app.models.enums import RebalanceFrequency, SimulationMode, SimulationOutput, SimulationStep, VarianceReduction
 
 SCENARIOS = {
     "optimistic": 0.75,
@@ -8,21 +24,682 @@ SCENARIOS = {
     "pessimistic": 0.25,
 }
 
-def monte_carlo(symbol: str, years: int, simulations: int):
-    hist = get_price_history(symbol, PERIOD_MAP["max"])
-    returns = hist["Close"].pct_change().dropna()
-    mu = returns.mean()
-    sigma = returns.std()
-    dt = 1/252
-    results = {k: [] for k in SCENARIOS}
-
-    for scenario, quantile in SCENARIOS.items():
-        adj_mu = np.quantile(returns, quantile)
-        for _ in range(simulations):
-            price = 1.0
-            for _ in range(years*252):
-                drift = adj_mu - 0.5*sigma**2
-                shock = sigma * np.random.normal()
-                price *= np.exp(drift*dt + shock*np.sqrt(dt))
-            results[scenario].append(price)
-    return results
+# 年次の分位点カーブとして返すパーセンタイル（READMEのレスポンス仕様に準拠）
+PERCENTILE_BANDS = {
+    "median": 0.50,
+    "upper_95": 0.95,
+    "lower_5": 0.05,
+}
+
+# リバランス頻度ごとの取引日数（リバランスなしは年次ステップで保有し続ける）
+REBALANCE_DAYS = {
+    RebalanceFrequency.none: TRADING_DAYS_PER_YEAR,
+    RebalanceFrequency.monthly: TRADING_DAYS_PER_YEAR // 12,
+    RebalanceFrequency.quarterly: TRADING_DAYS_PER_YEAR // 4,
+    RebalanceFrequency.yearly: TRADING_DAYS_PER_YEAR,
+}
+
+# 1か月あたりの取引日数
+MONTH_DAYS = TRADING_DAYS_PER_YEAR / 12
+
+# seed付きのシミュレーション結果をキャッシュする件数
+SIMULATION_CACHE_SIZE = int(os.getenv("SIMULATION_CACHE_SIZE", "64"))
+
+# seed付きのシミュレーション結果のキャッシュのおおよそのメモリ使用量の上限（バイト）
+# 終端値・パスを返す結果は1件で数MB〜数十MBになるため、件数だけでなく大きさでも制限する
+SIMULATION_CACHE_MAX_BYTES = int(os.getenv("SIMULATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# {キー: (結果, おおよそのバイト数)}
+_result_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_result_cache_bytes = 0
+_result_cache_lock = threading.Lock()
+
+# 共分散の推定に必要な、全資産で日付が揃ったリターンの最小件数
+MIN_ALIGNED_RETURNS = 60
+
+def _scenario_drift(calibration, quantile: float) -> float:
+    """
+    シナリオの年率の算術ドリフト
+
+    日次リターンの平均を年率換算し、シナリオごとに日次リターンの分位点と平均の差を年率の差として加える
+    （bootstrapモードのシナリオと同じ定義）。
+    """
+    return calibration.mu*TRADING_DAYS_PER_YEAR + calibration.quantile(quantile) - calibration.mu
+
+def _calibrate(symbol: str):
+    """
+    キャリブレーションストアから年率のボラティリティとシナリオ別のドリフトを求める
+
+    日次リターンの統計量を年率換算するため、GBM・analytic・bootstrapの各モードの結果は
+    同じ時間の単位で比較できる。
+
+    Returns:
+        (sigma, {シナリオ名: ドリフト})
+    """
+    calibration = get_calibration(symbol)
+    sigma = calibration.sigma*np.sqrt(TRADING_DAYS_PER_YEAR)
+    drifts = {
+        scenario: _scenario_drift(calibration, quantile) - 0.5*sigma**2
+        for scenario, quantile in SCENARIOS.items()
+    }
+    return sigma, drifts
+
+# このパス数を超えるファンチャートは分位点スケッチで集計する（メモリ使用量が一定になる）
+EXACT_BANDS_MAX_SIMULATIONS = 10_000
+
+class _ExactBands:
+    """全パスのチェックポイント値を保持して厳密な分位点を求める集計器"""
+
+    def __init__(self, simulations: int, checkpoints: int):
+        self.values = np.empty((simulations, checkpoints))
+        self.count = 0
+
+    def update(self, values: np.ndarray):
+        self.values[self.count:self.count + len(values)] = values
+        self.count += len(values)
+
+    def quantiles(self, qs) -> np.ndarray:
+        return np.quantile(self.values[:self.count], qs, axis=0)
+
+def _band_aggregator(simulations: int, checkpoints: int):
+    """
+    パス数に応じてチェックポイント値の集計器を選ぶ
+
+    少ないパス数では厳密な分位点を、多いパス数ではチャンクを取り込むたびに
+    破棄できる分位点スケッチ（相対誤差 DEFAULT_RELATIVE_ACCURACY 以内）を使う。
+    """
+    if simulations > EXACT_BANDS_MAX_SIMULATIONS:
+        return QuantileSketch(checkpoints)
+    return _ExactBands(simulations, checkpoints)
+
+def percentile_error(simulations: int) -> float:
+    """ファンチャートの分位点に含まれる集計誤差の上限（相対誤差、厳密集計の場合は0）"""
+    return DEFAULT_RELATIVE_ACCURACY if simulations > EXACT_BANDS_MAX_SIMULATIONS else 0.0
+
+class _MeanEstimator:
+    """
+    終端値の平均とその標準誤差を推定する集計器
+
+    - none: 各パスを独立な標本とみなす
+    - antithetic: チャンク内の前半と後半（符号反転）のペアの平均を独立な標本とみなす
+    - sobol: 独立にスクランブルされたチャンクごとの平均を独立な標本とみなす
+    """
+
+    def __init__(self, variance_reduction: VarianceReduction):
+        self.variance_reduction = variance_reduction
+        self.samples = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def _add(self, samples: np.ndarray):
+        self.samples += len(samples)
+        self.total += samples.sum()
+        self.total_squares += (samples**2).sum()
+
+    def update(self, terminal: np.ndarray):
+        if self.variance_reduction == VarianceReduction.antithetic:
+            half = len(terminal) // 2
+            self._add((terminal[:half] + terminal[half:2*half]) / 2)
+        elif self.variance_reduction == VarianceReduction.sobol:
+            self._add(np.array([terminal.mean()]))
+        else:
+            self._add(terminal)
+
+    @property
+    def standard_error(self) -> Optional[float]:
+        if self.samples < 2:
+            return None
+        mean = self.total / self.samples
+        variance = max(self.total_squares / self.samples - mean**2, 0.0) * self.samples / (self.samples - 1)
+        return float(np.sqrt(variance / self.samples))
+
+def _fan_chart_step(step: SimulationStep) -> SimulationStep:
+    """年次のチェックポイントを取れる時間刻みに変換する（terminalは年次に切り替える）"""
+    return SimulationStep.yearly if step == SimulationStep.terminal else step
+
+def _iter_gbm_log_values(
+    symbol: str,
+    years: int,
+    simulations: int,
+    step: SimulationStep,
+    checkpoints: int,
+    workers: Optional[int],
+    variance_reduction: VarianceReduction,
+    seed: Optional[int] = None,
+):
+    """
+    幾何ブラウン運動のシナリオ別のチェックポイントの累積対数リターンをチャンク単位で生成する
+
+    Yields:
+        {シナリオ名: (チャンク内のパス数 × チェックポイント数) の累積対数リターン}
+    """
+    sigma, drifts = _calibrate(symbol)
+    dt = 1/TRADING_DAYS_PER_YEAR
+    steps, step_days = step_grid(years, step)
+    # 各チェックポイントの経過日数
+    days = np.arange(1, checkpoints + 1)*(years*TRADING_DAYS_PER_YEAR // checkpoints)
+
+    for _, shock_checkpoints in iter_shock_checkpoints(
+        steps, step_days, simulations, checkpoints,
+        seed=seed, workers=workers, variance_reduction=variance_reduction,
+    ):
+        diffusion = sigma*np.sqrt(dt)*shock_checkpoints
+        # 対数リターン = Σ(drift*dt + sigma*sqrt(dt)*Z)
+        yield {scenario: drift*dt*days + diffusion for scenario, drift in drifts.items()}
+
+def _iter_bootstrap_log_values(
+    symbol: str,
+    years: int,
+    simulations: int,
+    checkpoints: int,
+    block_size: int,
+    workers: Optional[int],
+    seed: Optional[int] = None,
+):
+    """
+    過去の日次リターンを復元抽出したシナリオ別のチェックポイントの累積対数リターンをチャンク単位で生成する
+
+    実際の日次リターンをそのまま使うため、正規分布では表せない裾の厚さが反映される。
+    シナリオはGBMと同じドリフト差（日次リターンの分位点と平均の差を年率の差とみなしたもの）を
+    日割りで加えて表現する。
+
+    Yields:
+        {シナリオ名: (チャンク内のパス数 × チェックポイント数) の累積対数リターン}
+    """
+    calibration = get_calibration(symbol)
+    log_returns = np.log1p(calibration.returns)
+    total_days = years*TRADING_DAYS_PER_YEAR
+    days = np.arange(1, checkpoints + 1)*(total_days // checkpoints)
+    shifts = {
+        scenario: (calibration.quantile(quantile) - calibration.mu)/TRADING_DAYS_PER_YEAR
+        for scenario, quantile in SCENARIOS.items()
+    }
+
+    for _, log_checkpoints in iter_bootstrap_checkpoints(
+        log_returns, total_days, simulations, checkpoints,
+        block_size=block_size, seed=seed, workers=workers,
+    ):
+        yield {scenario: log_checkpoints + shift*days for scenario, shift in shifts.items()}
+
+def _apply_cash_flows(
+    log_values: np.ndarray,
+    initial_investment: float,
+    monthly_contribution: float,
+    monthly_dividend: float,
+):
+    """
+    月末ごとの累積対数リターンから、積立と配当の受け取りを反映した評価額を計算する
+
+    月次の漸化式 H_k = H_{k-1}*exp(l_k - d) + c（d は配当として受け取る分の対数）は
+    累積対数リターン L_k = Σ(l_j - d) を用いて H_k = exp(L_k)*(H_0 + c*Σ_{j<=k} exp(-L_j)) と
+    閉じた形になるため、パス方向のループを使わず累積和でまとめて計算できる。
+    受け取った配当は再投資せず現金として積み上げ、評価額に含める。
+
+    Args:
+        log_values: (パス数 × 月数) の月末の累積対数リターン（配当込み）
+        initial_investment: 初期投資額
+        monthly_contribution: 毎月末の積立額
+        monthly_dividend: 毎月の配当利回り（0は配当を再投資）
+
+    Returns:
+        (パス数 × 月数) の月末の評価額
+    """
+    drag = np.log1p(monthly_dividend)
+    log_holdings = log_values - drag*np.arange(1, log_values.shape[1] + 1)
+    holdings = np.exp(log_holdings)*(
+        initial_investment + monthly_contribution*np.cumsum(np.exp(-log_holdings), axis=1)
+    )
+    if monthly_dividend == 0:
+        return holdings
+    # 月末の積立前の保有額に対して配当を受け取る
+    dividends = np.cumsum((holdings - monthly_contribution)*monthly_dividend, axis=1)
+    return holdings + dividends
+
+def _iter_sample(
+    symbol: str,
+    years: int,
+    simulations: int,
+    step: SimulationStep,
+    output: SimulationOutput,
+    workers: Optional[int] = None,
+    variance_reduction: VarianceReduction = VarianceReduction.none,
+    mode: SimulationMode = SimulationMode.sampling,
+    block_size: int = 1,
+    seed: Optional[int] = None,
+    initial_investment: float = 1.0,
+    monthly_contribution: float = 0.0,
+    reinvest_dividends: bool = True,
+    progress_every: Optional[int] = None,
+):
+    """
+    モンテカルロ法でシナリオ別の終端値または年次分位点カーブを計算する
+
+    チャンクごとにステップ行列をチェックポイント（terminalは満期のみ、fan_chartは各年末）の
+    値へ縮約してから集計するため、(パス数 × ステップ数) の行列全体を保持することはない。
+    fan_chartでパス数が EXACT_BANDS_MAX_SIMULATIONS を超える場合は分位点スケッチで集計し、
+    パス数に関わらずメモリ使用量を一定に保つ。
+    積立または配当の受け取りがある場合は月末ごとのチェックポイントで評価額を計算する。
+
+    Yields:
+        (集計済みのパス数, 結果) の組。progress_every を指定した場合は途中経過も返し、
+        最後に全パスを集計した結果を返す。結果は scenarios（terminal）または bands（fan_chart）と、
+        standard_error（シナリオ別の終端値の平均の標準誤差）、percentile_error、principal を持つ辞書
+    """
+    fan = output == SimulationOutput.fan_chart
+    checkpoints = years if fan else 1
+    cash_flows = monthly_contribution > 0 or not reinvest_dividends
+    if initial_investment <= 0 and monthly_contribution <= 0:
+        raise ValueError("初期投資額または積立額のいずれかを指定してください")
+    if variance_reduction == VarianceReduction.sobol and not sobol_available():
+        raise ValueError("sobolを使うにはscipyをインストールしてください（extras: sobol）")
+
+    # 積立・配当の受け取りは月末ごとに反映するため、月次のチェックポイントを取る
+    sample_checkpoints = years*12 if cash_flows else checkpoints
+    if cash_flows:
+        step = SimulationStep.monthly if step in (SimulationStep.yearly, SimulationStep.terminal) else step
+    elif fan:
+        step = _fan_chart_step(step)
+
+    if mode == SimulationMode.bootstrap:
+        if variance_reduction != VarianceReduction.none:
+            raise ValueError("bootstrapモードでは分散減少法を指定できません")
+        log_chunks = _iter_bootstrap_log_values(
+            symbol, years, simulations, sample_checkpoints, block_size, workers, seed,
+        )
+    else:
+        log_chunks = _iter_gbm_log_values(
+            symbol, years, simulations, step, sample_checkpoints, workers, variance_reduction, seed,
+        )
+
+    if cash_flows:
+        # 配当利回りは1日あたりの値のため、1か月分（年間の取引日数の1/12）に換算する
+        # （GBM・bootstrapとも実際の日数の単位で計算する）
+        monthly_dividend = 0.0 if reinvest_dividends else get_calibration(symbol).dividend_yield*MONTH_DAYS
+        months_per_checkpoint = sample_checkpoints // checkpoints
+        chunks = (
+            {
+                scenario: _apply_cash_flows(
+                    log_values, initial_investment, monthly_contribution, monthly_dividend,
+                )[:, months_per_checkpoint - 1::months_per_checkpoint]
+                for scenario, log_values in scenario_values.items()
+            }
+            for scenario_values in log_chunks
+        )
+    else:
+        chunks = (
+            {scenario: initial_investment*np.exp(log_values) for scenario, log_values in scenario_values.items()}
+            for scenario_values in log_chunks
+        )
+
+    principal = [initial_investment + monthly_contribution*12*year for year in range(years + 1)]
+    for completed, result in _iter_aggregate(
+        chunks, simulations, checkpoints, output, variance_reduction, initial_investment, progress_every,
+    ):
+        result["principal"] = principal
+        yield completed, result
+
+def _sample(*args, **kwargs):
+    """_iter_sample の最終結果（全パスを集計した結果）を返す"""
+    for _, result in _iter_sample(*args, **kwargs):
+        pass
+    return result
+
+def _bands(aggregators, initial_value: float):
+    """集計器ごとの分位点を {シナリオ名: {バンド名: [0年目, ..., years年目の値]}} に整形する"""
+    quantiles = list(PERCENTILE_BANDS.values())
+    bands = {}
+    for scenario, aggregator in aggregators.items():
+        band_values = aggregator.quantiles(quantiles)
+        bands[scenario] = {
+            band: [initial_value] + band_values[i].tolist()
+            for i, band in enumerate(PERCENTILE_BANDS)
+        }
+    return bands
+
+def _iter_aggregate(
+    chunks,
+    simulations: int,
+    checkpoints: int,
+    output: SimulationOutput,
+    variance_reduction: VarianceReduction = VarianceReduction.none,
+    initial_value: float = 1.0,
+    progress_every: Optional[int] = None,
+):
+    """
+    チャンクごとのシナリオ別チェックポイント値を集計する
+
+    Args:
+        chunks: {シナリオ名: (チャンク内のパス数 × チェックポイント数) の値} を順に返すイテレータ
+        initial_value: 分位点カーブの0年目の値
+        progress_every: 途中経過を返すチャンク数の間隔（fan_chartのみ、Noneは最終結果のみ）
+
+    Yields:
+        (集計済みのパス数, 結果) の組。結果は scenarios（terminal）または bands（fan_chart）と、
+        standard_error（シナリオ別の終端値の平均の標準誤差）、percentile_error を持つ辞書
+    """
+    fan = output == SimulationOutput.fan_chart
+    if fan:
+        aggregators = {scenario: _band_aggregator(simulations, checkpoints) for scenario in SCENARIOS}
+    else:
+        aggregators = {scenario: _ExactBands(simulations, checkpoints) for scenario in SCENARIOS}
+    estimators = {scenario: _MeanEstimator(variance_reduction) for scenario in SCENARIOS}
+
+    completed = 0
+    for index, scenario_values in enumerate(chunks, 1):
+        for scenario, values in scenario_values.items():
+            aggregators[scenario].update(values)
+            estimators[scenario].update(values[:, -1])
+        completed += len(values)
+        if fan and progress_every and index % progress_every == 0 and completed < simulations:
+            yield completed, {
+                "standard_error": {scenario: estimator.standard_error for scenario, estimator in estimators.items()},
+                "bands": _bands(aggregators, initial_value),
+                "percentile_error": percentile_error(simulations),
+            }
+
+    result = {
+        "standard_error": {scenario: estimator.standard_error for scenario, estimator in estimators.items()},
+    }
+    if not fan:
+        result["scenarios"] = {
+            scenario: aggregator.values[:, -1].tolist()
+            for scenario, aggregator in aggregators.items()
+        }
+    else:
+        result["bands"] = _bands(aggregators, initial_value)
+        result["percentile_error"] = percentile_error(simulations)
+    yield completed, result
+
+def _aggregate(*args, **kwargs):
+    """_iter_aggregate の最終結果（全チャンクを集計した結果）を返す"""
+    for _, result in _iter_aggregate(*args, **kwargs):
+        pass
+    return result
+
+def monte_carlo(
+    symbol: str,
+    years: int,
+    simulations: int,
+    step: SimulationStep = SimulationStep.daily,
+    workers: Optional[int] = None,
+    variance_reduction: VarianceReduction = VarianceReduction.none,
+    seed: Optional[int] = None,
+):
+    """
+    シナリオ別の終端値をモンテカルロ法で計算する
+
+    Args:
+        symbol: 銘柄シンボル
+        years: シミュレーション期間（年）
+        simulations: パス数
+        step: 時間刻み
+        workers: 並列ワーカー数（Noneは環境変数SIMULATION_WORKERS、0はCPUコア数）
+        variance_reduction: 分散減少法（none, antithetic, sobol）
+        seed: 乱数シード（同じシードとキャリブレーションなら同じ結果になる。Noneは毎回異なる）
+
+    Returns:
+        {シナリオ名: [各パスの終端値]}（初期値1.0）
+    """
+    return _sample(
+        symbol, years, simulations, step, SimulationOutput.terminal, workers, variance_reduction, seed=seed,
+    )["scenarios"]
+
+def fan_chart(
+    symbol: str,
+    years: int,
+    simulations: int,
+    step: SimulationStep = SimulationStep.daily,
+    workers: Optional[int] = None,
+    variance_reduction: VarianceReduction = VarianceReduction.none,
+    seed: Optional[int] = None,
+):
+    """
+    シナリオ別の年次分位点カーブをモンテカルロ法で計算する
+
+    引数は monte_carlo と同じ。集計誤差の上限は percentile_error を参照。
+
+    Returns:
+        {シナリオ名: {バンド名: [0年目, 1年目, ..., years年目の値]}}（初期値1.0）
+    """
+    return _sample(
+        symbol, years, simulations, step, SimulationOutput.fan_chart, workers, variance_reduction, seed=seed,
+    )["bands"]
+
+def analytic_bands(symbol: str, years: int):
+    """
+    シナリオ別の年次分位点カーブを閉形式で計算する
+
+    GBMでは t 年後の対数値が N(drift*t, sigma^2*t) に従うため、
+    分位点は exp(drift*t + z_p*sigma*sqrt(t)) で求まり、乱数を必要としない。
+
+    Returns:
+        {シナリオ名: {バンド名: [0年目, 1年目, ..., years年目の値]}}（初期値1.0）
+    """
+    sigma, drifts = _calibrate(symbol)
+    # 経過年数（= 取引日数 × dt）
+    t = np.arange(years + 1, dtype=float)
+    z_scores = {band: NormalDist().inv_cdf(q) for band, q in PERCENTILE_BANDS.items()}
+    return {
+        scenario: {
+            band: np.exp(drift*t + z*sigma*np.sqrt(t)).tolist()
+            for band, z in z_scores.items()
+        }
+        for scenario, drift in drifts.items()
+    }
+
+def _result_size(value) -> int:
+    """結果のおおよそのメモリ使用量（バイト、Pythonのオブジェクトとして保持する分）"""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_result_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_result_size(item) for item in value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return sys.getsizeof(value)
+
+def _cached_result(key):
+    """シード付きの結果キャッシュから取得する（見つかった場合は最近使用したものとして扱う）"""
+    with _result_cache_lock:
+        entry = _result_cache.get(key)
+        if entry is None:
+            return None
+        _result_cache.move_to_end(key)
+        return entry[0]
+
+def _store_result(key, result):
+    """
+    シード付きの結果をキャッシュし、件数・大きさの上限を超えた分は最も古く使われたものから削除する
+
+    1件で SIMULATION_CACHE_MAX_BYTES の1/4を超える結果（大量の終端値・パスなど）はキャッシュしない。
+    """
+    global _result_cache_bytes
+    size = _result_size(result)
+    if size > SIMULATION_CACHE_MAX_BYTES / 4:
+        return
+    with _result_cache_lock:
+        previous = _result_cache.pop(key, None)
+        if previous is not None:
+            _result_cache_bytes -= previous[1]
+        _result_cache[key] = (result, size)
+        _result_cache_bytes += size
+        while len(_result_cache) > SIMULATION_CACHE_SIZE or _result_cache_bytes > SIMULATION_CACHE_MAX_BYTES:
+            _, (_, evicted) = _result_cache.popitem(last=False)
+            _result_cache_bytes -= evicted
+
+def clear_result_cache():
+    """シミュレーション結果のキャッシュを空にする（テスト・管理者用）"""
+    global _result_cache_bytes
+    with _result_cache_lock:
+        _result_cache.clear()
+        _result_cache_bytes = 0
+
+def iter_simulation(
+    symbol: str,
+    years: int,
+    simulations: int,
+    step: SimulationStep = SimulationStep.daily,
+    mode: SimulationMode = SimulationMode.sampling,
+    output: SimulationOutput = SimulationOutput.terminal,
+    variance_reduction: VarianceReduction = VarianceReduction.none,
+    workers: Optional[int] = None,
+    block_size: int = 1,
+    seed: Optional[int] = None,
+    initial_investment: float = 1.0,
+    monthly_contribution: float = 0.0,
+    reinvest_dividends: bool = True,
+    progress_every: Optional[int] = None,
+):
+    """
+    リクエストの計算方式と出力形式に応じてシミュレーションを実行し、途中経過と結果を順に返す
+
+    評価額は initial_investment を初期値とし、monthly_contribution を毎月末に積み立てる。
+    reinvest_dividends が False の場合は配当を再投資せず現金として受け取る。
+
+    seedを指定した場合、結果はワーカー数に依存せず決定的になるため、
+    キャリブレーションのバージョンを含むキーでLRUキャッシュする。
+    価格履歴に新しい日足が加わるとバージョンが変わり、再計算される。
+
+    途中で反復を打ち切ると、未計算のチャンクは実行されない。
+
+    Args:
+        progress_every: 途中経過を返すチャンク数の間隔（fan_chartのみ、Noneは最終結果のみ）
+
+    Yields:
+        (集計済みのパス数, SimulationResponse の各フィールドを持つ辞書)。
+        最後の要素が全パスを集計した結果（集計済みのパス数 = simulations）
+    """
+    base = {"symbol": symbol, "mode": mode}
+    if mode == SimulationMode.analytic:
+        if monthly_contribution > 0 or not reinvest_dividends:
+            raise ValueError("analyticモードでは積立・配当の受け取りを指定できません")
+        if initial_investment <= 0:
+            raise ValueError("初期投資額を指定してください")
+        result = dict(base)
+        result["bands"] = {
+            scenario: {band: [initial_investment*value for value in values] for band, values in bands.items()}
+            for scenario, bands in analytic_bands(symbol, years).items()
+        }
+        result["percentile_error"] = 0.0
+        result["principal"] = [initial_investment]*(years + 1)
+        yield simulations, result
+        return
+
+    key = None
+    if seed is not None:
+        key = (
+            symbol, years, simulations, seed, mode, step, output, variance_reduction, block_size,
+            initial_investment, monthly_contribution, reinvest_dividends,
+            get_calibration(symbol).version,
+        )
+        cached = _cached_result(key)
+        if cached is not None:
+            yield simulations, dict(cached)
+            return
+
+    for completed, partial in _iter_sample(
+        symbol, years, simulations, step, output, workers, variance_reduction, mode, block_size, seed,
+        initial_investment, monthly_contribution, reinvest_dividends, progress_every,
+    ):
+        result = {**base, **partial}
+        if key is not None and completed == simulations:
+            _store_result(key, result)
+            result = dict(result)
+        yield completed, result
+
+def run_simulation(*args, **kwargs):
+    """
+    リクエストの計算方式と出力形式に応じてシミュレーションを実行する
+
+    引数は iter_simulation と同じ（progress_every を除く）。
+
+    Returns:
+        SimulationResponse の各フィールドを持つ辞書
+    """
+    for _, result in iter_simulation(*args, **kwargs):
+        pass
+    return result
+
+def _portfolio_covariance(calibrations) -> np.ndarray:
+    """
+    キャリブレーション済みの日次リターンを日付で揃え、共分散行列を推定する
+
+    価格履歴はキャリブレーションストアのものを使うため、追加のダウンロードは発生しない。
+    """
+    aligned = pd.DataFrame({
+        calibration.symbol: pd.Series(calibration.returns, index=calibration.dates)
+        for calibration in calibrations
+    }).dropna()
+    if len(aligned) < MIN_ALIGNED_RETURNS:
+        raise ValueError("共分散の推定に必要な共通の価格履歴が不足しています")
+    return np.atleast_2d(aligned.cov().to_numpy())
+
+def _cholesky(covariance: np.ndarray) -> np.ndarray:
+    """
+    共分散行列のコレスキー因子を求める
+
+    完全相関などで正定値にならない場合は、負の固有値を0に切り詰めた平方根行列で代用する。
+    """
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+
+def simulate_portfolio(
+    assets: Dict[str, float],
+    years: int,
+    simulations: int,
+    rebalance: RebalanceFrequency = RebalanceFrequency.yearly,
+    output: SimulationOutput = SimulationOutput.terminal,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+):
+    """
+    相関のある複数資産のポートフォリオをモンテカルロ法でシミュレーションする
+
+    各資産のドリフトとボラティリティの扱いは単一銘柄のGBMと同じ（年率換算）で、
+    資産間の相関は日付を揃えた日次リターンの共分散行列を年率換算して与える。
+    シナリオは各資産のドリフトを同じ分位点に揃えて表す。
+
+    Args:
+        assets: {銘柄シンボル: 配分比率}（合計が1になるよう正規化する）
+        years: シミュレーション期間（年）
+        simulations: パス数
+        rebalance: リバランス頻度
+        output: 出力形式
+        workers: 並列ワーカー数（Noneは環境変数SIMULATION_WORKERS、0はCPUコア数）
+        seed: 乱数シード（Noneは毎回異なる）
+
+    Returns:
+        weights（正規化後の配分比率）と、scenarios または bands、
+        standard_error、percentile_error を持つ辞書
+    """
+    symbols = list(assets)
+    weights = np.array([assets[symbol] for symbol in symbols], dtype=float)
+    if np.any(weights <= 0):
+        raise ValueError("配分比率は正の値を指定してください")
+    weights /= weights.sum()
+
+    calibrations = [get_calibration(symbol) for symbol in symbols]
+    covariance = _portfolio_covariance(calibrations)*TRADING_DAYS_PER_YEAR
+    variances = np.diag(covariance)
+    drifts = np.array([
+        [_scenario_drift(calibration, quantile) for calibration in calibrations]
+        for quantile in SCENARIOS.values()
+    ]) - 0.5*variances
+
+    fan = output == SimulationOutput.fan_chart
+    checkpoints = years if fan else 1
+    step_days = REBALANCE_DAYS[rebalance]
+    steps = years*TRADING_DAYS_PER_YEAR // step_days
+
+    chunks = (
+        dict(zip(SCENARIOS, values))
+        for _, values in iter_portfolio_checkpoints(
+            drifts, _cholesky(covariance), weights, steps, step_days, simulations, checkpoints,
+            rebalance=rebalance != RebalanceFrequency.none, seed=seed, workers=workers,
+        )
+    )
+    result = {"weights": dict(zip(symbols, weights.tolist()))}
+    result.update(_aggregate(chunks, simulations, checkpoints, output))
+    return result
@@ -0,0 +1,406 @@
+import importlib.util
+import multiprocessing
+import os
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import numpy as np
+
+from app.models.enums import SimulationStep, VarianceReduction
+
+# 1年あたりの取引日数
+TRADING_DAYS_PER_YEAR = 252
+
+# 時間刻みごとの1ステップあたりの取引日数（terminalは期間全体で1ステップ）
+STEP_DAYS = {
+    SimulationStep.daily: 1,
+    SimulationStep.monthly: TRADING_DAYS_PER_YEAR // 12,
+    SimulationStep.yearly: TRADING_DAYS_PER_YEAR,
+}
+
+# 1チャンクで生成する乱数の最大要素数（パス数 × ステップ数、float64で約16MB）
+MAX_CHUNK_ELEMENTS = 2_000_000
+
+# Sobol列で最低限確保する独立なスクランブルの数（標準誤差の推定に使う）
+QMC_REPLICATES = 8
+
+# プロセスプールのワーカー数（1はプロセス内で実行、0はCPUコア数）
+SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", "1"))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+# プロセスプールを作れない環境（/dev/shm のないLambdaなど）か（一度失敗したら以降はプロセス内で計算する）
+_process_pool_unavailable = False
+
+def iter_chunks(
+    simulations: int,
+    steps: int,
+    variance_reduction: VarianceReduction = VarianceReduction.none,
+):
+    """
+    パス数をメモリ上限に収まるチャンクに分割する
+
+    チャンクの分割はパス数・ステップ数・分散減少法だけで決まり、ワーカー数には依存しない。
+    Sobol列では各チャンクが独立にスクランブルされた点列になるため、
+    チャンクのパス数を2のべき乗に揃え、QMC_REPLICATES 個以上のチャンクに分割する。
+
+    Yields:
+        (開始インデックス, チャンク内のパス数)
+    """
+    rows = max(1, MAX_CHUNK_ELEMENTS // steps)
+    if variance_reduction == VarianceReduction.sobol:
+        rows = max(1, min(rows, simulations // QMC_REPLICATES))
+        rows = 1 << (rows.bit_length() - 1)
+    for start in range(0, simulations, rows):
+        yield start, min(rows, simulations - start)
+
+def step_grid(years: int, step: SimulationStep):
+    """
+    時間刻みからステップ数と1ステップあたりの取引日数を求める
+
+    Returns:
+        (ステップ数, 1ステップあたりの取引日数)
+    """
+    total_days = years*TRADING_DAYS_PER_YEAR
+    if step == SimulationStep.terminal:
+        return 1, total_days
+    step_days = STEP_DAYS[step]
+    return total_days // step_days, step_days
+
+def sobol_available() -> bool:
+    """
+    スクランブルSobol列に必要なscipyがインストールされているか
+
+    scipyはLambdaのデプロイパッケージの容量を超えるため任意の依存（extras: sobol）としている。
+    """
+    return importlib.util.find_spec("scipy") is not None
+
+def _sobol_normals(rng: np.random.Generator, size: int, steps: int) -> np.ndarray:
+    """スクランブルされたSobol列を標準正規分布に変換する"""
+    # scipyはSobol列を使う場合のみ必要なため遅延インポートする（任意の依存）
+    from scipy.special import ndtri
+    from scipy.stats import qmc
+
+    sampler = qmc.Sobol(d=steps, scramble=True, seed=rng)
+    if size & (size - 1) == 0:
+        uniforms = sampler.random_base2(size.bit_length() - 1)
+    else:
+        # 最後の端数チャンクのみ2のべき乗にならない（均衡性が崩れる旨の警告は抑制する）
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            uniforms = sampler.random(size)
+    return ndtri(np.clip(uniforms, 1e-12, 1 - 1e-12))
+
+def _shock_checkpoints_chunk(
+    steps: int,
+    step_days: int,
+    checkpoints: int,
+    size: int,
+    seed_seq: np.random.SeedSequence,
+    variance_reduction: VarianceReduction = VarianceReduction.none,
+) -> np.ndarray:
+    """
+    1チャンク分のショックの累積和をチェックポイントごとに計算する（ワーカープロセスで実行される）
+
+    antitheticでは前半のパスのショックを符号反転したものを後半のパスに使う
+    （パス数が奇数の場合、最後の1パスは独立に生成する）。
+
+    Returns:
+        (パス数 × チェックポイント数) の累積ショック。ステップ行列はここで破棄される
+    """
+    rng = np.random.default_rng(seed_seq)
+    if variance_reduction == VarianceReduction.antithetic:
+        half = _checkpoint_sums(rng.standard_normal((size // 2, steps)), checkpoints)
+        extra = _checkpoint_sums(rng.standard_normal((size % 2, steps)), checkpoints)
+        sums = np.concatenate([half, -half, extra])
+    elif variance_reduction == VarianceReduction.sobol:
+        sums = _checkpoint_sums(_sobol_normals(rng, size, steps), checkpoints)
+    else:
+        sums = _checkpoint_sums(rng.standard_normal((size, steps)), checkpoints)
+    return sums * np.sqrt(step_days)
+
+def _checkpoint_sums(shocks: np.ndarray, checkpoints: int) -> np.ndarray:
+    """(パス数 × ステップ数) のショックをチェックポイント時点の累積和に縮約する"""
+    size, steps = shocks.shape
+    sums = shocks.reshape(size, checkpoints, steps // checkpoints).sum(axis=2)
+    return np.cumsum(sums, axis=1)
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    """ワーカー数を解決する（None は環境変数、0 はCPUコア数）"""
+    if workers is None:
+        workers = SIMULATION_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    プロセスプールを取得する（ワーカー数が変わった場合のみ作り直す）
+
+    スレッドを持つサーバープロセスからのforkを避けるため spawn で起動する。
+    ワーカーはこのモジュール（numpyのみに依存）だけを読み込む。
+    """
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _process_pool_workers = workers
+        return _process_pool
+
+def _mark_process_pool_unavailable(error: OSError):
+    """プロセスプールを作れないことを記録し、以降はプロセス内で計算する"""
+    global _process_pool_unavailable
+    print(f"Simulation process pool is unavailable, falling back to in-process execution: {error}")
+    shutdown_process_pool()
+    _process_pool_unavailable = True
+
+def shutdown_process_pool():
+    """プロセスプールを停止する（アプリケーション終了時・異常時）"""
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+        _process_pool_workers = 0
+
+def iter_shock_checkpoints(
+    steps: int,
+    step_days: int,
+    simulations: int,
+    checkpoints: int = 1,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    variance_reduction: VarianceReduction = VarianceReduction.none,
+):
+    """
+    各パスの日次換算ショックの累積和をチャンク単位で順に生成する
+
+    (パス数 × ステップ数) のショック行列をチャンク単位で一括生成し、
+    ステップ方向に累積してチェックポイント（等間隔、最後が満期）の値だけを返す。
+    GBMの推移は対数正規で厳密に表せるため、k日分のショックの和は N(0, k) として
+    1ステップで生成でき、時間刻みを粗くしても分布は変わらない。
+
+    各チャンクはシードから派生した独立な乱数列を持つため、
+    ワーカー数に関わらず同じシードからは同じ結果が得られる。
+
+    Args:
+        steps: ステップ数（checkpointsの倍数）
+        step_days: 1ステップあたりの取引日数
+        simulations: パス数
+        checkpoints: チェックポイント数
+        seed: 乱数シード（Noneの場合はOSのエントロピーを使用）
+        workers: 並列ワーカー数（Noneは環境変数SIMULATION_WORKERS、0はCPUコア数）
+        variance_reduction: 分散減少法（none, antithetic, sobol）
+
+    Yields:
+        (開始インデックス, (チャンク内のパス数 × チェックポイント数) の累積ショック)
+    """
+    chunks = list(iter_chunks(simulations, steps, variance_reduction))
+    seed_seqs = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = [
+        (steps, step_days, checkpoints, size, seed_seq, variance_reduction)
+        for (_, size), seed_seq in zip(chunks, seed_seqs)
+    ]
+    yield from _run_chunks(_shock_checkpoints_chunk, chunks, args, workers)
+
+def _run_chunks(kernel, chunks, args, workers: Optional[int]):
+    """
+    チャンクごとのカーネルを（必要ならプロセスプールで並列に）実行し、結果をチャンク順に返す
+
+    Yields:
+        (開始インデックス, カーネルの結果)
+    """
+    workers = min(_resolve_workers(workers), len(chunks))
+
+    done = 0
+    results = None
+    if workers > 1 and not _process_pool_unavailable:
+        try:
+            # mapは全チャンクを投入し、結果をチャンク順に返す
+            results = _get_process_pool(workers).map(kernel, *zip(*args))
+        except OSError as e:
+            # プロセスプールを作れない環境（/dev/shm のないLambdaなど）ではプロセス内で計算する
+            _mark_process_pool_unavailable(e)
+    if results is not None:
+        try:
+            try:
+                for chunk in results:
+                    yield chunks[done][0], chunk
+                    done += 1
+            finally:
+                # 呼び出し側が途中で打ち切った場合（ストリーミングの切断など）は未実行のチャンクを取り消す
+                results.close()
+        except BrokenProcessPool as e:
+            # ワーカーが異常終了した場合はプールを破棄して残りをプロセス内で計算する
+            # （チャンクごとのシードが固定なので結果は変わらない）
+            print(f"Simulation process pool is broken, falling back to in-process execution: {e}")
+            shutdown_process_pool()
+
+    for (start, _), chunk_args in zip(chunks[done:], args[done:]):
+        yield start, kernel(*chunk_args)
+
+def _bootstrap_checkpoints_chunk(
+    log_returns: np.ndarray,
+    days: int,
+    checkpoints: int,
+    block_size: int,
+    size: int,
+    seed_seq: np.random.SeedSequence,
+) -> np.ndarray:
+    """
+    1チャンク分のブートストラップ対数リターンの累積和をチェックポイントごとに計算する
+    （ワーカープロセスで実行される）
+
+    開始位置をまとめて乱択し、block_size 日の連続したリターンを循環的に切り出す
+    （ブロックブートストラップ、block_size=1 で日次リターンの単純な復元抽出）。
+    """
+    rng = np.random.default_rng(seed_seq)
+    blocks = -(-days // block_size)
+    starts = rng.integers(0, len(log_returns), (size, blocks, 1))
+    indices = ((starts + np.arange(block_size)) % len(log_returns)).reshape(size, -1)[:, :days]
+    return _checkpoint_sums(log_returns[indices], checkpoints)
+
+def iter_bootstrap_checkpoints(
+    log_returns: np.ndarray,
+    days: int,
+    simulations: int,
+    checkpoints: int = 1,
+    block_size: int = 1,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+):
+    """
+    過去の日次対数リターンを復元抽出したパスの累積和をチャンク単位で順に生成する
+
+    インデックスの乱択と切り出しをチャンク単位でベクトル化しており、
+    ステップごとのPythonループは発生しない。
+
+    Args:
+        log_returns: 時系列順の日次対数リターン
+        days: シミュレーション日数（checkpointsの倍数）
+        simulations: パス数
+        checkpoints: チェックポイント数
+        block_size: ブロックの長さ（日数）
+        seed: 乱数シード（Noneの場合はOSのエントロピーを使用）
+        workers: 並列ワーカー数（Noneは環境変数SIMULATION_WORKERS、0はCPUコア数）
+
+    Yields:
+        (開始インデックス, (チャンク内のパス数 × チェックポイント数) の累積対数リターン)
+    """
+    if len(log_returns) == 0:
+        raise ValueError("ブートストラップに使用するリターンがありません")
+    chunks = list(iter_chunks(simulations, days))
+    seed_seqs = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = [
+        (log_returns, days, checkpoints, block_size, size, seed_seq)
+        for (_, size), seed_seq in zip(chunks, seed_seqs)
+    ]
+    yield from _run_chunks(_bootstrap_checkpoints_chunk, chunks, args, workers)
+
+def _portfolio_checkpoints_chunk(
+    drifts: np.ndarray,
+    cholesky: np.ndarray,
+    weights: np.ndarray,
+    steps: int,
+    step_days: int,
+    checkpoints: int,
+    rebalance: bool,
+    size: int,
+    seed_seq: np.random.SeedSequence,
+) -> np.ndarray:
+    """
+    1チャンク分のポートフォリオ価値をシナリオ・チェックポイントごとに計算する
+    （ワーカープロセスで実行される）
+
+    資産間の相関はコレスキー因子で独立な正規乱数に与える。
+    rebalance=True の場合は各ステップの終わりに配分比率を元に戻す
+    （ステップごとのポートフォリオ成長率の積）。False の場合は初期配分のまま保有する。
+
+    Returns:
+        (シナリオ数 × パス数 × チェックポイント数) のポートフォリオ価値（初期値1.0）
+    """
+    rng = np.random.default_rng(seed_seq)
+    dt = 1/TRADING_DAYS_PER_YEAR
+    assets = len(weights)
+    per_checkpoint = steps // checkpoints
+    diffusion = rng.standard_normal((size, steps, assets)) @ cholesky.T
+    diffusion *= np.sqrt(dt*step_days)
+
+    values = np.empty((len(drifts), size, checkpoints))
+    for k, drift in enumerate(drifts):
+        log_increments = diffusion + drift*dt*step_days
+        if rebalance:
+            log_growth = np.log(np.exp(log_increments) @ weights)
+            log_growth = log_growth.reshape(size, checkpoints, per_checkpoint).sum(axis=2)
+            values[k] = np.exp(np.cumsum(log_growth, axis=1))
+        else:
+            log_assets = log_increments.reshape(size, checkpoints, per_checkpoint, assets).sum(axis=2)
+            values[k] = np.exp(np.cumsum(log_assets, axis=1)) @ weights
+    return values
+
+def iter_portfolio_checkpoints(
+    drifts: np.ndarray,
+    cholesky: np.ndarray,
+    weights: np.ndarray,
+    steps: int,
+    step_days: int,
+    simulations: int,
+    checkpoints: int = 1,
+    rebalance: bool = True,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+):
+    """
+    相関のある複数資産のポートフォリオ価値をチャンク単位で順に生成する
+
+    (パス数 × ステップ数 × 資産数) の乱数をチャンク単位で一括生成し、
+    全シナリオで同じ乱数を使う。
+
+    Args:
+        drifts: (シナリオ数 × 資産数) の年率のドリフト
+        cholesky: 年率換算したリターンの共分散行列のコレスキー因子
+        weights: 資産ごとの配分比率（合計1）
+        steps: ステップ数（checkpointsの倍数、リバランスする場合はリバランス回数）
+        step_days: 1ステップあたりの取引日数
+        simulations: パス数
+        checkpoints: チェックポイント数
+        rebalance: ステップごとにリバランスするかどうか
+        seed: 乱数シード（Noneの場合はOSのエントロピーを使用）
+        workers: 並列ワーカー数（Noneは環境変数SIMULATION_WORKERS、0はCPUコア数）
+
+    Yields:
+        (開始インデックス, (シナリオ数 × チャンク内のパス数 × チェックポイント数) の価値)
+    """
+    chunks = list(iter_chunks(simulations, steps*len(weights)))
+    seed_seqs = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = [
+        (drifts, cholesky, weights, steps, step_days, checkpoints, rebalance, size, seed_seq)
+        for (_, size), seed_seq in zip(chunks, seed_seqs)
+    ]
+    yield from _run_chunks(_portfolio_checkpoints_chunk, chunks, args, workers)
+
+def simulate_shock_sums(
+    steps: int,
+    step_days: int,
+    simulations: int,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> np.ndarray:
+    """
+    各パスの満期時点のショックの累積和を計算する
+
+    引数は iter_shock_checkpoints と同じ。
+    """
+    shock_sums = np.empty(simulations)
+    for start, chunk in iter_shock_checkpoints(steps, step_days, simulations, seed=seed, workers=workers):
+        shock_sums[start:start + len(chunk)] = chunk[:, -1]
+    return shock_sums
@@ -0,0 +1,330 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.models.enums import SimulationJobStatus, SimulationMode, SimulationOutput
+from . import simulation
+from .circuit_breaker import dynamodb_breaker
+
+# ジョブを実行するスレッド数（APIのリクエスト処理用スレッドとは別に確保する）
+SIMULATION_JOB_WORKERS = int(os.getenv("SIMULATION_JOB_WORKERS", "2"))
+
+# 実行待ち・実行中を合わせたジョブ数の上限（超えた投入は受け付けない）
+SIMULATION_JOB_QUEUE_LIMIT = int(os.getenv("SIMULATION_JOB_QUEUE_LIMIT", "16"))
+
+# ジョブの保持期間（秒）
+SIMULATION_JOB_TTL_SECONDS = int(os.getenv("SIMULATION_JOB_TTL_SECONDS", str(24 * 60 * 60)))
+
+# ジョブの保存先（memory: プロセス内, dynamodb: DynamoDBテーブル）
+SIMULATION_JOB_STORE = os.getenv("SIMULATION_JOB_STORE", "memory")
+SIMULATION_JOB_TABLE = os.getenv("SIMULATION_JOB_TABLE", "LaplaceSimulationJobs")
+
+# ジョブの実行方法（thread: プロセス内のスレッドプール, lambda: Lambda関数の非同期呼び出し）
+# Lambdaではレスポンスを返した後にコンテナが凍結され、スレッドプールのジョブが進まない（失われることもある）。
+# threadはコンテナ（Docker・uvicorn）でのデプロイ専用で、Lambdaでは lambda と dynamodb のストアを指定する
+SIMULATION_JOB_DISPATCH = os.getenv("SIMULATION_JOB_DISPATCH", "thread")
+
+# lambda 使用時にジョブを実行する関数（デフォルトは実行中の関数自身）
+SIMULATION_JOB_FUNCTION = os.getenv("SIMULATION_JOB_FUNCTION", os.getenv("AWS_LAMBDA_FUNCTION_NAME", ""))
+
+# ジョブを実行するLambdaイベントのsource（lambda_function.handler で振り分ける）
+JOB_EVENT_SOURCE = "laplace.simulation_job"
+
+# ジョブの種類ごとの実行関数
+JOB_RUNNERS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "simulation": simulation.run_simulation,
+    "portfolio": simulation.simulate_portfolio,
+}
+
+# 結果のJSONで終端値1つあたりに使うおおよそのバイト数（結果の大きさの見積もり用）
+RESULT_BYTES_PER_VALUE = 20
+
+class JobQueueFullError(Exception):
+    """ジョブの投入数が上限に達している場合の例外"""
+
+class InMemoryJobStore:
+    """プロセス内の辞書にジョブを保存するストア（ローカル開発・単一プロセス用）"""
+
+    # 保存できる結果の大きさの上限（バイト、Noneは上限なし）
+    max_result_bytes: Optional[int] = None
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, item in self._jobs.items() if item["expires_at"] < now]
+            for job_id in expired:
+                del self._jobs[job_id]
+            self._jobs[job["job_id"]] = dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job["expires_at"] < time.time():
+            return None
+        return dict(job)
+
+    def claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """実行待ちのジョブを実行中に変更して返す（実行待ちでない場合はNone）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["expires_at"] < time.time() or job["status"] != SimulationJobStatus.queued.value:
+                return None
+            job.update(status=SimulationJobStatus.running.value, updated_at=time.time())
+            return dict(job)
+
+class DynamoDBJobStore:
+    """
+    DynamoDBテーブルにジョブを保存するストア（本番の複数インスタンス用）
+
+    テーブルはパーティションキー jobId（文字列）を持ち、
+    expiresAt をTTL属性として設定しておく。
+    パラメータと結果は浮動小数点数をそのまま保存できないためJSON文字列で保存する。
+    項目の大きさの上限（400KB）を超える結果は保存できないため、投入時に見積もって受け付けない。
+    """
+
+    # 保存できる結果の大きさの上限（バイト、項目の上限400KBからパラメータなどの分を除く）
+    max_result_bytes: Optional[int] = 350_000
+
+    def __init__(self, table_name: str = SIMULATION_JOB_TABLE):
+        from .dynamodb import dynamodb
+        self.table = dynamodb.Table(table_name)
+
+    def save(self, job: Dict[str, Any]):
+        dynamodb_breaker.call(self.table.put_item, Item={
+            "jobId": job["job_id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "params": json.dumps(job["params"], default=str),
+            "result": json.dumps(job["result"], default=str) if job["result"] is not None else None,
+            "error": job["error"],
+            "createdAt": int(job["created_at"]),
+            "updatedAt": int(job["updated_at"]),
+            "expiresAt": int(job["expires_at"]),
+        })
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        item = dynamodb_breaker.call(self.table.get_item, Key={"jobId": job_id}).get("Item")
+        if item is None or int(item["expiresAt"]) < time.time():
+            return None
+        return self._from_item(item)
+
+    def claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        実行待ちのジョブを条件付き更新で実行中に変更して返す（実行待ちでない場合はNone）
+
+        Lambdaの非同期呼び出しは同じイベントを重複して届けることがあるため、実行するのは状態を変更できた1回だけにする。
+        """
+        from botocore.exceptions import ClientError
+        try:
+            item = dynamodb_breaker.call(
+                self.table.update_item,
+                Key={"jobId": job_id},
+                UpdateExpression="SET #status = :running, updatedAt = :now",
+                ConditionExpression="#status = :queued AND expiresAt >= :now",
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues={
+                    ":queued": SimulationJobStatus.queued.value,
+                    ":running": SimulationJobStatus.running.value,
+                    ":now": int(time.time()),
+                },
+                ReturnValues="ALL_NEW",
+            )["Attributes"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                return None
+            raise
+        return self._from_item(item)
+
+    @staticmethod
+    def _from_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "job_id": item["jobId"],
+            "kind": item["kind"],
+            "status": item["status"],
+            "params": json.loads(item["params"]),
+            "result": json.loads(item["result"]) if item.get("result") else None,
+            "error": item.get("error"),
+            "created_at": float(item["createdAt"]),
+            "updated_at": float(item["updatedAt"]),
+            "expires_at": float(item["expiresAt"]),
+        }
+
+_store = None
+_lambda_client = None
+_executor: Optional[ThreadPoolExecutor] = None
+_slots = threading.BoundedSemaphore(SIMULATION_JOB_QUEUE_LIMIT)
+_lock = threading.Lock()
+
+def get_job_store():
+    """環境変数SIMULATION_JOB_STOREに応じたジョブストアを取得する"""
+    global _store
+    with _lock:
+        if _store is None:
+            _store = DynamoDBJobStore() if SIMULATION_JOB_STORE == "dynamodb" else InMemoryJobStore()
+        return _store
+
+def set_job_store(store):
+    """ジョブストアを差し替える（テスト・管理者用）"""
+    global _store
+    with _lock:
+        _store = store
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, SIMULATION_JOB_WORKERS),
+                thread_name_prefix="simulation-job",
+            )
+        return _executor
+
+def _get_lambda_client():
+    global _lambda_client
+    with _lock:
+        if _lambda_client is None:
+            import boto3
+            _lambda_client = boto3.client("lambda", region_name=os.getenv("AWS_REGION", "ap-northeast-1"))
+        return _lambda_client
+
+def _execute_job(job_id: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    実行待ちのジョブを実行中に変更できた場合のみ実行し、状態と結果をストアに書き込む
+
+    Args:
+        params: 実行関数に渡すパラメータ（Noneはストアに保存したパラメータ）
+
+    Returns:
+        実行後のジョブ（実行待ちでなく実行しなかった場合はNone）
+    """
+    store = get_job_store()
+    job = store.claim(job_id)
+    if job is None:
+        return None
+    try:
+        result = JOB_RUNNERS[job["kind"]](**(job["params"] if params is None else params))
+        job.update(status=SimulationJobStatus.succeeded.value, result=result, updated_at=time.time())
+        store.save(job)
+    except Exception as e:
+        # 結果が保存できない場合も失敗として記録する
+        job.update(status=SimulationJobStatus.failed.value, result=None, error=str(e), updated_at=time.time())
+        try:
+            store.save(job)
+        except Exception as save_error:
+            print(f"Error saving simulation job {job['job_id']}: {save_error}")
+    return job
+
+def _run_job(job_id: str, params: Dict[str, Any]):
+    """スレッドプールでジョブを実行し、投入枠を返す"""
+    try:
+        _execute_job(job_id, params)
+    finally:
+        _slots.release()
+
+def _dispatch_to_lambda(job: Dict[str, Any]):
+    """
+    ジョブを実行するLambda関数を非同期に呼び出す
+
+    別のコンテナで実行されるため、ジョブストアはプロセス間で共有できるもの（dynamodb）に限る。
+    同時に実行するジョブ数はLambda関数の同時実行数で制限する。
+    """
+    if isinstance(get_job_store(), InMemoryJobStore):
+        raise RuntimeError("SIMULATION_JOB_DISPATCH=lambda では SIMULATION_JOB_STORE=dynamodb を指定してください")
+    if not SIMULATION_JOB_FUNCTION:
+        raise RuntimeError("ジョブを実行するLambda関数（SIMULATION_JOB_FUNCTION）が指定されていません")
+    _get_lambda_client().invoke(
+        FunctionName=SIMULATION_JOB_FUNCTION,
+        InvocationType="Event",
+        Payload=json.dumps({"source": JOB_EVENT_SOURCE, "job_id": job["job_id"]}).encode(),
+    )
+
+def run_dispatched_job(job_id: str) -> Dict[str, Any]:
+    """
+    Lambdaの非同期呼び出しで受け取ったジョブを実行する（lambda_function.handler から呼び出す）
+
+    非同期呼び出しの再試行・重複で同じジョブを重複して実行しないよう、
+    ストアで実行待ちから実行中に変更できた場合のみ実行する。
+
+    Returns:
+        ジョブIDと実行後の状態（実行しなかった場合は現在の状態）
+    """
+    job = _execute_job(job_id) or get_job(job_id)
+    return {"job_id": job_id, "status": job["status"] if job is not None else None}
+
+def _check_result_size(store, params: Dict[str, Any]):
+    """終端値を返すジョブの結果がストアに保存できる大きさか見積もる（超える場合はValueError）"""
+    if store.max_result_bytes is None or params.get("output") == SimulationOutput.fan_chart:
+        return
+    if params.get("mode") == SimulationMode.analytic:
+        return
+    estimated = params["simulations"] * len(simulation.SCENARIOS) * RESULT_BYTES_PER_VALUE
+    if estimated > store.max_result_bytes:
+        raise ValueError(
+            "結果がジョブストアに保存できる大きさを超えるため、output に fan_chart を指定するか simulations を減らしてください"
+        )
+
+def submit_job(kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    シミュレーションジョブを投入する
+
+    Args:
+        kind: ジョブの種類（simulation, portfolio）
+        params: 実行関数に渡すパラメータ
+
+    Returns:
+        投入したジョブ（status=queued）
+
+    Raises:
+        JobQueueFullError: 実行待ち・実行中のジョブ数が上限に達している場合（threadのみ）
+        ValueError: 結果がジョブストアに保存できる大きさを超える場合
+    """
+    if kind not in JOB_RUNNERS:
+        raise ValueError(f"不明なジョブの種類です: {kind}")
+    _check_result_size(get_job_store(), params)
+    dispatch_to_lambda = SIMULATION_JOB_DISPATCH == "lambda"
+    if not dispatch_to_lambda and not _slots.acquire(blocking=False):
+        raise JobQueueFullError("実行待ちのシミュレーションジョブが上限に達しています")
+
+    now = time.time()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": SimulationJobStatus.queued.value,
+        "params": params,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + SIMULATION_JOB_TTL_SECONDS,
+    }
+    try:
+        get_job_store().save(job)
+        if dispatch_to_lambda:
+            _dispatch_to_lambda(job)
+        else:
+            _get_executor().submit(_run_job, job["job_id"], params)
+    except Exception:
+        if not dispatch_to_lambda:
+            _slots.release()
+        raise
+    return job
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """ジョブを取得する（存在しない・期限切れの場合はNone）"""
+    return get_job_store().get(job_id)
+
+def shutdown_executor():
+    """ジョブ実行用のスレッドプールを停止する（アプリケーション終了時に呼び出す）"""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
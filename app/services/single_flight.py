@@ -0,0 +1,76 @@
+import copy
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class _Call:
+    """実行中の呼び出し（完了を待つ呼び出し元と結果を共有する）"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    同じキーの同時呼び出しを1回の実行にまとめる（single-flight）
+
+    先に呼び出したスレッドだけが関数を実行し、実行中に同じキーで呼び出したスレッドは
+    その完了を待って同じ結果（または例外）を受け取る。完了後の呼び出しは改めて実行する。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # 呼び出し元が結果を書き換えても互いに影響しないよう複製して返す
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def waiters(self, key: Hashable) -> int:
+        """実行中の呼び出しの完了を待っている呼び出し元の数"""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call else 0
+
+_group = SingleFlight()
+
+def single_flight(kind: str, group: SingleFlight = _group):
+    """
+    関数の同時呼び出しを (kind, 引数) ごとに1回の実行にまとめるデコレータ
+
+    Args:
+        kind: データの種類（キーの一部、同じ引数の別の関数と区別する）
+        group: 実行中の呼び出しを管理するSingleFlight
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (kind, args, tuple(sorted(kwargs.items())))
+            return group.do(key, fn, *args, **kwargs)
+        wrapper.single_flight_group = group
+        return wrapper
+    return decorator
@@ -0,0 +1,226 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.models.enums import UpstreamPriority
+from .circuit_breaker import UpstreamUnavailableError
+from .rate_limiter import current_priority
+
+# 外部データソースごとの実行スレッド数と実行待ちの上限 {名前: (スレッド数, 実行待ちの上限)}
+UPSTREAM_EXECUTOR_LIMITS: Dict[str, tuple] = {
+    "yfinance": (
+        int(os.getenv("UPSTREAM_YFINANCE_WORKERS", "8")),
+        int(os.getenv("UPSTREAM_YFINANCE_QUEUE_LIMIT", "8")),
+    ),
+    "yahoo_finance_japan": (
+        int(os.getenv("UPSTREAM_YAHOO_JAPAN_WORKERS", "2")),
+        int(os.getenv("UPSTREAM_YAHOO_JAPAN_QUEUE_LIMIT", "2")),
+    ),
+    "dynamodb": (
+        int(os.getenv("UPSTREAM_DYNAMODB_WORKERS", "4")),
+        int(os.getenv("UPSTREAM_DYNAMODB_QUEUE_LIMIT", "4")),
+    ),
+}
+
+# 外部データソースを待たないエンドポイント（静的データで応答する検索など）用に残すAPIのスレッド数
+API_STATIC_THREADS = int(os.getenv("API_STATIC_THREADS", "16"))
+
+# APIリクエストを処理するスレッド数
+# 外部データソースを待つAPIのスレッドは各データソースのスレッド数+実行待ちの上限までのため、その合計に API_STATIC_THREADS を加える
+API_THREADPOOL_SIZE = sum(workers + queue_limit for workers, queue_limit in UPSTREAM_EXECUTOR_LIMITS.values()) + API_STATIC_THREADS
+
+class UpstreamSaturatedError(UpstreamUnavailableError):
+    """外部データソースの実行スレッドと実行待ちが上限に達している場合の例外"""
+
+class BoundedExecutor:
+    """
+    外部データソースごとの実行スレッド数と実行待ちの数に上限のあるスレッドプール
+
+    上限を超える投入は待たせずに UpstreamSaturatedError で失敗させ、
+    実行中・実行待ちの数、拒否数、実行待ちの時間を監視用に集計する。
+    バックグラウンドの呼び出しは workers 件までしか投入できず、実行待ちの枠は対話的なリクエストに残す。
+    """
+
+    def __init__(self, name: str, workers: int, queue_limit: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats = {"active": 0, "queued": 0, "completed": 0, "max_queued": 0}
+        self._rejected = {priority: 0 for priority in UpstreamPriority}
+        self._queue_wait_seconds = 0.0
+        self._max_queue_wait_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"upstream-{self.name}")
+            return self._executor
+
+    def _run(self, submitted_at: float, fn: Callable[..., Any], *args, **kwargs):
+        waited = time.monotonic() - submitted_at
+        with self._lock:
+            self._stats["queued"] -= 1
+            self._stats["active"] += 1
+            self._queue_wait_seconds += waited
+            self._max_queue_wait_seconds = max(self._max_queue_wait_seconds, waited)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._stats["active"] -= 1
+                self._stats["completed"] += 1
+
+    def _reserve(self, limit: int) -> bool:
+        with self._lock:
+            if self._stats["active"] + self._stats["queued"] >= limit:
+                return False
+            self._stats["queued"] += 1
+            self._stats["max_queued"] = max(self._stats["max_queued"], self._stats["queued"])
+            return True
+
+    def _cancel(self):
+        with self._lock:
+            self._stats["queued"] -= 1
+
+    def _start(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        try:
+            return self._get_executor().submit(
+                contextvars.copy_context().run, self._run, time.monotonic(), fn, *args, **kwargs
+            )
+        except Exception:
+            self._cancel()
+            raise
+
+    def reserve(self) -> "Reservation":
+        """
+        実行待ちの枠を予約する（トークンの待ちなど、投入前に待つ間も枠を使う）
+
+        Raises:
+            UpstreamSaturatedError: 実行中・実行待ちの数が上限に達している場合
+        """
+        priority = current_priority()
+        limit = self.workers if priority == UpstreamPriority.background else self.workers + self.queue_limit
+        if not self._reserve(limit):
+            with self._lock:
+                self._rejected[priority] += 1
+            raise UpstreamSaturatedError(
+                self.name,
+                f"{self.name} の実行待ちが上限に達しています",
+                retry_after=1.0,
+            )
+        return Reservation(self)
+
+    def try_reserve(self) -> Optional["Reservation"]:
+        """
+        空いているスレッドがある場合のみ枠を予約する（実行待ちにはしない）
+
+        ヘッジの2回目の試行など、省略できる呼び出しに使う。空きがない場合はNone（拒否数には数えない）。
+        """
+        return Reservation(self) if self._reserve(self.workers) else None
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        呼び出しを投入する（呼び出し元の優先度などのコンテキストを引き継ぐ）
+
+        Raises:
+            UpstreamSaturatedError: 実行中・実行待ちの数が上限に達している場合
+        """
+        return self.reserve().submit(fn, *args, **kwargs)
+
+    def try_submit(self, fn: Callable[..., Any], *args, **kwargs) -> Optional[Future]:
+        """空いているスレッドがある場合のみ投入する（try_reserve を参照）"""
+        reservation = self.try_reserve()
+        return reservation.submit(fn, *args, **kwargs) if reservation is not None else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """実行中・実行待ちの数と累計（監視用）"""
+        with self._lock:
+            started = self._stats["completed"] + self._stats["active"]
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                **self._stats,
+                "rejected": {priority.value: count for priority, count in self._rejected.items()},
+                "saturation": (self._stats["active"] + self._stats["queued"]) / (self.workers + self.queue_limit),
+                "avg_queue_wait_seconds": self._queue_wait_seconds / started if started else 0.0,
+                "max_queue_wait_seconds": self._max_queue_wait_seconds,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+class Reservation:
+    """スレッドプールの実行待ちの枠の予約（submit で投入するか、cancel で取り消す）"""
+
+    def __init__(self, executor: Optional[BoundedExecutor]):
+        self._executor = executor
+        self._done = False
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """予約した枠で呼び出しを投入する（スレッドプールがない場合は呼び出し元のスレッドで実行する）"""
+        self._done = True
+        if self._executor is not None:
+            return self._executor._start(fn, *args, **kwargs)
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def cancel(self):
+        """投入しなかった予約を取り消す"""
+        if not self._done and self._executor is not None:
+            self._executor._cancel()
+        self._done = True
+
+# 外部データソースごとのスレッドプール
+EXECUTORS: Dict[str, BoundedExecutor] = {
+    name: BoundedExecutor(name, workers, queue_limit) for name, (workers, queue_limit) in UPSTREAM_EXECUTOR_LIMITS.items()
+}
+
+def reserve(source: str) -> Reservation:
+    """
+    外部データソースの専用のスレッドプールの枠を予約する（設定がない場合は呼び出し元のスレッドで実行する予約）
+
+    Raises:
+        UpstreamSaturatedError: 実行中・実行待ちの数が上限に達している場合
+    """
+    executor = EXECUTORS.get(source)
+    return executor.reserve() if executor is not None else Reservation(None)
+
+def try_reserve(source: str) -> Optional[Reservation]:
+    """
+    外部データソースの専用のスレッドプールに空いているスレッドがある場合のみ枠を予約する
+
+    空きがない場合・専用のスレッドプールの設定がない場合はNone（呼び出し元のスレッドでは実行しない）。
+    """
+    executor = EXECUTORS.get(source)
+    return executor.try_reserve() if executor is not None else None
+
+def submit(source: str, fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """
+    外部データソースの呼び出しを専用のスレッドプールに投入する（設定がない場合は呼び出し元のスレッドで実行する）
+
+    Raises:
+        UpstreamSaturatedError: 実行中・実行待ちの数が上限に達している場合（呼び出さない）
+    """
+    return reserve(source).submit(fn, *args, **kwargs)
+
+def get_executor_status(source: str) -> Optional[Dict[str, Any]]:
+    """外部データソース用のスレッドプールの状態（監視用）"""
+    executor = EXECUTORS.get(source)
+    return executor.snapshot() if executor is not None else None
+
+def shutdown_executors():
+    """外部データソース用のスレッドプールを停止する（アプリケーション終了時に呼び出す）"""
+    for executor in EXECUTORS.values():
+        executor.shutdown()
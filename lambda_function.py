@@ -1,5 +1,24 @@
 from app.main import app
+from app.services import simulation_jobs
 from mangum import Mangum
 
 # FastAPIアプリケーションをAWS Lambda用にラップ
-handler = Mangum(app) 
\ No newline at end of file
+_asgi_handler = Mangum(app)
+
+def handler(event, context):
+    """
+    Lambdaのエントリポイント
+
+    シミュレーションジョブの非同期呼び出し（SIMULATION_JOB_DISPATCH=lambda）の場合はジョブを実行し、
+    EventBridgeの定期イベント（source: aws.events、ウォームアップ用など）は何もせず、
+    それ以外はAPIリクエストとして処理する。
+
+    価格キャッシュはコンテナごとのため、定期イベントで人気銘柄の価格を事前取得しても
+    イベントを受けたコンテナにしか効かず、外部データソースの呼び出し回数だけを消費する。
+    事前取得は常駐するコンテナでのデプロイ（QUOTE_WARMER_ENABLED）でのみ行う。
+    """
+    if isinstance(event, dict) and event.get("source") == "aws.events":
+        return {"status": "ignored"}
+    if isinstance(event, dict) and event.get("source") == simulation_jobs.JOB_EVENT_SOURCE:
+        return simulation_jobs.run_dispatched_job(event["job_id"])
+    return _asgi_handler(event, context)
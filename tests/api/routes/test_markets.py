@@ -3,8 +3,11 @@ from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
 import pandas as pd
 import json
+from datetime import date, datetime, timezone
 
 from app.main import app
+from app.models.enums import Exchange
+from app.services import market_hours
 from app.services.market import JAPAN_TICKERS, INITIAL_TICKERS, fuzzy_search
 
 # テスト用のクライアント
@@ -56,14 +59,18 @@ def patch_fuzzy_search():
 def patch_stock_price():
     """get_stock_price関数をモック化"""
     def mock_get_price(symbol):
-        is_japan = symbol.endswith('.T')
-        currency = "¥" if is_japan else "$"
         return {
-            "price": f"{currency}100.00",
-            "change_percent": "+1.2%"
+            "price": 100.0,
+            "change_percent": 1.2,
+            "last_updated": "2024-01-02T00:00:00",
+            "is_stale": False
         }
     
-    with patch('app.services.market.get_stock_price', side_effect=mock_get_price):
+    def mock_get_prices(symbols):
+        return {symbol: mock_get_price(symbol) for symbol in symbols}
+    
+    with patch('app.services.market.get_stock_price', side_effect=mock_get_price), \
+            patch('app.services.market.get_stock_prices', side_effect=mock_get_prices):
         yield
 
 # テストケース
@@ -151,4 +158,255 @@ def test_legacy_endpoint():
     v1_data = v1_response.json()
     legacy_data = legacy_response.json()
     
-    assert v1_data == legacy_data 
\ No newline at end of file
+    assert v1_data == legacy_data 
+
+def test_get_stock_prices_fetches_symbols_in_one_download(make_download_data):
+    """複数銘柄の価格を1回のダウンロードで取得し、銘柄ごとに分割することをテスト"""
+    from app.services import market
+    
+    market.clear_quote_cache()
+    with patch('app.services.market.yf.download', return_value=make_download_data(["AAPL", "7203.T"])) as download, \
+            patch('app.services.market.get_stock_price') as single:
+        prices = market.get_stock_prices(["AAPL", "7203.T", "AAPL"])
+    
+    download.assert_called_once()
+    assert download.call_args.args[0] == ["AAPL", "7203.T"]
+    single.assert_not_called()
+    assert prices["AAPL"]["price"] == 110.0
+    assert prices["AAPL"]["change_percent"] == 10.0
+    assert prices["7203.T"]["price"] == 111.0
+
+def test_get_stock_prices_falls_back_to_single_fetch_for_missing_symbols(make_download_data):
+    """一括取得で得られなかった銘柄のみ個別に取得することをテスト"""
+    from app.services import market
+    
+    market.clear_quote_cache()
+    fallback = {"price": 1.0, "change_percent": 0.0, "last_updated": "2024-01-01T00:00:00Z"}
+    with patch('app.services.market.yf.download', return_value=make_download_data(["AAPL", "MSFT"]).drop(columns="MSFT", level=0)), \
+            patch('app.services.market.get_stock_price', return_value=fallback) as single:
+        prices = market.get_stock_prices(["AAPL", "MSFT"])
+    
+    single.assert_called_once_with("MSFT")
+    assert prices["MSFT"] == fallback
+    assert prices["AAPL"]["price"] == 110.0
+
+def test_market_holidays():
+    """東証・NYSEの休場日が判定できることをテスト"""
+    # 2026年: 振替休日（5/6）、国民の休日（9/22）、年末年始
+    for day in [date(2026, 5, 6), date(2026, 9, 22), date(2026, 12, 31), date(2026, 1, 2)]:
+        assert market_hours.is_holiday(Exchange.TSE, day)
+    assert not market_hours.is_holiday(Exchange.TSE, date(2026, 5, 7))
+    # 2026年: 聖金曜日（4/3）、独立記念日の振替（7/3）、感謝祭（11/26）
+    for day in [date(2026, 4, 3), date(2026, 7, 3), date(2026, 11, 26)]:
+        assert market_hours.is_holiday(Exchange.NYSE, day)
+    assert not market_hours.is_holiday(Exchange.NYSE, date(2026, 11, 27))
+
+def test_quote_ttl_depends_on_trading_session():
+    """立会中は短い有効期間、休場中は次の立会開始までの有効期間になることをテスト"""
+    # 2026-10-16（金）10:00 JST: 東証は立会中
+    assert market_hours.quote_ttl("7203.T", datetime(2026, 10, 16, 1, 0, tzinfo=timezone.utc)) == market_hours.QUOTE_TTL_OPEN_SECONDS
+    # 昼休み（12:00 JST）は後場の開始（12:30）まで
+    assert market_hours.quote_ttl("7203.T", datetime(2026, 10, 16, 3, 0, tzinfo=timezone.utc)) == 30 * 60
+    # 金曜の大引け後（20:00 JST）は月曜9:00まで
+    assert market_hours.quote_ttl("7203.T", datetime(2026, 10, 16, 11, 0, tzinfo=timezone.utc)) == (2 * 24 + 13) * 3600
+    # 同時刻のNYSEは立会前で、9:30 ETまで
+    assert market_hours.quote_ttl("AAPL", datetime(2026, 10, 16, 11, 0, tzinfo=timezone.utc)) == 2.5 * 3600
+    # 暗号資産は常に短い有効期間
+    assert market_hours.quote_ttl("BTC-USD", datetime(2026, 10, 17, 11, 0, tzinfo=timezone.utc)) == market_hours.QUOTE_TTL_OPEN_SECONDS
+
+def test_get_stock_price_is_cached_until_expiry(make_download_data):
+    """価格情報がキャッシュされ、取得に失敗した場合の値はキャッシュされないことをテスト"""
+    from app.services import market
+    
+    market.clear_quote_cache()
+    history = make_download_data(["AAPL"])["AAPL"]
+    with patch('app.services.market.yf.Ticker') as ticker, \
+            patch('app.services.market.quote_ttl', return_value=60):
+        ticker.return_value.history.return_value = history
+        first = market.get_stock_price("AAPL")
+        second = market.get_stock_price("AAPL")
+        assert first == second
+        assert ticker.call_count == 1
+        
+        ticker.return_value.history.return_value = pd.DataFrame({"Close": []})
+        for _ in range(2):
+            with pytest.raises(market.QuoteNotFoundError):
+                market.get_stock_price("MSFT")
+        assert ticker.call_count == 3
+    market.clear_quote_cache()
+
+def test_market_details_distinguishes_missing_quote_from_outage():
+    """価格データがない銘柄は404、外部データソースの障害はRetry-After付きの503を返すことをテスト"""
+    from app.services import market
+    from app.services.circuit_breaker import yfinance_breaker
+    
+    market.clear_quote_cache()
+    yfinance_breaker.reset()
+    with patch('app.services.market.get_ticker_info', return_value={}), \
+            patch('app.services.market.yf.Ticker') as ticker:
+        ticker.return_value.history.return_value = pd.DataFrame({"Close": []})
+        response = client.get("/v1/markets/NOSUCH")
+        assert response.status_code == 404
+        assert response.json()["detail"]["error_code"] == "QUOTE_NOT_FOUND"
+        
+        ticker.return_value.history.side_effect = ConnectionError("timeout")
+        response = client.get("/v1/markets/AAPL")
+        assert response.status_code == 503
+        assert response.json()["detail"]["error_code"] == "SERVICE_UNAVAILABLE"
+        assert "Retry-After" in response.headers
+    yfinance_breaker.reset()
+    market.clear_quote_cache()
+
+def test_get_stock_price_serves_stale_quote_and_refreshes():
+    """期限切れの価格情報を即座に返し、バックグラウンドで再取得することをテスト"""
+    from app.services import market
+    
+    market.clear_quote_cache()
+    quote = {"price": 150.0, "change_percent": 1.5, "last_updated": "2024-01-02T00:00:00"}
+    with patch('app.services.market.quote_ttl', return_value=-1):
+        market._store_quote("AAPL", quote)
+    
+    with patch('app.services.market._refresh_quote_in_background') as refresh, \
+            patch('app.services.market._fetch_stock_price') as fetch:
+        result = market.get_stock_price("AAPL")
+    assert result == {**quote, "is_stale": True}
+    refresh.assert_called_once_with("AAPL")
+    fetch.assert_not_called()
+    
+    # 再取得に失敗しても最終既知値を残す
+    with patch('app.services.market._fetch_stock_price', return_value=None):
+        market._refresh_quote("AAPL")
+    assert market._get_cached_quote("AAPL", allow_stale=True)["price"] == 150.0
+    
+    # 再取得に成功すると新しい値に置き換わる
+    with patch('app.services.market._fetch_stock_price', return_value={**quote, "price": 151.0}), \
+            patch('app.services.market.quote_ttl', return_value=60):
+        market._refresh_quote("AAPL")
+    assert market.get_stock_price("AAPL") == {**quote, "price": 151.0, "is_stale": False}
+    market.clear_quote_cache()
+
+@patch('app.services.market.fuzzy_search', side_effect=mock_fuzzy_search)
+def test_search_without_quote_returns_null_price(mock_search):
+    """価格情報を取得できない銘柄は架空の価格ではなくnullを返すことをテスト"""
+    with patch('app.services.market.get_stock_prices', return_value={}):
+        response = client.get("/v1/markets/search?query=Apple")
+    assert response.status_code == 200
+    result = response.json()["results"][0]
+    assert result["price"] is None
+    assert result["changePercent"] is None
+
+def test_market_details_fetches_ticker_info_once():
+    """銘柄詳細の取得で基本情報（Ticker.info）の取得が1回だけであることをテスト"""
+    from unittest.mock import PropertyMock
+    from app.services import market
+    
+    market.clear_ticker_data_cache()
+    info = PropertyMock(return_value={
+        "longName": "Apple Inc.",
+        "sector": "Technology",
+        "industry": "Consumer Electronics",
+        "previousClose": 150.0,
+        "dividendYield": 0.005,
+    })
+    quote = {"price": 150.0, "change_percent": 1.0, "last_updated": "2024-01-02T00:00:00", "is_stale": False}
+    with patch('app.services.market.yf.Ticker') as ticker, \
+            patch('app.services.market.get_stock_price', return_value=quote):
+        type(ticker.return_value).info = info
+        details = market.get_market_details("AAPL")
+        market.get_fundamental_data("AAPL")
+    assert details["name"] == "Apple Inc."
+    assert info.call_count == 1
+    market.clear_ticker_data_cache()
+
+def test_ticker_data_cache_is_bounded_and_purges_expired(monkeypatch):
+    """基本情報のキャッシュが件数の上限を超えた場合に最も古く使われたものから削除し、期限切れの値も削除することをテスト"""
+    from app.services import market
+    
+    market.clear_ticker_data_cache()
+    monkeypatch.setattr(market, "TICKER_DATA_CACHE_SIZE", 2)
+    with patch('app.services.market.yf.Ticker') as ticker:
+        ticker.return_value.info = {}
+        for symbol in ("AAA", "BBB", "AAA", "CCC"):
+            market.get_ticker_info(symbol)
+        assert [symbol for symbol, _ in market._ticker_data_cache] == ["AAA", "CCC"]
+        
+        # 期限切れの値は上限に達していなくても削除する
+        market._ticker_data_cache[("AAA", "info")] = ({}, 0)
+        monkeypatch.setattr(market, "TICKER_DATA_CACHE_SIZE", 3)
+        market.get_ticker_info("DDD")
+    assert [symbol for symbol, _ in market._ticker_data_cache] == ["CCC", "DDD"]
+    market.clear_ticker_data_cache()
+
+def test_quote_warmer_refreshes_popular_symbols_for_related_markets(make_download_data):
+    """人気銘柄の価格情報を事前取得し、関連銘柄がそのキャッシュを読むことをテスト"""
+    from app.services import market, quote_warmer
+    
+    market.clear_quote_cache()
+    symbols = quote_warmer.popular_symbols(3)
+    assert symbols == ["AAPL", "SPY", "^GSPC"]
+    
+    with patch('app.services.market.yf.download', return_value=make_download_data(symbols)) as download, \
+            patch('app.services.market.quote_ttl', return_value=600):
+        assert quote_warmer.warm_popular_quotes(3) == {"symbols": 3, "refreshed": 3}
+        # 次回の実行まで有効な銘柄は再取得しない
+        assert quote_warmer.warm_popular_quotes(3, min_ttl=60) == {"symbols": 3, "refreshed": 0}
+    assert download.call_count == 1
+    
+    with patch('app.services.market._get_related_stocks_optimized',
+               return_value=[{"symbol": "AAPL", "name": "Apple Inc."}]), \
+            patch('app.services.market.yf.download') as download:
+        related = market.get_related_markets("MSFT", limit=1)
+    download.assert_not_called()
+    assert related["items"][0]["price"] == "$110.00"
+    assert related["items"][0]["is_stale"] is False
+    market.clear_quote_cache()
+
+def test_lambda_scheduled_event_does_not_warm_quotes():
+    """Lambdaの定期イベントでは、コンテナごとの価格キャッシュを事前取得しないことをテスト"""
+    import lambda_function
+    
+    with patch('app.services.market.yf.download') as download:
+        assert lambda_function.handler({"source": "aws.events", "detail-type": "Scheduled Event"}, None) == {"status": "ignored"}
+    download.assert_not_called()
+
+def test_dividend_yield_related_markets_without_quote_have_no_price():
+    """利回り基準の関連銘柄で価格を取得できない銘柄は価格なし（0ではない）で返すことをテスト"""
+    from app.services import market
+    
+    with patch('app.services.market.get_stock_prices', return_value={"JPM": {"price": 150.0, "change_percent": 1.2}}):
+        items = market._get_dividend_yield_optimized("AAPL", 10, 1.3)["items"]
+    prices = {item["symbol"]: item for item in items}
+    assert prices["JPM"]["price"] == "$150.00"
+    assert prices["V"]["price"] is None
+    assert prices["V"]["change_percent"] is None
+
+def test_chart_returns_503_without_calling_yfinance_while_circuit_is_open():
+    """yfinanceの遮断中はチャートが外部データソースを待たずに503を返すことをテスト"""
+    from app.services.circuit_breaker import yfinance_breaker
+    
+    yfinance_breaker.reset()
+    try:
+        with patch('app.services.market.yf.Ticker') as ticker:
+            ticker.return_value.history.side_effect = ConnectionError("timeout")
+            for _ in range(yfinance_breaker.min_calls):
+                response = client.get("/v1/charts/AAPL?period=1M")
+                assert response.status_code == 503
+            calls = ticker.return_value.history.call_count
+            
+            response = client.get("/v1/charts/AAPL?period=3M")
+            assert response.status_code == 503
+            assert response.json()["detail"]["error_code"] == "SERVICE_UNAVAILABLE"
+            assert int(response.headers["Retry-After"]) >= 1
+            assert ticker.return_value.history.call_count == calls
+    finally:
+        yfinance_breaker.reset()
+
+def test_upstream_status_endpoint():
+    """外部データソースの状態（サーキットブレーカーと流量制御）を返すことをテスト"""
+    response = client.get("/v1/status/upstreams")
+    assert response.status_code == 200
+    upstreams = {item["name"]: item for item in response.json()["upstreams"]}
+    assert set(upstreams) == {"yfinance", "yahoo_finance_japan", "dynamodb"}
+    assert upstreams["yfinance"]["circuit"]["state"] == "closed"
+    assert "interactive" in upstreams["yfinance"]["rateLimit"]["waiting"]
+    assert "saturation" in upstreams["yfinance"]["executor"]
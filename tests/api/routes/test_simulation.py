@@ -0,0 +1,625 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+from app.main import app
+from app.models.enums import SimulationStep, VarianceReduction
+from app.services import calibration
+from app.services import simulation as sim_service
+from app.services import simulation_engine
+from app.services import simulation_jobs
+from app.services.quantile_sketch import QuantileSketch
+
+# テスト用のクライアント
+client = TestClient(app)
+
+def make_price_history(days=2000, seed=0):
+    """テスト用の価格履歴を作成"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0004, 0.01, days)))
+    dates = pd.date_range("2015-01-01", periods=days, freq="B").strftime("%Y-%m-%d")
+    return pd.DataFrame({"Date": dates, "Close": close, "Dividend": 0.0})
+
+@pytest.fixture
+def patch_price_history():
+    """get_price_history関数をモック化"""
+    calibration.clear_calibrations()
+    sim_service.clear_result_cache()
+    with patch('app.services.calibration.get_price_history', return_value=make_price_history()):
+        yield
+    calibration.clear_calibrations()
+    sim_service.clear_result_cache()
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_simulate_returns_terminal_values_per_scenario():
+    """シナリオごとにシミュレーション回数分の終端値が返されることをテスト"""
+    response = client.post("/v1/simulation", json={"symbol": "AAPL", "years": 5, "simulations": 50})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["symbol"] == "AAPL"
+    assert set(data["scenarios"].keys()) == set(sim_service.SCENARIOS.keys())
+    for values in data["scenarios"].values():
+        assert len(values) == 50
+        assert all(v > 0 for v in values)
+
+def test_shock_sums_follow_random_walk_distribution():
+    """チャンク分割されたショックの累積和が理論分布と一致することをテスト"""
+    steps = 252
+    with patch.object(simulation_engine, "MAX_CHUNK_ELEMENTS", steps * 1000):
+        shock_sums = simulation_engine.simulate_shock_sums(steps, 1, 20000, seed=1)
+    assert len(shock_sums) == 20000
+    assert shock_sums.mean() == pytest.approx(0.0, abs=0.5)
+    assert shock_sums.std() == pytest.approx(np.sqrt(steps), rel=0.03)
+
+def test_parallel_results_do_not_depend_on_worker_count():
+    """同じシードならワーカー数に関わらず同じ結果になることをテスト"""
+    steps = 252
+    with patch.object(simulation_engine, "MAX_CHUNK_ELEMENTS", steps * 100):
+        serial = simulation_engine.simulate_shock_sums(steps, 1, 1000, seed=42, workers=1)
+        parallel = simulation_engine.simulate_shock_sums(steps, 1, 1000, seed=42, workers=2)
+    simulation_engine.shutdown_process_pool()
+    np.testing.assert_array_equal(serial, parallel)
+
+def test_falls_back_to_in_process_when_process_pool_is_unavailable(monkeypatch):
+    """プロセスプールを作れない環境（/dev/shm のないLambdaなど）ではプロセス内で計算し、以降は作ろうとしないことをテスト"""
+    steps = 252
+    monkeypatch.setattr(simulation_engine, "_process_pool_unavailable", False)
+    with patch.object(simulation_engine, "MAX_CHUNK_ELEMENTS", steps * 100), \
+            patch.object(simulation_engine, "ProcessPoolExecutor", side_effect=OSError(38, "Function not implemented")) as pool:
+        serial = simulation_engine.simulate_shock_sums(steps, 1, 1000, seed=42, workers=1)
+        for _ in range(2):
+            fallback = simulation_engine.simulate_shock_sums(steps, 1, 1000, seed=42, workers=2)
+            np.testing.assert_array_equal(serial, fallback)
+    assert pool.call_count == 1
+
+@pytest.mark.parametrize("step", list(SimulationStep))
+def test_step_resolution_keeps_terminal_distribution(step):
+    """時間刻みを変えても終端ショックの分布が変わらないことをテスト"""
+    years = 3
+    steps, step_days = simulation_engine.step_grid(years, step)
+    assert steps * step_days == years * simulation_engine.TRADING_DAYS_PER_YEAR
+    shock_sums = simulation_engine.simulate_shock_sums(steps, step_days, 20000, seed=2)
+    assert shock_sums.std() == pytest.approx(np.sqrt(steps * step_days), rel=0.03)
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_simulate_accepts_step_option():
+    """stepオプションを指定してシミュレーションできることをテスト"""
+    response = client.post("/v1/simulation", json={"symbol": "AAPL", "years": 10, "simulations": 20, "step": "yearly"})
+    assert response.status_code == 200
+    assert len(response.json()["scenarios"]["base"]) == 20
+
+    response = client.post("/v1/simulation", json={"symbol": "AAPL", "step": "hourly"})
+    assert response.status_code == 422
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_analytic_mode_returns_yearly_bands():
+    """analyticモードで年次の分位点カーブが返されることをテスト"""
+    response = client.post("/v1/simulation", json={"symbol": "AAPL", "years": 10, "mode": "analytic"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["mode"] == "analytic"
+    assert data["scenarios"] is None
+    for bands in data["bands"].values():
+        assert len(bands["median"]) == 11
+        assert bands["median"][0] == pytest.approx(1.0)
+        assert all(lo <= mid <= hi for lo, mid, hi in zip(bands["lower5"], bands["median"], bands["upper95"]))
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_analytic_bands_match_sampled_quantiles():
+    """閉形式の分位点がサンプリング結果の分位点と一致することをテスト"""
+    years = 5
+    bands = sim_service.analytic_bands("AAPL", years)
+    sims = sim_service.monte_carlo("AAPL", years, 20000, SimulationStep.terminal)
+    for scenario, band_values in bands.items():
+        for band, quantile in sim_service.PERCENTILE_BANDS.items():
+            sampled = np.quantile(sims[scenario], quantile)
+            assert band_values[band][-1] == pytest.approx(sampled, rel=0.02)
+
+def test_calibration_incremental_update_matches_full_history():
+    """差分更新したキャリブレーションが全期間から計算した値と一致することをテスト"""
+    hist = make_price_history()
+    returns = hist["Close"].pct_change().dropna()
+
+    first = calibration.Calibration("AAPL").updated(hist.iloc[:1500])
+    cal = first.updated(hist.iloc[1400:])  # 重複する日足は無視される
+
+    assert first.count == 1499  # 差分更新は元のキャリブレーションを変更しない
+
+    assert cal.count == len(returns)
+    assert cal.last_date == hist["Date"].iloc[-1]
+    assert cal.mu == pytest.approx(returns.mean())
+    assert cal.sigma == pytest.approx(returns.std())
+    for quantile in sim_service.SCENARIOS.values():
+        assert cal.quantile(quantile) == pytest.approx(np.quantile(returns, quantile))
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_calibration_is_reused_and_refreshed_incrementally():
+    """キャリブレーションが再利用され、期限切れ時は差分のみ取得されることをテスト"""
+    hist = make_price_history()
+    first = calibration.get_calibration("AAPL")
+    assert calibration.get_calibration("AAPL") is first
+    calibration.get_price_history.assert_called_once()
+
+    new_bar = pd.DataFrame({"Date": ["2099-01-01"], "Close": [hist["Close"].iloc[-1] * 1.01], "Dividend": [0.0]})
+    first.checked_at = 0
+    with patch('app.services.calibration.get_price_history_since', return_value=pd.concat([hist.iloc[-1:], new_bar])) as since:
+        refreshed = calibration.get_calibration("AAPL")
+    since.assert_called_once_with("AAPL", hist["Date"].iloc[-1])
+    assert refreshed.last_date == "2099-01-01"
+    assert refreshed.count == len(hist)
+    assert first.count == len(hist) - 1
+    assert calibration.get_calibration("AAPL") is refreshed
+    calibration.get_price_history.assert_called_once()
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_calibration_is_rebuilt_when_history_is_adjusted_for_split():
+    """分割で過去の終値が調整し直された場合、差分更新せず全期間から作り直すことをテスト"""
+    hist = make_price_history()
+    first = calibration.get_calibration("AAPL")
+
+    # 4:1の分割後、yfinanceは過去の終値も1/4に調整して返す
+    new_bar = pd.DataFrame({"Date": ["2099-01-01"], "Close": [hist["Close"].iloc[-1] / 4 * 1.01], "Dividend": [0.0]})
+    adjusted = pd.concat([hist.assign(Close=hist["Close"] / 4), new_bar], ignore_index=True)
+    first.checked_at = 0
+    with patch('app.services.calibration.get_price_history_since', side_effect=lambda symbol, start: adjusted[adjusted["Date"] >= start]) as since:
+        refreshed = calibration.get_calibration("AAPL")
+    assert since.call_count == 2
+    assert since.call_args.args == ("AAPL", hist["Date"].iloc[0])
+    assert refreshed.count == len(hist)
+    assert refreshed.returns.min() > -0.1
+    assert refreshed.sigma == pytest.approx(first.sigma, rel=0.01)
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_fan_chart_output_returns_only_bands():
+    """fan_chart出力で終端値を返さず年次の分位点カーブのみ返すことをテスト"""
+    response = client.post("/v1/simulation", json={"symbol": "AAPL", "years": 5, "simulations": 200, "output": "fan_chart"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["scenarios"] is None
+    for bands in data["bands"].values():
+        assert len(bands["median"]) == 6
+        assert bands["median"][0] == 1.0
+        assert all(lo <= mid <= hi for lo, mid, hi in zip(bands["lower5"], bands["median"], bands["upper95"]))
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_fan_chart_matches_analytic_bands():
+    """サンプリングによるファンチャートが閉形式の分位点と一致することをテスト"""
+    years = 5
+    analytic = sim_service.analytic_bands("AAPL", years)
+    sampled = sim_service.fan_chart("AAPL", years, 20000, SimulationStep.terminal)
+    for scenario, bands in analytic.items():
+        for band, values in bands.items():
+            np.testing.assert_allclose(sampled[scenario][band], values, rtol=0.02)
+
+def test_quantile_sketch_error_is_bounded():
+    """分位点スケッチの誤差が相対誤差の上限内に収まることをテスト"""
+    rng = np.random.default_rng(3)
+    values = np.exp(rng.normal(0.0, 1.0, (50000, 3)))
+    sketch = QuantileSketch(series=3, relative_accuracy=0.01)
+    for chunk in np.array_split(values, 7):
+        sketch.update(chunk)
+    qs = [0.05, 0.5, 0.95]
+    estimated = sketch.quantiles(qs)
+    exact = np.quantile(values, qs, axis=0, method="inverted_cdf")
+    assert sketch.count == 50000
+    assert np.all(np.abs(estimated / exact - 1) <= 0.01 + 1e-9)
+
+    merged = QuantileSketch(series=3, relative_accuracy=0.01)
+    for chunk in np.array_split(values, 2):
+        part = QuantileSketch(series=3, relative_accuracy=0.01)
+        part.update(chunk)
+        merged.merge(part)
+    np.testing.assert_allclose(merged.quantiles(qs), estimated)
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_large_fan_chart_uses_sketch_and_reports_error():
+    """大規模なファンチャートでスケッチ集計とその誤差上限が返されることをテスト"""
+    with patch.object(sim_service, "EXACT_BANDS_MAX_SIMULATIONS", 100):
+        response = client.post("/v1/simulation", json={"symbol": "AAPL", "years": 5, "simulations": 5000, "step": "yearly", "output": "fan_chart"})
+        exact = sim_service.analytic_bands("AAPL", 5)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["percentileError"] == sim_service.DEFAULT_RELATIVE_ACCURACY
+    np.testing.assert_allclose(data["bands"]["base"]["median"], exact["base"]["median"], rtol=0.03)
+
+def test_variance_reduction_shocks():
+    """対称変量法とSobol列のショックが想定通りに生成されることをテスト"""
+    chunks = list(simulation_engine.iter_shock_checkpoints(10, 252, 1000, 10, seed=5, variance_reduction=VarianceReduction.antithetic))
+    for _, chunk in chunks:
+        half = len(chunk) // 2
+        np.testing.assert_allclose(chunk[:half], -chunk[half:2 * half])
+
+    sizes = [size for _, size in simulation_engine.iter_chunks(1000, 10, VarianceReduction.sobol)]
+    assert len(sizes) >= simulation_engine.QMC_REPLICATES
+    assert all(size & (size - 1) == 0 for size in sizes[:-1])
+    shocks = np.concatenate([chunk[:, -1] for _, chunk in simulation_engine.iter_shock_checkpoints(
+        10, 252, 4096, 1, seed=5, variance_reduction=VarianceReduction.sobol)])
+    assert shocks.mean() == pytest.approx(0.0, abs=0.05 * np.sqrt(2520))
+    assert shocks.std() == pytest.approx(np.sqrt(2520), rel=0.02)
+
+@pytest.mark.usefixtures("patch_price_history")
+@pytest.mark.parametrize("variance_reduction, reduction", [("antithetic", 1.5), ("sobol", 5)])
+def test_variance_reduction_lowers_standard_error(variance_reduction, reduction):
+    """分散減少法で標準誤差が小さくなり、レスポンスに含まれることをテスト"""
+    # antitheticの効果は終端値の非線形性（年率のボラティリティ）が大きいほど小さくなる
+    request = {"symbol": "AAPL", "years": 10, "simulations": 4096, "step": "yearly", "output": "fan_chart", "seed": 1}
+    baseline = client.post("/v1/simulation", json=request).json()
+    reduced = client.post("/v1/simulation", json={**request, "variance_reduction": variance_reduction}).json()
+    for scenario in sim_service.SCENARIOS:
+        assert reduced["standardError"][scenario] < baseline["standardError"][scenario] / reduction
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_sobol_requires_optional_scipy():
+    """scipyがインストールされていない環境ではsobolを400で拒否することをテスト"""
+    request = {"symbol": "AAPL", "years": 1, "simulations": 64, "variance_reduction": "sobol"}
+    with patch.object(sim_service, "sobol_available", return_value=False):
+        response = client.post("/v1/simulation", json=request)
+    assert response.status_code == 400
+    assert "scipy" in response.json()["detail"]["message"]
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_bootstrap_and_gbm_use_same_time_units():
+    """同じ価格履歴ではbootstrapとGBMの基本シナリオの中央値が一致することをテスト"""
+    request = {"symbol": "AAPL", "years": 5, "simulations": 4000, "step": "monthly", "seed": 1}
+    gbm = client.post("/v1/simulation", json=request).json()
+    bootstrap = client.post("/v1/simulation", json={**request, "mode": "bootstrap"}).json()
+    gbm_median = np.median(gbm["scenarios"]["base"])
+    bootstrap_median = np.median(bootstrap["scenarios"]["base"])
+    # 日次リターンを年率換算した5年分の成長（日次の値を年率とみなすと1.0付近にとどまる）
+    assert gbm_median > 1.1
+    assert bootstrap_median == pytest.approx(gbm_median, rel=0.03)
+
+def test_block_bootstrap_samples_contiguous_returns():
+    """ブロックブートストラップが連続したリターンを切り出すことをテスト"""
+    log_returns = np.arange(100, dtype=float)
+    chunk = simulation_engine._bootstrap_checkpoints_chunk(log_returns, 20, 20, 5, 50, np.random.SeedSequence(0))
+    daily = np.diff(np.concatenate([np.zeros((50, 1)), chunk], axis=1), axis=1)
+    blocks = daily.reshape(50, 4, 5)
+    assert np.all((np.diff(blocks, axis=2) == 1) | (np.diff(blocks, axis=2) == -99))
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_bootstrap_mode_resamples_history():
+    """bootstrapモードで過去リターンに基づく年次分位点カーブが返されることをテスト"""
+    response = client.post("/v1/simulation", json={"symbol": "AAPL", "years": 3, "simulations": 2000, "mode": "bootstrap", "block_size": 5, "output": "fan_chart"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["mode"] == "bootstrap"
+    log_returns = np.log1p(make_price_history()["Close"].pct_change().dropna())
+    expected_median = np.exp(log_returns.mean() * 3 * simulation_engine.TRADING_DAYS_PER_YEAR)
+    assert data["bands"]["base"]["median"][-1] == pytest.approx(expected_median, rel=0.05)
+
+    response = client.post("/v1/simulation", json={"symbol": "AAPL", "mode": "bootstrap", "variance_reduction": "sobol"})
+    assert response.status_code == 400
+    assert response.json()["detail"]["error_code"] == "INVALID_PARAMETER"
+
+@pytest.fixture
+def patch_portfolio_histories():
+    """銘柄ごとに異なる価格履歴を返すようget_price_history関数をモック化"""
+    histories = {"AAPL": make_price_history(seed=0), "7203.T": make_price_history(seed=1), "VOO": make_price_history(seed=2)}
+    calibration.clear_calibrations()
+    with patch('app.services.calibration.get_price_history', side_effect=lambda symbol, period: histories[symbol]) as mock:
+        yield mock
+    calibration.clear_calibrations()
+
+def test_portfolio_simulation_returns_normalized_weights_and_bands(patch_portfolio_histories):
+    """ポートフォリオシミュレーションで正規化された配分と年次分位点カーブが返されることをテスト"""
+    request = {
+        "assets": [{"symbol": "AAPL", "weight": 2}, {"symbol": "7203.T", "weight": 1}, {"symbol": "VOO", "weight": 1}],
+        "years": 5,
+        "simulations": 500,
+        "rebalance": "monthly",
+        "output": "fan_chart",
+    }
+    response = client.post("/v1/simulation/portfolio", json=request)
+    assert response.status_code == 200
+    data = response.json()
+    assert [asset["weight"] for asset in data["assets"]] == pytest.approx([0.5, 0.25, 0.25])
+    for bands in data["bands"].values():
+        assert len(bands["median"]) == 6
+        assert all(lo <= mid <= hi for lo, mid, hi in zip(bands["lower5"], bands["median"], bands["upper95"]))
+
+    # 2回目以降はキャリブレーションストアを再利用し、価格履歴を再取得しない
+    client.post("/v1/simulation/portfolio", json={**request, "rebalance": "none"})
+    assert patch_portfolio_histories.call_count == 3
+
+    duplicated = {**request, "assets": [{"symbol": "AAPL", "weight": 1}, {"symbol": "AAPL", "weight": 1}]}
+    assert client.post("/v1/simulation/portfolio", json=duplicated).status_code == 400
+
+def test_portfolio_shocks_follow_target_covariance():
+    """コレスキー因子で相関を与えた対数リターンが目標の共分散に従うことをテスト"""
+    covariance = np.array([[0.04, 0.018], [0.018, 0.09]])
+    cholesky = sim_service._cholesky(covariance)
+    drifts = np.zeros((1, 2))
+    values = np.concatenate([chunk[0, :, 0] for _, chunk in simulation_engine.iter_portfolio_checkpoints(
+        drifts, cholesky, np.array([1.0, 0.0]), 1, 252, 20000, rebalance=False, seed=7)])
+    assert np.log(values).std() == pytest.approx(np.sqrt(0.04), rel=0.03)
+
+    single_asset = sim_service._cholesky(np.array([[0.04, 0.04], [0.04, 0.04]]))
+    np.testing.assert_allclose(single_asset @ single_asset.T, [[0.04, 0.04], [0.04, 0.04]], atol=1e-12)
+
+@pytest.mark.parametrize("path, body", [
+    ("/v1/simulation", {"symbol": "AAPL"}),
+    ("/v1/simulation/stream", {"symbol": "AAPL"}),
+    ("/v1/simulation/portfolio", {"assets": [{"symbol": "AAPL", "weight": 0.5}, {"symbol": "MSFT", "weight": 0.5}]}),
+])
+def test_simulation_returns_503_when_price_history_unavailable(path, body):
+    """価格履歴の取得元が利用できない場合（サーキットブレーカーの遮断中など）に503を返すことをテスト"""
+    from app.services.circuit_breaker import CircuitOpenError
+    calibration.clear_calibrations()
+    sim_service.clear_result_cache()
+    error = CircuitOpenError("yfinance", "yfinance は一時的に利用できません", retry_after=12)
+    with patch('app.services.calibration.get_price_history', side_effect=error):
+        response = client.post(path, json=body)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "12"
+    assert response.json()["detail"]["error_code"] == "SERVICE_UNAVAILABLE"
+
+def wait_for_job(job_id: str, timeout: float = 30.0) -> dict:
+    """ジョブが完了または失敗するまでポーリングする"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/v1/simulation/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_simulation_job_lifecycle(patch_price_history):
+    """ジョブの投入・状態確認・結果取得ができ、結果が同期APIと同じ形式であることをテスト"""
+    simulation_jobs.set_job_store(simulation_jobs.InMemoryJobStore())
+    response = client.post("/v1/simulation/jobs", json={"symbol": "AAPL", "years": 3, "simulations": 200, "output": "fan_chart"})
+    assert response.status_code == 202
+    job_id = response.json()["jobId"]
+
+    assert wait_for_job(job_id)["status"] == "succeeded"
+    result = client.get(f"/v1/simulation/jobs/{job_id}/result")
+    assert result.status_code == 200
+    assert result.json()["symbol"] == "AAPL"
+    assert len(result.json()["bands"]["base"]["median"]) == 4
+
+    assert client.get("/v1/simulation/jobs/unknown").status_code == 404
+
+    def fail(**params):
+        raise ValueError("価格履歴がありません")
+
+    with patch.dict(simulation_jobs.JOB_RUNNERS, {"simulation": fail}):
+        failed = client.post("/v1/simulation/jobs", json={"symbol": "AAPL"}).json()
+        assert wait_for_job(failed["jobId"])["error"] == "価格履歴がありません"
+    response = client.get(f"/v1/simulation/jobs/{failed['jobId']}/result")
+    assert response.status_code == 409
+    assert response.json()["detail"]["error_code"] == "JOB_FAILED"
+
+def test_simulation_job_dispatched_to_lambda(patch_price_history, monkeypatch):
+    """SIMULATION_JOB_DISPATCH=lambda ではLambdaを非同期に呼び出し、呼び出されたLambdaがジョブを実行することをテスト"""
+    from unittest.mock import MagicMock
+    import lambda_function
+    
+    class SharedJobStore:
+        """プロセス間で共有されるストア（DynamoDB）の代わり"""
+        max_result_bytes = simulation_jobs.DynamoDBJobStore.max_result_bytes
+        def __init__(self):
+            self._store = simulation_jobs.InMemoryJobStore()
+        def save(self, job):
+            self._store.save(job)
+        def get(self, job_id):
+            return self._store.get(job_id)
+        def claim(self, job_id):
+            return self._store.claim(job_id)
+    
+    lambda_client = MagicMock()
+    monkeypatch.setattr(simulation_jobs, "SIMULATION_JOB_DISPATCH", "lambda")
+    monkeypatch.setattr(simulation_jobs, "SIMULATION_JOB_FUNCTION", "laplace-api")
+    monkeypatch.setattr(simulation_jobs, "_lambda_client", lambda_client)
+    
+    # プロセス内のストアでは別のコンテナからジョブを参照できない
+    simulation_jobs.set_job_store(simulation_jobs.InMemoryJobStore())
+    with pytest.raises(RuntimeError):
+        simulation_jobs.submit_job("simulation", {"symbol": "AAPL", "years": 1, "simulations": 10})
+    
+    simulation_jobs.set_job_store(SharedJobStore())
+    response = client.post("/v1/simulation/jobs", json={"symbol": "AAPL", "years": 2, "simulations": 100, "output": "fan_chart"})
+    assert response.status_code == 202
+    job_id = response.json()["jobId"]
+    invoke = lambda_client.invoke.call_args.kwargs
+    assert invoke["FunctionName"] == "laplace-api"
+    assert invoke["InvocationType"] == "Event"
+    assert client.get(f"/v1/simulation/jobs/{job_id}").json()["status"] == "queued"
+    
+    event = json.loads(invoke["Payload"])
+    assert lambda_function.handler(event, None) == {"job_id": job_id, "status": "succeeded"}
+    # 非同期呼び出しの再試行では実行済みのジョブを再実行しない
+    assert lambda_function.handler(event, None) == {"job_id": job_id, "status": "succeeded"}
+    result = client.get(f"/v1/simulation/jobs/{job_id}/result")
+    assert result.status_code == 200
+    assert len(result.json()["bands"]["base"]["median"]) == 3
+    
+    # 項目の大きさの上限を超える終端値の結果は投入時に受け付けない
+    invocations = lambda_client.invoke.call_count
+    response = client.post("/v1/simulation/jobs", json={"symbol": "AAPL", "years": 2, "simulations": 100000})
+    assert response.status_code == 400
+    assert response.json()["detail"]["error_code"] == "INVALID_PARAMETER"
+    assert lambda_client.invoke.call_count == invocations
+    simulation_jobs.set_job_store(simulation_jobs.InMemoryJobStore())
+
+def test_dynamodb_job_store_claims_queued_job_once():
+    """DynamoDBのジョブストアが条件付き更新で実行待ちのジョブを1回だけ実行中に変更することをテスト"""
+    from unittest.mock import MagicMock
+    from botocore.exceptions import ClientError
+    
+    store = simulation_jobs.DynamoDBJobStore.__new__(simulation_jobs.DynamoDBJobStore)
+    store.table = MagicMock()
+    item = {
+        "jobId": "job", "kind": "simulation", "status": "running", "params": "{}", "result": None, "error": None,
+        "createdAt": 0, "updatedAt": 0, "expiresAt": int(time.time()) + 60,
+    }
+    store.table.update_item.side_effect = [
+        {"Attributes": item},
+        ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"),
+    ]
+    assert store.claim("job")["status"] == "running"
+    assert store.claim("job") is None
+    update = store.table.update_item.call_args.kwargs
+    assert update["ConditionExpression"].startswith("#status = :queued")
+    assert update["ExpressionAttributeValues"][":running"] == "running"
+
+def test_simulation_job_queue_limit(patch_price_history):
+    """実行待ちのジョブが上限に達した場合に503が返され、完了後は再び投入できることをテスト"""
+    simulation_jobs.set_job_store(simulation_jobs.InMemoryJobStore())
+    release = threading.Event()
+    original = simulation_jobs.JOB_RUNNERS["simulation"]
+    with patch.object(simulation_jobs, "_slots", threading.BoundedSemaphore(1)), \
+            patch.dict(simulation_jobs.JOB_RUNNERS, {"simulation": lambda **params: (release.wait(5), original(**params))[1]}):
+        request = {"symbol": "AAPL", "years": 1, "simulations": 100}
+        first = client.post("/v1/simulation/jobs", json=request).json()
+        assert client.get(f"/v1/simulation/jobs/{first['jobId']}/result").status_code == 409
+
+        response = client.post("/v1/simulation/jobs", json=request)
+        assert response.status_code == 503
+        assert response.json()["detail"]["error_code"] == "JOB_QUEUE_FULL"
+
+        release.set()
+        assert wait_for_job(first["jobId"])["status"] == "succeeded"
+        assert client.post("/v1/simulation/jobs", json=request).status_code == 202
+
+def test_seeded_simulation_is_deterministic_and_cached(patch_price_history):
+    """同じシードでは同じ結果が返され、2回目以降はキャッシュから返されることをテスト"""
+    request = {"symbol": "AAPL", "years": 2, "simulations": 200, "seed": 42}
+    with patch.object(sim_service, "_iter_sample", wraps=sim_service._iter_sample) as sample:
+        first = client.post("/v1/simulation", json=request).json()
+        second = client.post("/v1/simulation", json=request).json()
+        assert first == second
+        assert sample.call_count == 1
+
+        other_seed = client.post("/v1/simulation", json={**request, "seed": 43}).json()
+        assert other_seed["scenarios"] != first["scenarios"]
+        assert sample.call_count == 2
+
+        # シードなしはキャッシュしない
+        client.post("/v1/simulation", json={**request, "seed": None})
+        client.post("/v1/simulation", json={**request, "seed": None})
+        assert sample.call_count == 4
+
+    # ワーカー数によらず同じ結果になるため、キャッシュを介さなくても一致する
+    sim_service.clear_result_cache()
+    direct = sim_service.run_simulation("AAPL", 2, 200, seed=42, workers=2)
+    assert direct["scenarios"] == first["scenarios"]
+
+def test_result_cache_evicts_least_recently_used(patch_price_history):
+    """キャッシュの上限を超えた場合に最も古く使われた結果から削除されることをテスト"""
+    with patch.object(sim_service, "SIMULATION_CACHE_SIZE", 2):
+        for seed in (1, 2, 1, 3):
+            sim_service.run_simulation("AAPL", 1, 50, seed=seed)
+        cached_seeds = [key[3] for key in sim_service._result_cache]
+    assert cached_seeds == [1, 3]
+
+def test_result_cache_is_bounded_by_size(patch_price_history):
+    """キャッシュの大きさの上限を超えた場合に古い結果から削除し、上限に比べて大きすぎる結果はキャッシュしないことをテスト"""
+    fan_chart = sim_service.run_simulation("AAPL", 5, 2000, seed=1, output="fan_chart")
+    terminal = sim_service.run_simulation("AAPL", 5, 2000, seed=1)
+    fan_chart_size = sim_service._result_size(fan_chart)
+    assert sim_service._result_size(terminal) > 20 * fan_chart_size
+    sim_service.clear_result_cache()
+
+    with patch.object(sim_service, "SIMULATION_CACHE_MAX_BYTES", 10 * fan_chart_size):
+        sim_service.run_simulation("AAPL", 5, 2000, seed=1)
+        assert len(sim_service._result_cache) == 0
+        for seed in range(12):
+            sim_service.run_simulation("AAPL", 5, 2000, seed=seed, output="fan_chart")
+        assert len(sim_service._result_cache) < 12
+        assert sim_service._result_cache_bytes <= sim_service.SIMULATION_CACHE_MAX_BYTES
+        assert next(iter(sim_service._result_cache))[3] > 0
+
+def test_cash_flow_recurrence_matches_path_loop():
+    """積立と配当の受け取りの累積和による計算が月次の逐次計算と一致することをテスト"""
+    rng = np.random.default_rng(5)
+    monthly_log_returns = rng.normal(0.005, 0.04, (20, 36))
+    log_values = np.cumsum(monthly_log_returns, axis=1)
+    values = sim_service._apply_cash_flows(log_values, 1000.0, 50.0, 0.002)
+
+    expected = np.empty_like(values)
+    for path in range(len(values)):
+        holdings, cash = 1000.0, 0.0
+        for month, log_return in enumerate(monthly_log_returns[path]):
+            holdings *= np.exp(log_return) / 1.002
+            cash += holdings * 0.002
+            holdings += 50.0
+            expected[path, month] = holdings + cash
+    np.testing.assert_allclose(values, expected, rtol=1e-10)
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_simulate_with_initial_investment_and_monthly_contribution():
+    """初期投資額と毎月の積立額が評価額と累計元本に反映されることをテスト"""
+    request = {
+        "symbol": "AAPL", "years": 3, "simulations": 500, "output": "fan_chart",
+        "initial_investment": 1000000, "monthly_contribution": 10000, "seed": 1,
+    }
+    response = client.post("/v1/simulation", json=request)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["principal"] == [1000000, 1120000, 1240000, 1360000]
+    base = data["bands"]["base"]
+    assert base["median"][0] == 1000000
+    assert all(lo <= mid <= hi for lo, mid, hi in zip(base["lower5"], base["median"], base["upper95"]))
+
+    # 積立なしの場合は初期投資額を掛けた倍率と一致する
+    lump_sum = client.post("/v1/simulation", json={**request, "monthly_contribution": 0}).json()
+    ratio = client.post("/v1/simulation", json={**request, "monthly_contribution": 0, "initial_investment": 1}).json()
+    np.testing.assert_allclose(lump_sum["bands"]["base"]["median"], np.array(ratio["bands"]["base"]["median"]) * 1000000)
+
+    response = client.post("/v1/simulation", json={**request, "mode": "analytic"})
+    assert response.status_code == 400
+
+def test_dividends_paid_out_are_estimated_from_dividend_column():
+    """Dividend列から配当利回りを推定し、配当を受け取る場合に利回り×期間に見合う影響があることをテスト"""
+    hist = make_price_history()
+    hist.loc[hist.index % 63 == 0, "Dividend"] = hist["Close"] * 0.01
+    calibration.clear_calibrations()
+    sim_service.clear_result_cache()
+    request = {"seed": 3, "initial_investment": 100, "output": "fan_chart"}
+    with patch('app.services.calibration.get_price_history', return_value=hist):
+        assert calibration.get_calibration("AAPL").dividend_yield == pytest.approx(0.01 / 63, rel=0.05)
+        reinvested = sim_service.run_simulation("AAPL", 10, 200, **request)
+        with patch.object(sim_service, "_apply_cash_flows", wraps=sim_service._apply_cash_flows) as apply_cash_flows:
+            paid_out = sim_service.run_simulation("AAPL", 10, 200, reinvest_dividends=False, **request)
+    calibration.clear_calibrations()
+    sim_service.clear_result_cache()
+    assert paid_out["principal"] == reinvested["principal"] == [100] * 11
+    # 年4%の配当を10年間受け取ると、保有分の約40%が配当として払い出される
+    monthly_dividend = apply_cash_flows.call_args.args[3]
+    assert monthly_dividend * 12 * 10 == pytest.approx(0.4, rel=0.05)
+    # 払い出した配当は複利で増えないため、上位の評価額が利回り×期間に見合って下がる
+    assert paid_out["bands"]["base"]["upper_95"][-1] < reinvested["bands"]["base"]["upper_95"][-1] * 0.95
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_stream_emits_partial_bands_converging_to_final_result():
+    """ストリーミングで途中経過が逐次返され、最後の行が通常のファンチャートと一致することをテスト"""
+    request = {"symbol": "AAPL", "years": 2, "simulations": 2000, "seed": 9}
+    with patch.object(simulation_engine, "MAX_CHUNK_ELEMENTS", 504 * 250):
+        response = client.post("/v1/simulation/stream", json={**request, "progress_every": 2})
+        final = client.post("/v1/simulation", json={**request, "output": "fan_chart"}).json()
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["completed"] for event in events] == [500, 1000, 1500, 2000]
+    assert [event["done"] for event in events] == [False, False, False, True]
+    assert events[-1]["bands"] == final["bands"]
+
+    response = client.post("/v1/simulation/stream", json={**request, "mode": "analytic", "monthly_contribution": 100})
+    assert response.status_code == 400
+
+@pytest.mark.usefixtures("patch_price_history")
+def test_stream_cancellation_stops_remaining_chunks():
+    """途中で打ち切った場合に残りのチャンクが計算されないことをテスト"""
+    with patch.object(simulation_engine, "MAX_CHUNK_ELEMENTS", 252 * 100), \
+            patch.object(simulation_engine, "_shock_checkpoints_chunk", wraps=simulation_engine._shock_checkpoints_chunk) as kernel:
+        events = sim_service.iter_simulation("AAPL", 1, 1000, output="fan_chart", workers=1, progress_every=1)
+        completed, _ = next(events)
+        events.close()
+    assert completed == 100
+    assert kernel.call_count == 1
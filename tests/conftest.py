@@ -0,0 +1,16 @@
+import pandas as pd
+import pytest
+
+def _make_download_data(symbols):
+    """yf.download(group_by="ticker") と同じ形式のテスト用データを作成"""
+    index = pd.date_range("2024-01-01", periods=2, freq="D", tz="UTC")
+    frames = {
+        symbol: pd.DataFrame({"Close": [100.0 + i, 110.0 + i]}, index=index)
+        for i, symbol in enumerate(symbols)
+    }
+    return pd.concat(frames, axis=1)
+
+@pytest.fixture
+def make_download_data():
+    """yf.download と同じ形式のテスト用データを作成する関数"""
+    return _make_download_data
@@ -0,0 +1,57 @@
+import pytest
+
+from app.services import hedging, market, rate_limiter, upstream_executor
+from app.services.circuit_breaker import yfinance_breaker as _yfinance_breaker
+
+@pytest.fixture
+def clear_market_caches():
+    """価格情報と銘柄の基本情報・配当履歴のキャッシュを前後で空にする"""
+    market.clear_quote_cache()
+    market.clear_ticker_data_cache()
+    yield
+    market.clear_quote_cache()
+    market.clear_ticker_data_cache()
+
+@pytest.fixture
+def yfinance_breaker():
+    """Yahoo Finance のサーキットブレーカーを前後でリセットする"""
+    _yfinance_breaker.reset()
+    yield _yfinance_breaker
+    _yfinance_breaker.reset()
+
+@pytest.fixture
+def token_bucket(monkeypatch):
+    """指定した取得元のトークンバケットをテスト用の設定に差し替える関数"""
+    def install(name, **kwargs):
+        bucket = rate_limiter.TokenBucket(name, **kwargs)
+        monkeypatch.setitem(rate_limiter.BUCKETS, name, bucket)
+        return bucket
+    return install
+
+@pytest.fixture
+def bounded_executor(monkeypatch):
+    """指定した取得元のスレッドプールをテスト用の設定に差し替え、終了時に停止する関数"""
+    executors = []
+    
+    def install(name, workers, queue_limit):
+        executor = upstream_executor.BoundedExecutor(name, workers, queue_limit)
+        monkeypatch.setitem(upstream_executor.EXECUTORS, name, executor)
+        executors.append(executor)
+        return executor
+    yield install
+    for executor in executors:
+        executor.shutdown()
+
+@pytest.fixture
+def hedge_policy(monkeypatch):
+    """ヘッジを有効にし、応答時間（0.01秒）を min_samples 件記録済みの方針を登録する関数"""
+    monkeypatch.setattr(hedging, "HEDGING_ENABLED", True)
+    
+    def install(kind, **kwargs):
+        policy = hedging.HedgePolicy(kind, **kwargs)
+        monkeypatch.setitem(hedging.POLICIES, kind, policy)
+        for _ in range(policy.min_samples):
+            policy.start()
+            policy.record(0.01)
+        return policy
+    return install
@@ -0,0 +1,53 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+
+from app.models.enums import CircuitState
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, UpstreamUnavailableError
+
+def http_error(status_code):
+    """ステータスコード付きのHTTPエラーを作成"""
+    return requests.HTTPError(response=MagicMock(status_code=status_code))
+
+def test_circuit_breaker_trips_and_recovers_with_half_open_probe():
+    """失敗率で遮断し、遮断中は呼び出さずに失敗し、試行の成功で復帰することをテスト"""
+    breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=4, window_seconds=60, open_seconds=0.05)
+    upstream = MagicMock(side_effect=ConnectionError("timeout"))
+    breaker.call(lambda: "ok")
+    for _ in range(3):
+        with pytest.raises(UpstreamUnavailableError) as error:
+            breaker.call(upstream)
+        assert isinstance(error.value.__cause__, ConnectionError)
+    assert breaker.state == CircuitState.open
+    
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.call(upstream)
+    assert upstream.call_count == 3
+    assert error.value.upstream == "test"
+    assert error.value.retry_after >= 1
+    
+    time.sleep(0.06)
+    assert breaker.state == CircuitState.half_open
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CircuitState.closed
+
+def test_circuit_breaker_counts_only_upstream_failures():
+    """存在しない銘柄などの例外では遮断せず、遮断中に返った遅い結果で遮断を延長しないことをテスト"""
+    breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=4, window_seconds=60, open_seconds=60)
+    for error in (KeyError("regularMarketPrice"), http_error(404), ValueError("delisted")):
+        with pytest.raises(type(error)):
+            breaker.call(MagicMock(side_effect=error))
+    assert breaker.state == CircuitState.closed
+    assert breaker.snapshot()["failures"] == 0
+    
+    for error in (http_error(503), http_error(429), requests.Timeout("read timeout"), ConnectionError("reset")):
+        with pytest.raises(UpstreamUnavailableError):
+            breaker.call(MagicMock(side_effect=error))
+    assert breaker.state == CircuitState.open
+    
+    # 遮断前に開始した呼び出しの結果は無視する
+    opened_at = breaker._opened_at
+    breaker._record(False)
+    assert breaker._opened_at == opened_at
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from app.services import hedging
+from app.services.circuit_breaker import CircuitBreaker, UpstreamUnavailableError
+
+def test_hedged_call_uses_faster_second_attempt_within_budget(hedge_policy, bounded_executor):
+    """1回目の試行がp95を過ぎても返らない場合に2回目を試行し、予算を超えてヘッジしないことをテスト"""
+    policy = hedge_policy("test", budget_ratio=0.04, min_samples=20, min_delay=0.01)
+    bounded_executor("test", 2, 0)
+    breaker = CircuitBreaker("test")
+    calls = []
+    
+    def slow_first_attempt(release):
+        def upstream():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)
+                return "slow"
+            return "fast"
+        return upstream
+    
+    release = threading.Event()
+    assert hedging.hedged_call("test", breaker, slow_first_attempt(release)) == "fast"
+    assert len(calls) == 2
+    release.set()
+    
+    # 直近の呼び出しのヘッジの割合が予算に達しているため、2回目の試行はしない
+    calls.clear()
+    release = threading.Event()
+    threading.Timer(0.1, release.set).start()
+    assert hedging.hedged_call("test", breaker, slow_first_attempt(release)) == "slow"
+    assert len(calls) == 1
+    snapshot = policy.snapshot()
+    assert snapshot["hedged"] == 1
+    assert snapshot["hedge_wins"] == 1
+    assert snapshot["over_budget"] == 1
+    # 負けた1回目の試行の応答時間も記録する
+    assert snapshot["samples"] == 22
+
+def test_hedged_call_skips_hedge_when_executor_is_full(hedge_policy, bounded_executor):
+    """スレッドプールに空きがない場合は2回目の試行を実行待ちにせず、失敗した1回目の応答時間も記録することをテスト"""
+    policy = hedge_policy("test", budget_ratio=1.0, min_samples=20, min_delay=0.01)
+    executor = bounded_executor("test", 1, 4)
+    calls = []
+    
+    def slow_failure():
+        calls.append(1)
+        time.sleep(0.1)
+        raise ConnectionError("timeout")
+    
+    with pytest.raises(UpstreamUnavailableError):
+        hedging.hedged_call("test", CircuitBreaker("test"), slow_failure)
+    assert len(calls) == 1
+    assert executor.snapshot()["max_queued"] == 1
+    snapshot = policy.snapshot()
+    assert snapshot["hedged"] == 0
+    assert snapshot["skipped"] == 1
+    assert snapshot["samples"] == 21
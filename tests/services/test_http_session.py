@@ -0,0 +1,40 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from app.services import http_session, market
+from app.services.circuit_breaker import yahoo_japan_breaker
+
+@pytest.fixture
+def reset_yahoo_japan_breaker():
+    """Yahoo!ファイナンス（日本）のサーキットブレーカーを前後でリセットする"""
+    yahoo_japan_breaker.reset()
+    yield
+    yahoo_japan_breaker.reset()
+
+@pytest.mark.usefixtures("clear_market_caches", "reset_yahoo_japan_breaker")
+def test_upstream_calls_reuse_shared_sessions(make_download_data):
+    """投資信託のスクレイピングとyfinanceが共有セッションを再利用することをテスト"""
+    session = http_session.get_http_session()
+    assert session is http_session.get_http_session()
+    adapter = session.get_adapter("https://finance.yahoo.co.jp/")
+    assert adapter.max_retries.total == http_session.HTTP_RETRIES
+    
+    response = MagicMock(content='<div data-test="MUTUAL_FUND_PRICE-value">12,345円</div>'.encode())
+    with patch.object(session, 'get', return_value=response) as get:
+        market.fetch_mutual_fund_real_time_price("0331418A")
+        market.fetch_mutual_fund_real_time_price("0331418A")
+    assert get.call_count == 2
+    
+    # HTTPエラー（429・5xx）はサーキットブレーカーの失敗に数える
+    throttled = requests.Response()
+    throttled.status_code = 429
+    with patch.object(session, 'get', return_value=throttled):
+        market.fetch_mutual_fund_real_time_price("0331418A")
+    assert yahoo_japan_breaker.snapshot()["failures"] == 1
+    
+    with patch('app.services.market.yf.Ticker') as ticker:
+        ticker.return_value.history.return_value = make_download_data(["AAPL"])["AAPL"]
+        market.get_stock_price("AAPL")
+    assert ticker.call_args.kwargs["session"] is http_session.get_yfinance_session()
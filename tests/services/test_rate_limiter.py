@@ -0,0 +1,50 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from app.models.enums import UpstreamPriority
+from app.services import quote_warmer
+from app.services.rate_limiter import TokenBucket, UpstreamRateLimitedError
+
+def test_token_bucket_prioritizes_interactive_calls_over_background():
+    """トークンバケットが上限を超えた呼び出しを待たせ、対話的なリクエストを優先することをテスト"""
+    bucket = TokenBucket("test", rate=20, burst=2, background_reserve=0.5)
+    bucket.acquire()
+    # バックグラウンドの呼び出しは予備のトークンを残す
+    with pytest.raises(UpstreamRateLimitedError):
+        bucket.acquire(UpstreamPriority.background, max_wait=0)
+    bucket.acquire(UpstreamPriority.interactive, max_wait=0)
+    
+    # トークンがない間、対話的なリクエストの待ちがあればバックグラウンドの呼び出しは後になる
+    order = []
+    background = threading.Thread(target=lambda: (bucket.acquire(UpstreamPriority.background, max_wait=5), order.append("background")))
+    interactive = threading.Thread(target=lambda: (bucket.acquire(UpstreamPriority.interactive, max_wait=5), order.append("interactive")))
+    background.start()
+    interactive.start()
+    background.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "background"]
+    
+    snapshot = bucket.snapshot()
+    assert snapshot["acquired"] == {"interactive": 3, "background": 1}
+    assert snapshot["rejected"] == {"interactive": 0, "background": 1}
+    assert snapshot["max_wait_seconds"]["background"] > 0
+
+@pytest.mark.usefixtures("clear_market_caches", "yfinance_breaker")
+def test_batch_download_consumes_one_token_per_symbol(token_bucket, make_download_data):
+    """まとめて取得する場合も銘柄数分のトークンを消費し、1回に消費できる数ごとに分割することをテスト"""
+    bucket = token_bucket("yfinance", rate=1000, burst=10)
+    batches = []
+    
+    def download(batch, **kwargs):
+        batches.append(kwargs["threads"])
+        return make_download_data(batch)
+    
+    with patch('app.services.market.yf.download', side_effect=download) as yf_download:
+        assert quote_warmer.warm_popular_quotes(20) == {"symbols": 20, "refreshed": 20}
+    sizes = [len(call.args[0]) for call in yf_download.call_args_list]
+    # バックグラウンドは予備のトークン（25%）を残すため、1回に7銘柄まで
+    assert sizes == [7, 7, 6]
+    assert batches == [False, False, False]
+    assert bucket.snapshot()["acquired"]["background"] == 20
@@ -0,0 +1,44 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from app.services import market
+from app.services.single_flight import _group
+
+@pytest.mark.usefixtures("clear_market_caches")
+def test_concurrent_company_info_shares_one_fetch():
+    """同じ銘柄の同時呼び出しが1回の取得にまとめられることをテスト"""
+    started = threading.Event()
+    release = threading.Event()
+    
+    class SlowTicker:
+        calls = 0
+        
+        def __init__(self, symbol, session=None):
+            SlowTicker.calls += 1
+            started.set()
+            release.wait(5)
+            self.info = {"longName": "Apple Inc.", "sector": "Technology"}
+    
+    results = []
+    with patch('app.services.market.yf.Ticker', SlowTicker):
+        threads = [threading.Thread(target=lambda: results.append(market.get_company_info("AAPL"))) for _ in range(3)]
+        threads[0].start()
+        assert started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        key = ("company_info", ("AAPL",), ())
+        for _ in range(500):
+            if _group.waiters(key) == 2:
+                break
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+    
+    assert SlowTicker.calls == 1
+    assert len(results) == 3
+    assert all(result["name"] == "Apple Inc." for result in results)
+    # 呼び出し元ごとに別のオブジェクトを返す
+    assert len({id(result) for result in results}) == 3
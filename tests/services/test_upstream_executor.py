@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from app.models.enums import UpstreamPriority
+from app.services import upstream_executor
+from app.services.rate_limiter import upstream_priority
+
+def test_upstream_executor_rejects_when_saturated(bounded_executor, yfinance_breaker):
+    """外部データソース用のスレッドプールが上限に達した場合に待たずに失敗し、状態に表れることをテスト"""
+    executor = bounded_executor("yfinance", workers=1, queue_limit=1)
+    release = threading.Event()
+    started = threading.Event()
+    
+    def slow_upstream():
+        started.set()
+        release.wait(5)
+        return "ok"
+    
+    try:
+        running = executor.submit(slow_upstream)
+        assert started.wait(5)
+        # バックグラウンドの呼び出しは実行待ちの枠を使えない
+        with upstream_priority(UpstreamPriority.background):
+            with pytest.raises(upstream_executor.UpstreamSaturatedError):
+                executor.submit(slow_upstream)
+        queued = executor.submit(slow_upstream)
+        # 上限に達した場合は呼び出さず、サーキットブレーカーの失敗にも数えない
+        with pytest.raises(upstream_executor.UpstreamSaturatedError):
+            yfinance_breaker.call(slow_upstream)
+        assert yfinance_breaker.snapshot()["failures"] == 0
+        
+        status = upstream_executor.get_executor_status("yfinance")
+        assert status["active"] == 1
+        assert status["queued"] == 1
+        assert status["saturation"] == 1.0
+        assert status["rejected"] == {"interactive": 1, "background": 1}
+    finally:
+        release.set()
+    assert running.result(5) == "ok"
+    assert queued.result(5) == "ok"
+    assert executor.snapshot()["completed"] == 2
+
+def test_rate_limit_waiters_hold_executor_slots(bounded_executor, token_bucket, yfinance_breaker):
+    """トークンを待つ呼び出しも実行待ちの枠を使い、枠がない場合はトークンを消費しないことをテスト"""
+    executor = bounded_executor("yfinance", workers=1, queue_limit=1)
+    bucket = token_bucket("yfinance", rate=20, burst=1)
+    release = threading.Event()
+    
+    try:
+        running = yfinance_breaker.submit(release.wait, 5)
+        # トークンがないため、2回目の呼び出しは実行待ちの枠を予約したままトークンを待つ
+        waiting = threading.Thread(target=yfinance_breaker.call, args=(lambda: "ok",))
+        waiting.start()
+        for _ in range(100):
+            if bucket.snapshot()["waiting"]["interactive"] == 1:
+                break
+            time.sleep(0.01)
+        assert executor.snapshot()["queued"] == 1
+        with pytest.raises(upstream_executor.UpstreamSaturatedError):
+            yfinance_breaker.call(lambda: "ok")
+    finally:
+        release.set()
+    assert running.result(5) is True
+    waiting.join(5)
+    assert bucket.snapshot()["acquired"]["interactive"] == 2